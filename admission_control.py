@@ -0,0 +1,173 @@
+# Control de admisión para la creación de pedidos de Caffe & Miga
+# En las promos los POST de pedidos llegan en ráfagas: un token bucket por IP y otro global
+# limitan el ritmo, y un tope de requests en curso evita que la ráfaga ocupe todos los hilos
+# esperando a Firestore o Mercado Pago. Lo que excede recibe 429 con Retry-After al instante
+#
+# Los límites son por proceso: con varios workers el ritmo total es workers x límite
+
+import os
+import math
+import time
+import threading
+import logging
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate: Tokens por segundo que se reponen
+            burst: Capacidad del balde (requests seguidos permitidos tras un rato sin tráfico)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Tomar un token. Devuelve 0 si se pudo, o los segundos hasta que haya uno"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+class AdmissionController:
+    def __init__(self, rate_per_client=5, burst_per_client=20, global_rate=100, global_burst=200,
+                 max_in_flight=16, queue_timeout=0.1, max_clients=10000):
+        """
+        Args:
+            rate_per_client / burst_per_client: Token bucket por IP (rate <= 0 lo desactiva)
+            global_rate / global_burst: Token bucket compartido por todos (rate <= 0 lo desactiva)
+            max_in_flight: Requests procesándose a la vez (<= 0 sin tope)
+            queue_timeout: Segundos que un request espera un lugar libre antes del 429
+            max_clients: IPs recordadas (se descartan las menos recientes)
+        """
+        self.rate_per_client = rate_per_client
+        self.burst_per_client = burst_per_client
+        self.global_bucket = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {'client_rate': 0, 'global_rate': 0, 'concurrency': 0}
+
+    def _client_bucket(self, client):
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(self.rate_per_client, self.burst_per_client)
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            return bucket
+
+    def _reject(self, reason, retry_after):
+        with self._lock:
+            self.rejected[reason] += 1
+        return reason, max(1, math.ceil(retry_after))
+
+    def admit(self, client):
+        """
+        Intentar admitir un request. Si se admite hay que llamar a release() al terminar
+
+        Returns:
+            (None, 0) si se admite, o (motivo, segundos de Retry-After) si se rechaza
+        """
+        # Primero el balde de la IP: un cliente insistente no consume el cupo global
+        if self.rate_per_client > 0:
+            wait = self._client_bucket(client).take()
+            if wait:
+                return self._reject('client_rate', wait)
+        if self.global_bucket:
+            wait = self.global_bucket.take()
+            if wait:
+                return self._reject('global_rate', wait)
+        if self._slots and not self._slots.acquire(timeout=self.queue_timeout):
+            return self._reject('concurrency', 1)
+
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        return None, 0
+
+    def release(self):
+        """Liberar el lugar de un request admitido"""
+        with self._lock:
+            self.in_flight -= 1
+        if self._slots:
+            self._slots.release()
+
+    def stats(self):
+        """Contadores de admisión para /health"""
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'tracked_clients': len(self._clients)
+            }
+
+def client_address():
+    """
+    IP del cliente para el límite por IP. Detrás del proxy de Render la resuelve ProxyFix
+    (TRUSTED_PROXY_HOPS en main.py) contando solo los saltos de proxies confiables: las
+    entradas de X-Forwarded-For que manda el cliente no se usan, así no puede esquivar el límite
+    """
+    return request.remote_addr
+
+def admission_controlled(scope, controller=None):
+    """
+    Decorador para rutas Flask que crean pedidos: aplica el control de admisión a los POST
+    y responde 429 con Retry-After a los que exceden los límites
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'POST':
+                return view(*args, **kwargs)
+
+            active_controller = controller or order_admission
+            client = client_address()
+            reason, retry_after = active_controller.admit(client)
+            if reason:
+                logger.debug("🚦 Request rechazado por control de admisión",
+                             extra={'scope': scope, 'client': client, 'reason': reason})
+                response = jsonify({
+                    "error": "Demasiadas solicitudes, reintentar en un momento",
+                    "retry_after": retry_after
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
+            try:
+                return view(*args, **kwargs)
+            finally:
+                active_controller.release()
+        return wrapper
+    return decorator
+
+# Instancia global
+order_admission = AdmissionController(
+    rate_per_client=float(os.getenv('ORDER_RATE_PER_CLIENT', 5)),
+    burst_per_client=float(os.getenv('ORDER_BURST_PER_CLIENT', 20)),
+    global_rate=float(os.getenv('ORDER_RATE_GLOBAL', 100)),
+    global_burst=float(os.getenv('ORDER_BURST_GLOBAL', 200)),
+    max_in_flight=int(os.getenv('ORDER_MAX_IN_FLIGHT', 16)),
+    queue_timeout=float(os.getenv('ORDER_ADMISSION_WAIT', 0.1))
+)
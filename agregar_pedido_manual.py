@@ -6,6 +6,7 @@ Script simple para agregar pedidos manualmente al sistema
 import sqlite3
 import json
 from datetime import datetime
+from order_ids import new_order_id
 
 def agregar_pedido_manual():
     """Función para agregar pedidos manualmente"""
@@ -28,7 +29,7 @@ def agregar_pedido_manual():
         cursor = conn.cursor()
         
         # Generar ID único
-        order_id = f"manual_{int(datetime.now().timestamp())}"
+        order_id = new_order_id('manual')
         
         # Preparar items
         items = [{
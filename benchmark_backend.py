@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# Benchmark sin conexión del backend Flask de Caffe & Miga
+# Levanta main.py con un FirebaseManager en memoria y el Mercado Pago falso (fake_mercadopago.py),
+# ambos con latencia configurable, genera una mezcla de requests con N clientes concurrentes
+# y reporta throughput y percentiles de latencia por endpoint en JSON.
+#
+# Uso:
+#   python benchmark_backend.py --duration 30 --concurrency 16 --firestore-latency 0.05 --mp-latency 0.2
+#   python benchmark_backend.py --mix "pos_orders_post=5,pos_orders_get=5,pos_stats=1" --output base.json
+#   python benchmark_backend.py --min-throughput 50 --max-p95-ms 300   # sale con 1 si no se cumple
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+import requests
+from werkzeug.serving import make_server
+
+from firebase_config import FirebaseManager, encode_page_token, decode_page_token
+from open_orders_view import LocalSnapshotStub
+from fake_mercadopago import create_fake_app
+
+# Peso relativo de cada escenario en la mezcla por defecto
+DEFAULT_MIX = {
+    'pos_orders_post': 30,
+    'pos_orders_get': 30,
+    'create_preference': 15,
+    'webhook': 15,
+    'pos_stats': 10
+}
+
+class InMemoryFirebaseManager(FirebaseManager):
+    def __init__(self, latency=0.0):
+        """
+        FirebaseManager con los pedidos en memoria: misma interfaz y mismas reglas de
+        negocio, sin Firestore. Cada round trip simulado espera `latency` segundos.
+        La vista de pedidos abiertos se alimenta con un LocalSnapshotStub, como el listener real.
+        """
+        super().__init__()
+        self.latency = latency
+        self.documents = {}
+        self._lock = threading.Lock()
+        self._snapshots = LocalSnapshotStub()
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _connect_firebase(self):
+        # Cualquier valor verdadero sirve: los métodos que usan self.db están reemplazados
+        self._db = self
+
+    def _store(self, order_data):
+        """Agregar un documento con el ID del pedido (como FirebaseManager) y notificar al listener"""
+        doc_id = order_data.setdefault('id', uuid.uuid4().hex[:20])
+        with self._lock:
+            if doc_id in self.documents:
+                return doc_id
+            self.documents[doc_id] = order_data
+        self._snapshots.add(doc_id, dict(order_data))
+        return doc_id
+
+    def _update(self, order_id, update_data):
+        """Actualizar un documento existente; False si no existe"""
+        with self._lock:
+            order = self.documents.get(order_id)
+            if order is None:
+                return False
+            order.update(update_data)
+            snapshot = dict(order)
+        self._snapshots.modify(order_id, snapshot)
+        return True
+
+    def _new_order_fields(self, order_data):
+        order_data['created_at'] = datetime.now()
+        order_data['updated_at'] = order_data['created_at']
+        order_data['status'] = 'nuevo'
+        order_data['pos_status'] = 'pendiente'
+
+    def _payment_fields(self, payment_data):
+        update_data = {
+            'payment_status': payment_data.get('status'),
+            'payment_id': payment_data.get('payment_id'),
+            'payment_updated_at': datetime.now(),
+            'updated_at': datetime.now()
+        }
+        if payment_data.get('status') == 'approved':
+            update_data['status'] = 'pagado'
+            update_data['pos_status'] = 'listo_para_preparar'
+        return update_data
+
+    def save_order(self, order_data):
+        self._round_trip()
+        self._new_order_fields(order_data)
+        return self._store(order_data)
+
+    def save_orders_batch(self, orders):
+        self._round_trip()
+        results = []
+        for order_data in orders:
+            self._new_order_fields(order_data)
+            results.append({'id': self._store(order_data), 'success': True, 'error': None})
+        return results
+
+    def update_payment_status(self, order_id, payment_data):
+        self._round_trip()
+        return self._update(order_id, self._payment_fields(payment_data))
+
+    def update_order_status(self, order_id, new_status):
+        self._round_trip()
+        return self._update(order_id, {
+            'pos_status': new_status,
+            'status_updated_at': datetime.now(),
+            'updated_at': datetime.now()
+        })
+
+    def update_order_statuses_batch(self, updates):
+        self._round_trip()
+        return [{'id': order_id, 'success': self._update(order_id, {
+                    'pos_status': new_status,
+                    'status_updated_at': datetime.now(),
+                    'updated_at': datetime.now()
+                }), 'error': None} for order_id, new_status in updates]
+
+    def _orders(self):
+        """Copia de todos los pedidos con su ID, del más reciente al más antiguo"""
+        with self._lock:
+            orders = [dict(data, id=doc_id) for doc_id, data in self.documents.items()]
+        return sorted(orders, key=lambda o: o['created_at'], reverse=True)
+
+    def get_pending_orders(self, raise_errors=False):
+        self._round_trip()
+        return [o for o in self._orders() if o.get('status') == 'nuevo']
+
+    def get_all_orders(self, raise_errors=False):
+        self._round_trip()
+        return self._orders()[:50]
+
+    def get_orders_changed_since(self, since, limit=50, raise_errors=False):
+        self._round_trip()
+        changed = [o for o in self._orders() if o.get('updated_at', o['created_at']) > since]
+        return sorted(changed, key=lambda o: o.get('updated_at', o['created_at']))[:limit]
+
+    def query_orders(self, status=None, pos_status=None, payment_status=None, start=None, end=None,
+                     limit=50, page_token=None, fields=None):
+        self._round_trip()
+        after = decode_page_token(page_token) if page_token else None
+        order_list = []
+        for order in self._orders():
+            if any(value is not None and order.get(field) != value for field, value in
+                   (('status', status), ('pos_status', pos_status), ('payment_status', payment_status))):
+                continue
+            if (start and order['created_at'] < start) or (end and order['created_at'] >= end):
+                continue
+            if after and order['created_at'] >= after:
+                continue
+            if fields:
+                keep = set(fields) | {'created_at', 'id'}
+                order = {k: v for k, v in order.items() if k in keep}
+            order_list.append(order)
+            if len(order_list) == limit:
+                break
+
+        next_token = None
+        if len(order_list) == limit:
+            next_token = encode_page_token(order_list[-1]['created_at'])
+        return order_list, next_token
+
+    def ping(self):
+        self._round_trip()
+
+    def start_open_orders_listener(self, query=None):
+        return super().start_open_orders_listener(query or self._snapshots)
+
+class _ServerThread:
+    """Servidor WSGI con hilos en segundo plano, en un puerto libre"""
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+def load_backend(workdir, firestore_latency=0.0, mp_latency=0.0, mp_error_rate=0.0, log_level='WARNING',
+                 store='memory'):
+    """
+    Importar main.py apuntando a los falsos: bases SQLite en `workdir`, Mercado Pago falso
+    en un puerto local y FirebaseManager en memoria (store='memory') o el almacén local
+    en SQLite de local_order_store.py (store='sqlite'). Solo se puede llamar una vez por proceso.
+
+    Returns:
+        (módulo main, servidor de Mercado Pago falso)
+    """
+    if 'main' in sys.modules:
+        raise RuntimeError("main.py ya fue importado: el benchmark necesita un proceso nuevo")
+
+    fake_mp = _ServerThread(create_fake_app(latency=mp_latency, error_rate=mp_error_rate))
+
+    # Nunca usar credenciales reales ni salir a la red durante el benchmark
+    os.environ.update({
+        'MERCADO_PAGO_API_URL': fake_mp.url,
+        'USE_TEST_MODE': 'True',
+        'TEST_ACCESS_TOKEN': 'TEST-benchmark',
+        'PROD_ACCESS_TOKEN': 'TEST-benchmark',
+        'WARM_UP_CLIENTS': 'false',
+        'HEALTH_PROBE_INTERVAL': '3600',
+        'LOG_LEVEL': log_level,
+        'ORDER_JOURNAL_PATH': os.path.join(workdir, 'order_journal.db'),
+        'ORDER_OUTBOX_PATH': os.path.join(workdir, 'order_outbox.db'),
+        'WEBHOOK_QUEUE_PATH': os.path.join(workdir, 'webhook_queue.db'),
+        'ORDER_STATS_PATH': os.path.join(workdir, 'order_stats.db'),
+        'IDEMPOTENCY_STORE_PATH': os.path.join(workdir, 'idempotency.db'),
+        'ORDER_STORE': 'sqlite' if store == 'sqlite' else 'firestore',
+        'LOCAL_ORDER_STORE_PATH': os.path.join(workdir, 'local_orders.db'),
+        # Almacén de pedidos del POS y ventas: sin esto save_order_to_sqlite escribe en el
+        # caffeymiga.db real (el que lee la cocina) e importa los archivos viejos
+        'ORDERS_DB_PATH': os.path.join(workdir, 'caffeymiga.db'),
+        'SALES_DB_PATH': os.path.join(workdir, 'ventas.db')
+    })
+    os.environ.setdefault('LOG_MODULE_LEVELS', 'werkzeug=WARNING')
+    # Todos los clientes del benchmark salen de la misma IP: solo rigen los límites globales
+    os.environ.setdefault('ORDER_RATE_PER_CLIENT', '0')
+    os.environ.pop('ENVIRONMENT', None)
+    # Cualquier archivo relativo que quede (logs, scripts viejos) va al directorio temporal
+    os.chdir(workdir)
+
+    # firebase_config ya se importó arriba: el backend se vuelve a elegir con el entorno de arriba
+    import firebase_config
+    if store == 'memory':
+        firebase_config.firebase_manager = InMemoryFirebaseManager(latency=firestore_latency)
+    else:
+        firebase_config.firebase_manager = firebase_config.create_order_store()
+
+    import main
+    main.firebase_manager.initialize_firebase()
+    main.firebase_manager.start_open_orders_listener()
+    return main, fake_mp
+
+def _order_payload(rng):
+    items = [
+        {'id': f'prod_{rng.randint(1, 40)}', 'title': rng.choice(['Café americano', 'Latte', 'Croissant', 'Bagel']),
+         'unit_price': rng.choice([35, 45, 55, 80]), 'quantity': rng.randint(1, 3)}
+        for _ in range(rng.randint(1, 4))
+    ]
+    return {
+        'items': items,
+        'payer': {'name': f'Cliente {rng.randint(1, 9999)}', 'email': 'bench@caffeymiga.com',
+                  'phone': {'number': '5512345678'}},
+        'payment_method': rng.choice(['efectivo', 'terminal']),
+        'metadata': {'pickup_time': '10:30'}
+    }
+
+def _idempotency_headers():
+    return {'Idempotency-Key': uuid.uuid4().hex}
+
+# Escenarios: función(session, url base, rng) -> Response
+SCENARIOS = {
+    'pos_orders_post': lambda s, url, rng: s.post(f"{url}/pos/orders", json=_order_payload(rng),
+                                                  headers=_idempotency_headers()),
+    'pos_orders_get': lambda s, url, rng: s.get(f"{url}/pos/orders"),
+    'create_preference': lambda s, url, rng: s.post(f"{url}/create_preference", json=_order_payload(rng),
+                                                    headers=_idempotency_headers()),
+    'webhook': lambda s, url, rng: s.post(f"{url}/webhook", json={
+        'type': 'payment', 'data': {'id': str(rng.randint(10**9, 10**10))}
+    }),
+    'pos_stats': lambda s, url, rng: s.get(f"{url}/pos/stats")
+}
+
+def parse_mix(value):
+    """'pos_orders_post=3,pos_stats=1' -> {'pos_orders_post': 3.0, 'pos_stats': 1.0}"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido: {name} (disponibles: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(ordered, q):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def summarize(samples, elapsed):
+    """Throughput, errores y latencias (ms) de una lista de (status, segundos)"""
+    latencies = sorted(seconds * 1000 for _, seconds in samples)
+    status_codes = defaultdict(int)
+    for status, _ in samples:
+        status_codes[str(status)] += 1
+    errors = sum(1 for status, _ in samples if status == 'error' or status >= 500)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'status_codes': dict(status_codes),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0.0
+        }
+    }
+
+def run_load(base_url, duration=10.0, concurrency=8, mix=None, seed=None):
+    """
+    Generar carga durante `duration` segundos con `concurrency` clientes
+
+    Returns:
+        (dict escenario -> lista de (status, segundos), segundos transcurridos)
+    """
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(None if seed is None else seed + index)
+        session = requests.Session()
+        local = defaultdict(list)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            inicio = time.perf_counter()
+            try:
+                status = SCENARIOS[name](session, base_url, rng).status_code
+            except requests.RequestException:
+                status = 'error'
+            local[name].append((status, time.perf_counter() - inicio))
+        with lock:
+            for name, values in local.items():
+                samples[name].extend(values)
+
+    inicio = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return samples, time.perf_counter() - inicio
+
+def run_benchmark(duration=10.0, concurrency=8, mix=None, firestore_latency=0.0, mp_latency=0.0,
+                  mp_error_rate=0.0, seed=None, workdir=None, store='memory'):
+    """Levantar el backend con los falsos, generar la carga y devolver el reporte"""
+    workdir = workdir or tempfile.mkdtemp(prefix='caffeymiga_bench_')
+    main, fake_mp = load_backend(workdir, firestore_latency, mp_latency, mp_error_rate, store=store)
+    backend = _ServerThread(main.app)
+    try:
+        samples, elapsed = run_load(backend.url, duration, concurrency, mix, seed)
+    finally:
+        backend.stop()
+        fake_mp.stop()
+
+    all_samples = [sample for values in samples.values() for sample in values]
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'duration_s': duration,
+            'concurrency': concurrency,
+            'store': store,
+            'mix': mix or DEFAULT_MIX,
+            'firestore_latency_s': firestore_latency,
+            'mp_latency_s': mp_latency,
+            'mp_error_rate': mp_error_rate,
+            'seed': seed
+        },
+        'elapsed_s': round(elapsed, 3),
+        'overall': summarize(all_samples, elapsed),
+        'endpoints': {name: summarize(values, elapsed) for name, values in sorted(samples.items())},
+        # Trabajo que quedó en segundo plano al terminar (outbox hacia Firestore y webhooks)
+        'backlog': {
+            'outbox_pending': main.order_outbox.stats()['queue_depth'],
+            'webhook_pending': main.webhook_queue.stats()['pending']
+        }
+    }
+    return report
+
+def check_thresholds(report, min_throughput=None, max_p95_ms=None, max_error_rate=None):
+    """Lista de incumplimientos del reporte frente a los límites dados (vacía si todo bien)"""
+    overall = report['overall']
+    failures = []
+    if min_throughput is not None and overall['throughput_rps'] < min_throughput:
+        failures.append(f"throughput {overall['throughput_rps']} rps < {min_throughput} rps")
+    if max_p95_ms is not None and overall['latency_ms']['p95'] > max_p95_ms:
+        failures.append(f"p95 {overall['latency_ms']['p95']} ms > {max_p95_ms} ms")
+    if max_error_rate is not None and overall['error_rate'] > max_error_rate:
+        failures.append(f"tasa de errores {overall['error_rate']} > {max_error_rate}")
+    return failures
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark sin conexión del backend de Caffe & Miga')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de carga')
+    parser.add_argument('--concurrency', type=int, default=8, help='Clientes concurrentes')
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help=f"Pesos por escenario, ej. 'pos_orders_post=3,pos_stats=1' ({', '.join(SCENARIOS)})")
+    parser.add_argument('--store', choices=['memory', 'sqlite'], default='memory',
+                        help='Backend de pedidos: Firestore en memoria o almacén local SQLite')
+    parser.add_argument('--firestore-latency', type=float, default=0.0, help='Segundos por round trip a Firestore')
+    parser.add_argument('--mp-latency', type=float, default=0.0, help='Segundos por respuesta de Mercado Pago')
+    parser.add_argument('--mp-error-rate', type=float, default=0.0, help='Fracción de respuestas 503 de Mercado Pago')
+    parser.add_argument('--seed', type=int, default=None, help='Semilla para repetir la misma secuencia')
+    parser.add_argument('--output', help='Guardar el reporte JSON en este archivo')
+    parser.add_argument('--min-throughput', type=float, help='Fallar si el throughput total es menor (rps)')
+    parser.add_argument('--max-p95-ms', type=float, help='Fallar si el p95 total es mayor (ms)')
+    parser.add_argument('--max-error-rate', type=float, help='Fallar si la tasa de errores es mayor (0-1)')
+    args = parser.parse_args(argv)
+    # El backend se ejecuta en un directorio temporal: resolver la salida antes
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    report = run_benchmark(args.duration, args.concurrency, args.mix, args.firestore_latency,
+                           args.mp_latency, args.mp_error_rate, args.seed, store=args.store)
+    report['failures'] = check_thresholds(report, args.min_throughput, args.max_p95_ms, args.max_error_rate)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+    return 1 if report['failures'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
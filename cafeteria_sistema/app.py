@@ -1,11 +1,16 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 import pandas as pd
 import os
-import sqlite3
+import sys
 import logging
 
+# logging_setup está en la carpeta raíz del proyecto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logging_setup import configure_logging
+from sales_schema import get_sales_database, record_sale, day_range, QUERIES
+
 # Archivos base (solo inventario puede seguir en Excel)
 ARCHIVO_INVENTARIO = "inventario.xlsx"
 
@@ -13,12 +18,8 @@ ARCHIVO_INVENTARIO = "inventario.xlsx"
 usuario_valido = "admin"
 contrasena_valida = "admin"
 
-# Configuración básica de logging
-logging.basicConfig(
-    filename="cafeteria_log.txt",
-    level=logging.ERROR,
-    format="%(asctime)s %(levelname)s:%(message)s"
-)
+# Configuración de logging (cola no bloqueante y rotación por tamaño, ver logging_setup.py)
+configure_logging(log_file="cafeteria_log.txt", level=logging.ERROR, console=False)
 
 # Funciones de Inventario (puedes migrar a DB si lo deseas)
 def cargar_inventario():
@@ -44,58 +45,39 @@ def guardar_inventario(df):
 
 # Inicializar base de datos
 def inicializar_db():
-    conn = sqlite3.connect('ventas.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha TEXT,
-            producto TEXT,
-            cantidad INTEGER,
-            precio REAL,
-            pago TEXT,
-            estado TEXT,
-            motivo_cancelacion TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    # Crea las tablas o aplica las migraciones que falten (ver sales_schema.py)
+    get_sales_database()
 
 inicializar_db()
 
 def guardar_ticket_sqlite(fecha, producto, cantidad, precio, pago, estado="Activo", motivo_cancelacion=""):
-    conn = sqlite3.connect('ventas.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion))
-    conn.commit()
-    conn.close()
+    """Registrar un producto suelto como una venta de una línea (para una venta completa usar record_sale)"""
+    record_sale([{'producto': producto, 'cantidad': cantidad, 'precio': precio}], pago,
+                estado=estado, motivo_cancelacion=motivo_cancelacion, fecha=fecha)
 
 def obtener_ventas():
-    conn = sqlite3.connect('ventas.db')
-    df = pd.read_sql_query("SELECT * FROM tickets", conn)
-    conn.close()
-    return df
-
-def ventas_periodo(periodo="dia"):
-    df = obtener_ventas()
-    if df.empty:
-        return df
-    df["fecha"] = pd.to_datetime(df["fecha"])
-    df = df[df["estado"] == "Activo"]
-    hoy = pd.Timestamp.now().normalize()
+    return pd.read_sql_query("SELECT * FROM tickets", get_sales_database().connection())
+
+def resumen_periodo(periodo="dia"):
+    """
+    Ventas activas del período: (cantidad de ventas, total, [(producto, unidades)]).
+    El total suma los encabezados de venta; las líneas solo se leen para el detalle por producto
+    """
+    db = get_sales_database()
+    hoy = date.today()
     if periodo == "dia":
-        return df[df["fecha"].dt.normalize() == hoy]
+        desde = hoy
     elif periodo == "semana":
-        semana = hoy - pd.Timedelta(days=hoy.weekday())
-        return df[df["fecha"].dt.normalize() >= semana]
+        desde = hoy - timedelta(days=hoy.weekday())
     elif periodo == "mes":
-        mes = hoy.replace(day=1)
-        return df[df["fecha"].dt.normalize() >= mes]
+        desde = hoy.replace(day=1)
     else:
-        return df
+        ventas, total = db.query_one(QUERIES['totales'])
+        return ventas, total, db.query(QUERIES['productos'])
+
+    rango = day_range(desde, hoy)
+    ventas, total = db.query_one(QUERIES['totales_periodo'], rango)
+    return ventas, total, db.query(QUERIES['productos_periodo'], rango)
 
 def backup_db():
     import shutil
@@ -245,25 +227,20 @@ class AppCafeteria(tk.Tk):
         frame.pack(fill="both", expand=True)
         self.frames["resumen_ventas"] = frame
 
-        df_dia = ventas_periodo("dia")
-        df_semana = ventas_periodo("semana")
-        df_mes = ventas_periodo("mes")
-
-        def resumen(df, titulo):
-            if df.empty:
+        def resumen(periodo, titulo):
+            ventas, total, productos = resumen_periodo(periodo)
+            if not ventas:
                 return f"{titulo}\nSin ventas registradas.\n\n"
-            total = (df["precio"] * df["cantidad"]).sum()
-            productos = df.groupby("producto")["cantidad"].sum()
             resumen = f"{titulo}\nTotal: ${total:.2f}\nProductos vendidos:\n"
-            for prod, cant in productos.items():
+            for prod, cant in productos:
                 resumen += f"  {prod}: {cant}\n"
             return resumen + "\n"
 
-        texto = resumen(df_dia, "Ventas del Día")
+        texto = resumen("dia", "Ventas del Día")
         texto += "-"*40 + "\n"
-        texto += resumen(df_semana, "Ventas de la Semana")
+        texto += resumen("semana", "Ventas de la Semana")
         texto += "-"*40 + "\n"
-        texto += resumen(df_mes, "Ventas del Mes")
+        texto += resumen("mes", "Ventas del Mes")
 
         text_frame = tk.Frame(frame, bg="#F2F4F5")
         text_frame.pack(fill="both", expand=True, padx=10, pady=10)
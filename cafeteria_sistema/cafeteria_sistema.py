@@ -4,9 +4,10 @@ import time
 import json
 import tkinter as tk
 from tkinter import messagebox, filedialog
-from datetime import datetime, date, time as dt_time
+from datetime import datetime, date, timedelta, time as dt_time
 import pandas as pd
 import os
+import sys
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.utils import ImageReader
@@ -18,7 +19,6 @@ import matplotlib.pyplot as plt
 from functools import partial
 import logging
 import pdfplumber
-import sqlite3
 import tkinter.ttk as ttk
 import shutil
 import zipfile
@@ -35,79 +35,69 @@ try:
 except ImportError:
     RENDIMIENTO_DISPONIBLE = False
 
+# Importar cliente de eventos en tiempo real (módulo en la carpeta raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from order_schema import get_orders_database, now_timestamp, items_by_order, QUERIES
+from sales_schema import get_sales_database, record_sale, cancel_sale_line, day_range, QUERIES as SALES_QUERIES
+try:
+    from cliente_eventos_pos import SuscriptorEventosPOS
+    EVENTOS_DISPONIBLES = True
+except ImportError:
+    EVENTOS_DISPONIBLES = False
+
 
 class PedidosWebManager:
     def __init__(self):
-        self.db_path = "../caffeymiga_pedidos.db"  # NUEVO NOMBRE ÚNICO
+        self.db = get_orders_database()  # Almacén único de pedidos (ver order_schema.py)
         self.monitoring = False
         self.monitor_thread = None
+        self.suscriptor_eventos = None
+        self.al_detectar_pedidos = None  # Callback opcional: al_detectar_pedidos(cantidad)
+        self._despertar = threading.Event()
         
-        # DEBUG: Mostrar información de la base de datos
-        import os
-        abs_path = os.path.abspath(self.db_path)
-        print(f"🔍 DEBUG BD: Ruta relativa: {self.db_path}")
-        print(f"🔍 DEBUG BD: Ruta absoluta: {abs_path}")
-        print(f"🔍 DEBUG BD: ¿Existe? {os.path.exists(abs_path)}")
-        if os.path.exists(abs_path):
-            print(f"🔍 DEBUG BD: Tamaño: {os.path.getsize(abs_path)} bytes")
+        logger.debug("🔍 Base de datos de pedidos web", extra={'ruta': self.db.path})
         
     def test_connection(self):
         """Probar conexión con la base de datos local"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.close()
+            self.db.query_one("SELECT 1")
             return True
         except Exception as e:
-            logging.error(f"Error conectando a pos_pedidos.db: {e}")
+            logging.error(f"Error conectando a {self.db.path}: {e}")
             return False
     
     def get_web_orders(self):
         """Obtener pedidos web desde la base de datos local"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # DEBUG: Verificar estructura de la tabla
-            c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = c.fetchall()
-            print(f"🔍 DEBUG: Tablas en BD: {tables}")
-            
-            # DEBUG: Contar pedidos totales
-            c.execute("SELECT COUNT(*) FROM pedidos")
-            total = c.fetchone()[0]
-            print(f"🔍 DEBUG: Total pedidos en BD: {total}")
+            c = self.db.connection().cursor()
             
-            # DEBUG: Contar pendientes
-            c.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'pendiente'")
-            pendientes = c.fetchone()[0]
-            print(f"🔍 DEBUG: Pedidos pendientes: {pendientes}")
+            if logger.isEnabledFor(logging.DEBUG):
+                # Conteos extra solo con LOG_LEVEL=DEBUG: no se pagan en cada consulta
+                total = c.execute(QUERIES['contar_pedidos']).fetchone()[0]
+                pendientes = c.execute(QUERIES['contar_por_estado'], ('pendiente',)).fetchone()[0]
+                logger.debug("🔍 Pedidos en BD", extra={'total': total, 'pendientes': pendientes})
             
             # Obtener pedidos pendientes
-            c.execute("""
-                SELECT id, cliente_nombre, cliente_telefono, hora_recogida, 
-                       items, total, estado, metodo_pago, fecha_creacion 
-                FROM pedidos 
-                WHERE estado = 'pendiente'
-                ORDER BY fecha_creacion ASC
-            """)
+            c.execute(QUERIES['pedidos_pendientes'])
+            filas = c.fetchall()
+            # Items ya normalizados al guardar el pedido: no se decodifica JSON en cada refresco
+            items = items_by_order(c.execute(QUERIES['items_pedidos_pendientes']))
             
             pedidos = []
-            for row in c.fetchall():
+            for row in filas:
                 pedido = {
                     'id': row[0],
                     'cliente_nombre': row[1] if row[1] else 'Cliente Web',
                     'cliente_telefono': row[2] if row[2] else 'No especificado',
                     'hora_recogida': row[3] if row[3] else 'No especificada',
-                    'items': row[4] if row[4] else '[]',
-                    'total': row[5] if row[5] else 0.0,
-                    'estado': row[6],
-                    'metodo_pago': row[7] if row[7] else 'No especificado',
-                    'fecha_creacion': row[8]
+                    'items': items.get(row[0], []),
+                    'total': row[4] if row[4] else 0.0,
+                    'estado': row[5],
+                    'metodo_pago': row[6] if row[6] else 'No especificado',
+                    'fecha_creacion': row[7]
                 }
                 pedidos.append(pedido)
-                print(f"🔍 DEBUG: Pedido cargado: {row[0]} - {row[1]} - ${row[5]}")
             
-            conn.close()
             return pedidos
             
         except Exception as e:
@@ -117,38 +107,42 @@ class PedidosWebManager:
     def update_order_status(self, order_id, new_status):
         """Actualizar el estado de un pedido en la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
+            self.db.execute(QUERIES['actualizar_estado'], (new_status, now_timestamp(), order_id))
             
-            fecha_actualizacion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            c.execute("""
-                UPDATE pedidos 
-                SET estado = ?, fecha_actualizacion = ?
-                WHERE id = ?
-            """, (new_status, fecha_actualizacion, order_id))
-            
-            conn.commit()
-            conn.close()
             return True
             
         except Exception as e:
             logging.error(f"Error actualizando estado del pedido {order_id}: {e}")
             return False
     
-    def iniciar_monitoreo(self):
-        """Iniciar monitoreo automático de nuevos pedidos"""
+    def iniciar_monitoreo(self, server_url=None):
+        """Iniciar monitoreo automático de nuevos pedidos
+        
+        Si se indica `server_url`, además se suscribe a /pos/events para revisar
+        en cuanto llega un pedido en vez de esperar al siguiente ciclo de 30 s.
+        """
         if not self.monitoring:
             self.monitoring = True
+            self._despertar.clear()
             self.monitor_thread = threading.Thread(target=self._monitor_loop)
             self.monitor_thread.daemon = True
             self.monitor_thread.start()
+            
+            if server_url and EVENTOS_DISPONIBLES:
+                self.suscriptor_eventos = SuscriptorEventosPOS(
+                    server_url, lambda tipo, datos: self._despertar.set()
+                )
+                self.suscriptor_eventos.iniciar()
             return True
         return False
     
     def detener_monitoreo(self):
         """Detener monitoreo automático"""
         self.monitoring = False
+        self._despertar.set()
+        if self.suscriptor_eventos:
+            self.suscriptor_eventos.detener()
+            self.suscriptor_eventos = None
         if self.monitor_thread:
             self.monitor_thread = None
         return True
@@ -158,7 +152,10 @@ class PedidosWebManager:
         while self.monitoring:
             try:
                 self.verificar_nuevos_pedidos()
-                time.sleep(30)  # Verificar cada 30 segundos
+                # Verificar cada 30 segundos o antes si llega un evento del servidor
+                if self._despertar.wait(30):
+                    self._despertar.clear()
+                    time.sleep(2)  # Dar tiempo al sincronizador de escribir el pedido en la BD
             except Exception as e:
                 logging.error(f"Error en monitoreo de pedidos: {e}")
                 time.sleep(60)  # Esperar más tiempo si hay error
@@ -168,8 +165,9 @@ class PedidosWebManager:
         try:
             pedidos = self.get_web_orders()
             if pedidos:
-                # Aquí se puede agregar lógica para notificar sobre nuevos pedidos
                 logging.info(f"Se encontraron {len(pedidos)} pedidos pendientes")
+                if self.al_detectar_pedidos:
+                    self.al_detectar_pedidos(len(pedidos))
             return len(pedidos)
         except Exception as e:
             logging.error(f"Error verificando nuevos pedidos: {e}")
@@ -186,12 +184,10 @@ usuario_valido = "admin"
 contrasena_valida = "admin"
 ventanas_abiertas = {"menu": False, "inventario": False, "compra": False, "historial": False}
 
-# Configuración básica de logging
-logging.basicConfig(
-    filename="cafeteria_log.txt",
-    level=logging.ERROR,
-    format="%(asctime)s %(levelname)s:%(message)s"
-)
+# Configuración de logging (cola no bloqueante y rotación por tamaño, ver logging_setup.py)
+from logging_setup import configure_logging
+configure_logging(log_file="cafeteria_log.txt", level=logging.ERROR, console=False)
+logger = logging.getLogger(__name__)
 
 # Funciones de Inventario
 def cargar_inventario():
@@ -229,38 +225,17 @@ def guardar_inventario(df):
         logging.error(f"Error al guardar inventario: {e}")
 
 def inicializar_db():
-    conn = sqlite3.connect('ventas.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha TEXT,
-            producto TEXT,
-            cantidad INTEGER,
-            precio REAL,
-            pago TEXT,
-            estado TEXT,
-            motivo_cancelacion TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    # Crea las tablas o aplica las migraciones que falten (ver sales_schema.py)
+    get_sales_database()
 
 inicializar_db()
 
 def obtener_ventas():
-    conn = sqlite3.connect('ventas.db')
-    df = pd.read_sql_query("SELECT * FROM tickets", conn)
-    conn.close()
-    return df
+    return pd.read_sql_query("SELECT * FROM tickets", get_sales_database().connection())
 
 def eliminar_venta_db(id_ticket):
-    """Marca como 'Cancelado' una venta en la base de datos por su ID."""
-    conn = sqlite3.connect('ventas.db')
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET estado = 'Cancelado', motivo_cancelacion = 'Eliminado manualmente' WHERE id = ?", (id_ticket,))
-    conn.commit()
-    conn.close()
+    """Marca como 'Cancelado' el ticket (línea) con ese ID y recalcula los totales de su venta."""
+    cancel_sale_line(id_ticket, 'Eliminado manualmente')
 
 
 
@@ -270,6 +245,8 @@ class PedidosOnlineManager:
         self.server_url = "http://127.0.0.1:3000"
         self.monitoring = False
         self.monitor_thread = None
+        self.ultimo_etag = None  # ETag de la última lista recibida de /pos/orders
+        self.ultimos_pedidos = []
         
     def test_connection(self):
         """Probar conexión con el servidor web"""
@@ -282,10 +259,16 @@ class PedidosOnlineManager:
     def get_web_orders(self):
         """Obtener pedidos web del servidor"""
         try:
-            response = requests.get(f"{self.server_url}/pos/orders", timeout=10)
+            headers = {'If-None-Match': self.ultimo_etag} if self.ultimo_etag else {}
+            response = requests.get(f"{self.server_url}/pos/orders", headers=headers, timeout=10)
+            if response.status_code == 304:
+                # Sin cambios: reutilizar la última lista
+                return self.ultimos_pedidos
             if response.status_code == 200:
                 data = response.json()
-                return data.get('orders', [])
+                self.ultimo_etag = response.headers.get('ETag')
+                self.ultimos_pedidos = data.get('orders', [])
+                return self.ultimos_pedidos
             return []
         except Exception as e:
             print(f"Error obteniendo pedidos: {e}")
@@ -1025,7 +1008,10 @@ class AppCafeteria(tk.Tk):
                 filas_actualizar.append((producto, cantidad))
 
         # --- GUARDAR EN BASE DE DATOS ---
+        # Toda la venta (encabezado + líneas) en una sola transacción
         fecha_venta = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        lineas = []
+        promocion = None
         if self.promocion_frappes_activa:
             from collections import Counter
             frappes = []
@@ -1040,21 +1026,28 @@ class AppCafeteria(tk.Tk):
             # Agrupa frappes en promo
             frappe_counter = Counter(frappes[:pares * 2])
             for frappe_nombre, cantidad in frappe_counter.items():
-                guardar_ticket_sqlite(fecha_venta, frappe_nombre, cantidad, 50, self.metodo_pago.get())
+                precio_normal = float(productos[productos["Producto"] == frappe_nombre]["Precio"])
+                lineas.append({'producto': frappe_nombre, 'cantidad': cantidad, 'precio': 50,
+                               'precio_lista': precio_normal})
+            if pares:
+                promocion = "2x$100 Frappes"
 
             # Frappes restantes a precio normal
             for frappe_nombre in frappes[pares * 2:]:
                 precio_normal = float(productos[productos["Producto"] == frappe_nombre]["Precio"])
-                guardar_ticket_sqlite(fecha_venta, frappe_nombre, 1, precio_normal, self.metodo_pago.get())
+                lineas.append({'producto': frappe_nombre, 'cantidad': 1, 'precio': precio_normal})
 
             # Otros productos
             for producto, cantidad in otros_productos:
                 precio = float(productos[productos["Producto"] == producto]["Precio"])
-                guardar_ticket_sqlite(fecha_venta, producto, cantidad, precio, self.metodo_pago.get())
+                lineas.append({'producto': producto, 'cantidad': cantidad, 'precio': precio})
         else:
             for producto, cantidad in filas_actualizar:
                 precio = float(productos[productos["Producto"] == producto]["Precio"])
-                guardar_ticket_sqlite(fecha_venta, producto, cantidad, precio, self.metodo_pago.get())
+                lineas.append({'producto': producto, 'cantidad': cantidad, 'precio': precio})
+
+        if lineas:
+            record_sale(lineas, self.metodo_pago.get(), promocion=promocion, fecha=fecha_venta)
 
         # Solo imprime y guarda PDF si imprimir=True
         if imprimir:
@@ -1196,25 +1189,25 @@ class AppCafeteria(tk.Tk):
         frame.pack(fill="both", expand=True)
         self.frames["ventas"] = frame
 
-        df = obtener_ventas()
-        if df.empty:
+        db = get_sales_database()
+        if not db.query_one(SALES_QUERIES['contar_ventas'])[0]:
             tk.Label(frame, text="No hay ventas registradas aún.", font=("Arial", 14), bg="#FFFFFF").pack(pady=20)
         else:
-            df["fecha"] = pd.to_datetime(df["fecha"])
-            hoy = pd.Timestamp.now().normalize()
-            semana = hoy - pd.Timedelta(days=hoy.weekday())
+            hoy = date.today()
+            semana = hoy - timedelta(days=hoy.weekday())
             mes = hoy.replace(day=1)
 
-            ventas_dia = df[df["fecha"].dt.normalize() == hoy]
-            ventas_semana = df[df["fecha"].dt.normalize() >= semana]
-            ventas_mes = df[df["fecha"].dt.normalize() >= mes]
-
-            def resumen_ventas(df_ventas, titulo):
-                df_ventas = df_ventas[df_ventas["estado"] == "Activo"]
-                total = (df_ventas["precio"] * df_ventas["cantidad"]).sum()
-                productos = df_ventas.groupby("producto")["cantidad"].sum()
+            def resumen_ventas(titulo, desde=None):
+                # El total suma los encabezados de venta; las líneas solo para el detalle por producto
+                if desde is None:
+                    _, total = db.query_one(SALES_QUERIES['totales'])
+                    productos = db.query(SALES_QUERIES['productos'])
+                else:
+                    rango = day_range(desde, hoy)
+                    _, total = db.query_one(SALES_QUERIES['totales_periodo'], rango)
+                    productos = db.query(SALES_QUERIES['productos_periodo'], rango)
                 resumen = f"{titulo}\nTotal: ${total:.2f}\nProductos vendidos:\n"
-                for prod, cant in productos.items():
+                for prod, cant in productos:
                     resumen += f"  {prod}: {cant}\n"
                 return resumen + "\n"
 
@@ -1230,16 +1223,16 @@ class AppCafeteria(tk.Tk):
             texto.configure(yscrollcommand=scrollbar_texto.set)
 
             # Resúmenes con separación visual
-            texto.insert(tk.END, resumen_ventas(ventas_dia, "Ventas del Día"))
+            texto.insert(tk.END, resumen_ventas("Ventas del Día", hoy))
             texto.insert(tk.END, "-"*40 + "\n")
-            texto.insert(tk.END, resumen_ventas(ventas_semana, "Ventas de la Semana"))
+            texto.insert(tk.END, resumen_ventas("Ventas de la Semana", semana))
             texto.insert(tk.END, "-"*40 + "\n")
             mes_actual = datetime.now().strftime("%B %Y").capitalize()
-            texto.insert(tk.END, resumen_ventas(ventas_mes, f"Ventas del Mes ({mes_actual})"))
+            texto.insert(tk.END, resumen_ventas(f"Ventas del Mes ({mes_actual})", mes))
             texto.insert(tk.END, "-"*40 + "\n")
 
             # --- RESUMEN ACUMULADO ---
-            texto.insert(tk.END, resumen_ventas(df, "Ventas Totales Acumuladas"))
+            texto.insert(tk.END, resumen_ventas("Ventas Totales Acumuladas"))
             texto.insert(tk.END, "-"*40 + "\n")
 
         tk.Button(frame, text="Volver al Menú", command=self.show_menu,
@@ -1373,9 +1366,8 @@ class AppCafeteria(tk.Tk):
 
     def show_pedidos_online(self):
         """Mostrar pedidos web desde la base de datos local"""
-        # DEBUG: Agregar logs para diagnosticar
         try:
-            print("🔍 DEBUG: Iniciando show_pedidos_online")
+            logger.debug("🔍 Iniciando show_pedidos_online")
             
             self.clear_frames()
             frame = tk.Frame(self, bg="#F4F6F7")
@@ -1398,27 +1390,27 @@ class AppCafeteria(tk.Tk):
             tk.Label(scrollable_frame, text="🌐 PEDIDOS WEB EN LÍNEA", 
                     font=("Segoe UI", 28, "bold"), bg="#F4F6F7", fg="#E67E22").pack(pady=(20, 10))
             
-            print("🔍 DEBUG: Verificando conexión BD...")
+            logger.debug("🔍 Verificando conexión BD...")
             # Verificar conexión con la base de datos
             if not self.pedidos_web_manager.test_connection():
-                print("❌ DEBUG: Falló test_connection")
+                logger.error("❌ Falló test_connection")
                 error_frame = tk.Frame(scrollable_frame, bg="#FFFFFF", relief="groove", bd=3)
                 error_frame.pack(fill="x", padx=40, pady=20)
                 
                 tk.Label(error_frame, text="❌ ERROR DE CONEXIÓN", 
                         font=("Segoe UI", 20, "bold"), bg="#FFFFFF", fg="#E74C3C").pack(pady=20)
-                tk.Label(error_frame, text="No se puede acceder a la base de datos pos_pedidos.db", 
+                tk.Label(error_frame, text="No se puede acceder a la base de datos de pedidos", 
                         font=("Segoe UI", 14), bg="#FFFFFF", fg="#7F8C8D").pack(pady=10)
                 tk.Button(error_frame, text="⬅️ Volver al Menú", command=self.show_menu,
                          bg="#95A5A6", fg="white", font=("Segoe UI", 16, "bold")).pack(pady=20)
                 return
 
-            print("✅ DEBUG: Conexión BD OK")
+            logger.debug("✅ Conexión BD OK")
             
             # Obtener pedidos pendientes
-            print("🔍 DEBUG: Obteniendo pedidos...")
+            logger.debug("🔍 Obteniendo pedidos...")
             pedidos = self.pedidos_web_manager.get_web_orders()
-            print(f"✅ DEBUG: Obtenidos {len(pedidos)} pedidos")
+            logger.debug(f"✅ Obtenidos {len(pedidos)} pedidos")
             
             # Panel de control
             control_frame = tk.Frame(scrollable_frame, bg="#FFFFFF", relief="groove", bd=3)
@@ -1440,7 +1432,7 @@ class AppCafeteria(tk.Tk):
                      bg="#95A5A6", fg="white", font=("Segoe UI", 14, "bold")).pack(pady=15)
 
             if not pedidos:
-                print("⚠️ DEBUG: No hay pedidos - mostrando mensaje")
+                logger.debug("⚠️ No hay pedidos - mostrando mensaje")
                 # No hay pedidos
                 no_orders_frame = tk.Frame(scrollable_frame, bg="#FFFFFF", relief="groove", bd=3)
                 no_orders_frame.pack(fill="x", padx=40, pady=20)
@@ -1452,30 +1444,26 @@ class AppCafeteria(tk.Tk):
                 return
 
             # Mostrar pedidos
-            print(f"🔍 DEBUG: Creando widgets para {len(pedidos)} pedidos...")
+            logger.debug(f"🔍 Creando widgets para {len(pedidos)} pedidos...")
             for idx, pedido in enumerate(pedidos):
-                print(f"   Creando widget para pedido #{idx + 1}: {pedido['id']}")
                 try:
                     self.create_order_widget(scrollable_frame, pedido, idx)
-                    print(f"   ✅ Widget #{idx + 1} creado OK")
                 except Exception as widget_error:
-                    print(f"   ❌ Error en widget #{idx + 1}: {widget_error}")
+                    logger.error(f"❌ Error en widget #{idx + 1}: {widget_error}",
+                                 extra={'order_id': pedido.get('id')})
             
-            print("✅ DEBUG: show_pedidos_online completado")
+            logger.debug("✅ show_pedidos_online completado")
             
         except Exception as e:
-            print(f"❌ DEBUG: Error crítico en show_pedidos_online: {e}")
+            logger.error(f"❌ Error crítico en show_pedidos_online: {e}")
             import traceback
             traceback.print_exc()
 
     def create_order_widget(self, parent, order, index):
         """Crear widget para mostrar un pedido individual"""
-        # DEBUG: Log del pedido que se está procesando
-        print(f"🔍 DEBUG: Procesando pedido #{index + 1}")
-        print(f"   ID: {order.get('id', 'SIN ID')}")
-        print(f"   Cliente: {order.get('cliente_nombre', 'SIN NOMBRE')}")
-        print(f"   Total: ${order.get('total', 0)}")
-        print(f"   Items raw: {order.get('items', 'VACIO')[:100]}...")
+        logger.debug(f"🔍 Mostrando pedido #{index + 1}", extra={
+            'order_id': order.get('id', 'SIN ID'), 'total': order.get('total', 0)
+        })
         
         # Frame principal del pedido
         order_frame = tk.Frame(parent, bg="#FFFFFF", relief="groove", bd=3)
@@ -1529,57 +1517,30 @@ class AppCafeteria(tk.Tk):
         tk.Label(items_frame, text="🛍️ PRODUCTOS PEDIDOS:", 
                 font=("Segoe UI", 12, "bold"), bg="#FFFFFF", fg="#E67E22").pack(anchor="w")
 
-        try:
-            import json
-            # Parsear los items desde JSON
-            items_str = order.get('items', '') or '[]'
-            print(f"🔍 DEBUG: Items string: {items_str[:200]}...")
-            
-            if items_str and items_str.strip():
-                items = json.loads(items_str)
-                print(f"🔍 DEBUG: Items parseados: {len(items)} productos")
-            else:
-                items = []
-                print("🔍 DEBUG: No hay items o string vacío")
-            
-            if items and len(items) > 0:
-                for i, item in enumerate(items, 1):
-                    # Obtener información del producto de manera más robusta
-                    name = item.get('name', item.get('title', 'Producto sin nombre'))
-                    quantity = item.get('quantity', item.get('cantidad', 1))
-                    price = float(item.get('price', item.get('precio', item.get('unit_price', 0))))
-                    description = item.get('description', item.get('descripcion', ''))
-                    
-                    print(f"   Producto {i}: {name} x{quantity} = ${price}")
-                    
-                    # Crear texto del producto más detallado
-                    item_text = f"   {i}. {name}"
-                    if quantity > 1:
-                        item_text += f" x{quantity}"
-                    item_text += f" = ${price:.2f}"
-                    
-                    # Label principal del producto
-                    product_label = tk.Label(items_frame, text=item_text, 
-                            font=("Segoe UI", 11, "bold"), bg="#FFFFFF", fg="#2C3E50")
-                    product_label.pack(anchor="w", padx=20)
-                    
-                    # Si hay descripción, mostrarla
-                    if description and description.strip():
-                        desc_text = f"      {description}"
-                        tk.Label(items_frame, text=desc_text, 
-                                font=("Segoe UI", 10), bg="#FFFFFF", fg="#7F8C8D").pack(anchor="w", padx=20)
-            else:
-                tk.Label(items_frame, text="• Pedido sin productos especificados", 
-                        font=("Segoe UI", 11), bg="#FFFFFF", fg="#E67E22").pack(anchor="w", padx=20)
-                        
-        except json.JSONDecodeError as e:
-            print(f"❌ DEBUG: Error JSON: {e}")
-            tk.Label(items_frame, text=f"• Error JSON: {str(e)}", 
-                    font=("Segoe UI", 11), bg="#FFFFFF", fg="#E74C3C").pack(anchor="w", padx=20)
-        except Exception as e:
-            print(f"❌ DEBUG: Error productos: {e}")
-            tk.Label(items_frame, text=f"• Error al procesar productos: {str(e)}", 
-                    font=("Segoe UI", 11), bg="#FFFFFF", fg="#E74C3C").pack(anchor="w", padx=20)
+        items = order.get('items', [])
+        logger.debug(f"🔍 Items del pedido: {len(items)} productos")
+        
+        if items:
+            for i, item in enumerate(items, 1):
+                # Crear texto del producto más detallado
+                item_text = f"   {i}. {item['nombre']}"
+                if item['cantidad'] > 1:
+                    item_text += f" x{item['cantidad']}"
+                item_text += f" = ${item['precio']:.2f}"
+                
+                # Label principal del producto
+                product_label = tk.Label(items_frame, text=item_text, 
+                        font=("Segoe UI", 11, "bold"), bg="#FFFFFF", fg="#2C3E50")
+                product_label.pack(anchor="w", padx=20)
+                
+                # Si hay descripción, mostrarla
+                if item['descripcion'].strip():
+                    desc_text = f"      {item['descripcion']}"
+                    tk.Label(items_frame, text=desc_text, 
+                            font=("Segoe UI", 10), bg="#FFFFFF", fg="#7F8C8D").pack(anchor="w", padx=20)
+        else:
+            tk.Label(items_frame, text="• Pedido sin productos especificados", 
+                    font=("Segoe UI", 11), bg="#FFFFFF", fg="#E67E22").pack(anchor="w", padx=20)
 
         # Botones de acción
         buttons_frame = tk.Frame(order_frame, bg="#FFFFFF")
@@ -1617,32 +1578,22 @@ class AppCafeteria(tk.Tk):
     def add_web_order_to_tickets(self, order):
         """Agregar pedido web al sistema de tickets"""
         try:
-            import json
             fecha_venta = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Procesar items del pedido
-            items = json.loads(order['items']) if order['items'] else []
+            # Items del pedido (ya normalizados en pedido_items)
+            items = order.get('items', [])
             
             if not items:
                 messagebox.showwarning("Sin productos", "Este pedido no tiene productos válidos")
                 return
             
-            # Agregar cada item como un ticket separado
-            for item in items:
-                producto = item.get('name', 'Producto Web')
-                cantidad = item.get('quantity', 1)
-                precio = item.get('price', 0)
-                
-                # Guardar en la base de datos de tickets
-                conn = sqlite3.connect('ventas.db')
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (fecha_venta, f"{producto} (Web)", cantidad, precio, 
-                      order.get('metodo_pago', 'Web'), 'Activo', ''))
-                conn.commit()
-                conn.close()
+            # Una venta con una línea por item, en una sola transacción
+            lineas = [
+                {'producto': f"{item['nombre']} (Web)", 'cantidad': item['cantidad'], 'precio': item['precio']}
+                for item in items
+            ]
+            record_sale(lineas, order.get('metodo_pago', 'Web'), origen='WEB',
+                        pedido_web_id=order['id'], fecha=fecha_venta)
             
             # Marcar el pedido como completado
             self.pedidos_web_manager.update_order_status(order['id'], 'completado')
@@ -1658,7 +1609,11 @@ class AppCafeteria(tk.Tk):
     def iniciar_monitoreo_pedidos(self):
         """Iniciar el monitoreo automático de pedidos web"""
         try:
-            self.pedidos_web_manager.iniciar_monitoreo()
+            # Los eventos llegan en un hilo de fondo: refrescar la vista desde el hilo de Tk
+            self.pedidos_web_manager.al_detectar_pedidos = (
+                lambda cantidad: self.after(0, self.refrescar_pedidos_online_si_visible)
+            )
+            self.pedidos_web_manager.iniciar_monitoreo(self.pedidos_manager.server_url)
             self.estado_monitoreo_label.config(
                 text="🟢 Monitoreo: Activo",
                 fg="#27AE60"
@@ -1679,20 +1634,18 @@ class AppCafeteria(tk.Tk):
         except Exception as e:
             messagebox.showerror("Error", f"Error al detener monitoreo: {e}")
 
+    def refrescar_pedidos_online_si_visible(self):
+        """Volver a dibujar la vista de pedidos web solo si está abierta"""
+        frame = self.frames.get("pedidos_online")
+        if frame is not None and frame.winfo_ismapped():
+            self.show_pedidos_online()
+
     def agregar_ticket(self, nombre, cantidad, precio, pago, estado="Completado", motivo_cancelacion=""):
         """Agregar ticket a la base de datos"""
         try:
-            conn = sqlite3.connect('ventas.db')
-            c = conn.cursor()
-            fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            c.execute("""
-                INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (fecha_actual, nombre, cantidad, precio, pago, estado, motivo_cancelacion))
+            record_sale([{'producto': nombre, 'cantidad': cantidad, 'precio': precio}], pago,
+                        estado=estado, motivo_cancelacion=motivo_cancelacion)
             
-            conn.commit()
-            conn.close()
             return True
         except Exception as e:
             logging.error(f"Error agregando ticket: {e}")
@@ -1772,14 +1725,9 @@ def agregar_a_excel(datos):
     print("¡Tickets agregados al Excel!")
 
 def guardar_ticket_sqlite(fecha, producto, cantidad, precio, pago, estado="Activo", motivo_cancelacion=""):
-    conn = sqlite3.connect('ventas.db')
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion))
-    conn.commit()
-    conn.close()
+    """Registrar un producto suelto como una venta de una línea (para una venta completa usar record_sale)"""
+    record_sale([{'producto': producto, 'cantidad': cantidad, 'precio': precio}], pago,
+                estado=estado, motivo_cancelacion=motivo_cancelacion, fecha=fecha)
 
 def invertir_logo():
     """
@@ -100,29 +100,17 @@ def verificar_rendimiento():
     
     return stats, alertas
 
-def configurar_logging_optimizado():
-    """Configurar logging optimizado para rendimiento"""
+def configurar_logging_optimizado(archivo='cafeteria_log.txt', nivel=None):
+    """Configurar logging optimizado para rendimiento (cola no bloqueante + rotación)"""
+    import os
+    import sys
     import logging
-    from logging.handlers import RotatingFileHandler
-    
-    # Crear handler con rotación automática
-    handler = RotatingFileHandler(
-        'cafeteria_log.txt',
-        maxBytes=get_config('FILES', 'LOG_MAX_SIZE'),
-        backupCount=get_config('FILES', 'LOG_BACKUP_COUNT')
-    )
-    
-    formatter = logging.Formatter(
-        '%(asctime)s %(levelname)s:%(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
     
-    # Configurar logger raíz
-    logging.getLogger().handlers.clear()
-    logging.getLogger().addHandler(handler)
-    logging.getLogger().setLevel(logging.INFO)
+    # logging_setup vive en la carpeta raíz del proyecto y usa LOG_MAX_SIZE/LOG_BACKUP_COUNT de aquí
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from logging_setup import configure_logging
     
+    configure_logging(log_file=archivo, level=nivel or logging.INFO, console=False)
     return True
 
 if __name__ == "__main__":
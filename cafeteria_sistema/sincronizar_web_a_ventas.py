@@ -5,12 +5,12 @@ SINCRONIZADOR DE PEDIDOS WEB A SISTEMA DE VENTAS
 ===============================================
 
 Este script sincroniza automáticamente los pedidos web pendientes
-desde la base de datos pos_pedidos.db hacia el sistema de ventas
+desde el almacén de pedidos (ver order_schema.py) hacia el sistema de ventas
 principal en ventas.db.
 
 Funcionalidades:
-- Detecta pedidos pendientes en pos_pedidos.db
-- Los convierte a tickets en ventas.db
+- Detecta pedidos pendientes en el almacén de pedidos
+- Los convierte en ventas (encabezado + líneas) en ventas.db
 - Marca los pedidos como 'procesados' 
 - Genera logs de actividad
 - Puede ejecutarse manualmente o como servicio
@@ -19,39 +19,35 @@ Autor: Sistema Caffè & Miga
 Fecha: Julio 2025
 """
 
-import sqlite3
-import json
 import logging
 import sys
 import os
 from datetime import datetime
 from typing import List, Dict, Any, Tuple
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sincronizacion_web.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configuración de logging (logging_setup está en la carpeta raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logging_setup import configure_logging
+from order_schema import get_orders_database, now_timestamp, items_by_order, QUERIES
+from sales_schema import get_sales_database, record_sale, SALES_DB_PATH, QUERIES as SALES_QUERIES
+configure_logging(log_file='sincronizacion_web.log')
 
 logger = logging.getLogger(__name__)
 
 class SincronizadorWebVentas:
     """Clase principal para sincronizar pedidos web con sistema de ventas"""
     
-    def __init__(self, db_web_path: str = "pos_pedidos.db", db_ventas_path: str = "ventas.db"):
+    def __init__(self, db_web_path: str = None, db_ventas_path: str = None):
         """
         Inicializar sincronizador
         
         Args:
-            db_web_path: Ruta a la base de datos de pedidos web
-            db_ventas_path: Ruta a la base de datos de ventas
+            db_web_path: Ruta al almacén de pedidos (por defecto ORDERS_DB_PATH)
+            db_ventas_path: Ruta a la base de datos de ventas (por defecto SALES_DB_PATH)
         """
-        self.db_web_path = db_web_path
-        self.db_ventas_path = db_ventas_path
+        self.db_web = get_orders_database(db_web_path)
+        self.db_web_path = self.db_web.path
+        self.db_ventas_path = db_ventas_path or SALES_DB_PATH
         
         # Verificar que las bases de datos existan
         self._verificar_bases_datos()
@@ -62,47 +58,14 @@ class SincronizadorWebVentas:
         logger.info("✅ Sincronizador inicializado correctamente")
     
     def _verificar_bases_datos(self) -> None:
-        """Verificar que las bases de datos existan"""
-        if not os.path.exists(self.db_web_path):
-            raise FileNotFoundError(f"❌ No se encontró la base de datos web: {self.db_web_path}")
-        
+        """Verificar que la base de datos de ventas exista (el almacén de pedidos se crea al abrirlo)"""
         if not os.path.exists(self.db_ventas_path):
             logger.warning(f"⚠️ Base de datos de ventas no existe, se creará: {self.db_ventas_path}")
     
     def _inicializar_db_ventas(self) -> None:
-        """Inicializar la base de datos de ventas si no existe"""
+        """Crear las tablas de ventas o aplicar las migraciones que falten (ver sales_schema.py)"""
         try:
-            conn = sqlite3.connect(self.db_ventas_path)
-            c = conn.cursor()
-            
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS tickets (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha TEXT,
-                    producto TEXT,
-                    cantidad INTEGER,
-                    precio REAL,
-                    pago TEXT,
-                    estado TEXT DEFAULT 'Activo',
-                    motivo_cancelacion TEXT,
-                    origen TEXT DEFAULT 'LOCAL',
-                    pedido_web_id TEXT
-                )
-            ''')
-            
-            # Agregar columnas nuevas si no existen
-            try:
-                c.execute("ALTER TABLE tickets ADD COLUMN origen TEXT DEFAULT 'LOCAL'")
-            except sqlite3.OperationalError:
-                pass  # La columna ya existe
-            
-            try:
-                c.execute("ALTER TABLE tickets ADD COLUMN pedido_web_id TEXT")
-            except sqlite3.OperationalError:
-                pass  # La columna ya existe
-            
-            conn.commit()
-            conn.close()
+            self.db_ventas = get_sales_database(self.db_ventas_path)
             logger.info("✅ Base de datos de ventas inicializada")
             
         except Exception as e:
@@ -117,33 +80,25 @@ class SincronizadorWebVentas:
             Lista de diccionarios con los pedidos pendientes
         """
         try:
-            conn = sqlite3.connect(self.db_web_path)
-            c = conn.cursor()
-            
-            c.execute("""
-                SELECT id, cliente_nombre, cliente_telefono, hora_recogida, 
-                       items, total, estado, metodo_pago, fecha_creacion 
-                FROM pedidos 
-                WHERE estado = 'pendiente'
-                ORDER BY fecha_creacion ASC
-            """)
-            
+            filas = self.db_web.query(QUERIES['pedidos_pendientes'])
+            # Items ya normalizados al guardar el pedido (pedido_items), en una sola consulta
+            items = items_by_order(self.db_web.query(QUERIES['items_pedidos_pendientes']))
+
             pedidos = []
-            for row in c.fetchall():
+            for row in filas:
                 pedido = {
                     'id': row[0],
                     'cliente_nombre': row[1] if row[1] else 'Cliente Web',
                     'cliente_telefono': row[2] if row[2] else 'No especificado',
                     'hora_recogida': row[3] if row[3] else 'No especificada',
-                    'items': row[4] if row[4] else '[]',
-                    'total': row[5] if row[5] else 0.0,
-                    'estado': row[6],
-                    'metodo_pago': row[7] if row[7] else 'Web',
-                    'fecha_creacion': row[8]
+                    'items': items.get(row[0], []),
+                    'total': row[4] if row[4] else 0.0,
+                    'estado': row[5],
+                    'metodo_pago': row[6] if row[6] else 'Web',
+                    'fecha_creacion': row[7]
                 }
                 pedidos.append(pedido)
-            
-            conn.close()
+
             logger.info(f"📋 Encontrados {len(pedidos)} pedidos pendientes")
             return pedidos
             
@@ -151,40 +106,9 @@ class SincronizadorWebVentas:
             logger.error(f"❌ Error obteniendo pedidos pendientes: {e}")
             return []
     
-    def procesar_items_pedido(self, items_json: str) -> List[Dict[str, Any]]:
-        """
-        Procesar los items de un pedido desde JSON
-        
-        Args:
-            items_json: String JSON con los items del pedido
-            
-        Returns:
-            Lista de items procesados
-        """
-        try:
-            if not items_json or items_json == '[]':
-                return []
-            
-            items = json.loads(items_json)
-            items_procesados = []
-            
-            for item in items:
-                item_procesado = {
-                    'nombre': item.get('name', item.get('nombre', 'Producto Web')),
-                    'cantidad': int(item.get('quantity', item.get('cantidad', 1))),
-                    'precio': float(item.get('price', item.get('precio', 0)))
-                }
-                items_procesados.append(item_procesado)
-            
-            return items_procesados
-            
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
-            logger.warning(f"⚠️ Error procesando items del pedido: {e}")
-            return [{'nombre': 'Pedido Web (Error en items)', 'cantidad': 1, 'precio': 0}]
-    
     def agregar_ticket_ventas(self, pedido: Dict[str, Any]) -> bool:
         """
-        Agregar un pedido como tickets en la base de datos de ventas
+        Agregar un pedido como una venta en la base de datos de ventas
         
         Args:
             pedido: Diccionario con los datos del pedido
@@ -193,54 +117,33 @@ class SincronizadorWebVentas:
             True si se agregó correctamente, False en caso contrario
         """
         try:
-            items = self.procesar_items_pedido(pedido['items'])
+            items = pedido['items']
             
             if not items:
                 logger.warning(f"⚠️ Pedido {pedido['id']} no tiene items válidos")
                 return False
             
-            conn = sqlite3.connect(self.db_ventas_path)
-            c = conn.cursor()
-            
-            fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            tickets_agregados = 0
-            
+            lineas = []
             for item in items:
                 # Crear descripción del producto con información del cliente
                 producto_desc = f"{item['nombre']} (WEB)"
                 if pedido['cliente_nombre'] != 'Cliente Web':
                     producto_desc += f" - {pedido['cliente_nombre']}"
-                
-                # Información adicional en motivo_cancelacion para referencia
-                info_adicional = (
-                    f"Pedido web ID: {pedido['id']} | "
-                    f"Cliente: {pedido['cliente_nombre']} | "
-                    f"Tel: {pedido['cliente_telefono']} | "
-                    f"Recogida: {pedido['hora_recogida']}"
-                )
-                
-                c.execute("""
-                    INSERT INTO tickets 
-                    (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion, origen, pedido_web_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    fecha_actual,
-                    producto_desc,
-                    item['cantidad'],
-                    item['precio'],
-                    f"WEB-{pedido['metodo_pago']}",
-                    'Activo',
-                    info_adicional,
-                    'WEB',
-                    pedido['id']
-                ))
-                
-                tickets_agregados += 1
-            
-            conn.commit()
-            conn.close()
+                lineas.append({'producto': producto_desc, 'cantidad': item['cantidad'], 'precio': item['precio']})
+
+            # Información adicional en las notas de la venta para referencia
+            info_adicional = (
+                f"Pedido web ID: {pedido['id']} | "
+                f"Cliente: {pedido['cliente_nombre']} | "
+                f"Tel: {pedido['cliente_telefono']} | "
+                f"Recogida: {pedido['hora_recogida']}"
+            )
+
+            # Encabezado y líneas en una sola transacción: o entra la venta completa o nada
+            venta = record_sale(lineas, f"WEB-{pedido['metodo_pago']}", origen='WEB',
+                                pedido_web_id=pedido['id'], notas=info_adicional, db=self.db_ventas)
             
-            logger.info(f"✅ Pedido {pedido['id']} convertido a {tickets_agregados} tickets")
+            logger.info(f"✅ Pedido {pedido['id']} convertido en la venta {venta['numero']} ({len(lineas)} líneas)")
             return True
             
         except Exception as e:
@@ -258,24 +161,12 @@ class SincronizadorWebVentas:
             True si se marcó correctamente, False en caso contrario
         """
         try:
-            conn = sqlite3.connect(self.db_web_path)
-            c = conn.cursor()
-            
-            fecha_actualizacion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            c.execute("""
-                UPDATE pedidos 
-                SET estado = 'procesado', fecha_actualizacion = ?
-                WHERE id = ?
-            """, (fecha_actualizacion, pedido_id))
-            
+            c = self.db_web.execute(QUERIES['actualizar_estado'], ('procesado', now_timestamp(), pedido_id))
+
             if c.rowcount > 0:
-                conn.commit()
-                conn.close()
                 logger.info(f"✅ Pedido {pedido_id} marcado como procesado")
                 return True
             else:
-                conn.close()
                 logger.warning(f"⚠️ No se encontró el pedido {pedido_id} para actualizar")
                 return False
                 
@@ -334,35 +225,15 @@ class SincronizadorWebVentas:
         """
         try:
             # Estadísticas de pedidos web
-            conn_web = sqlite3.connect(self.db_web_path)
-            c_web = conn_web.cursor()
-            
-            c_web.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'pendiente'")
-            pendientes = c_web.fetchone()[0]
-            
-            c_web.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'procesado'")
-            procesados = c_web.fetchone()[0]
-            
-            c_web.execute("SELECT COUNT(*) FROM pedidos")
-            total_web = c_web.fetchone()[0]
-            
-            conn_web.close()
-            
+            pendientes = self.db_web.query_one(QUERIES['contar_por_estado'], ('pendiente',))[0]
+            procesados = self.db_web.query_one(QUERIES['contar_por_estado'], ('procesado',))[0]
+            total_web = self.db_web.query_one(QUERIES['contar_pedidos'])[0]
+
             # Estadísticas de ventas
-            conn_ventas = sqlite3.connect(self.db_ventas_path)
-            c_ventas = conn_ventas.cursor()
-            
-            c_ventas.execute("SELECT COUNT(*) FROM tickets WHERE origen = 'WEB'")
-            tickets_web = c_ventas.fetchone()[0]
-            
-            c_ventas.execute("SELECT COUNT(*) FROM tickets WHERE origen = 'LOCAL' OR origen IS NULL")
-            tickets_local = c_ventas.fetchone()[0]
-            
-            c_ventas.execute("SELECT COUNT(*) FROM tickets")
-            total_tickets = c_ventas.fetchone()[0]
-            
-            conn_ventas.close()
-            
+            tickets_web = self.db_ventas.query_one(SALES_QUERIES['contar_ventas_origen'], ('WEB',))[0]
+            tickets_local = self.db_ventas.query_one(SALES_QUERIES['contar_ventas_origen'], ('LOCAL',))[0]
+            total_tickets = self.db_ventas.query_one(SALES_QUERIES['contar_ventas'])[0]
+
             estadisticas = {
                 'pedidos_web': {
                     'pendientes': pendientes,
@@ -401,7 +272,7 @@ class SincronizadorWebVentas:
         print(f"   • Procesados: {estadisticas['pedidos_web']['procesados']}")
         print(f"   • Total: {estadisticas['pedidos_web']['total']}")
         print()
-        print("🎫 TICKETS DE VENTAS:")
+        print("🎫 VENTAS:")
         print(f"   • Desde web: {estadisticas['tickets_ventas']['web']}")
         print(f"   • Locales: {estadisticas['tickets_ventas']['local']}")
         print(f"   • Total: {estadisticas['tickets_ventas']['total']}")
@@ -0,0 +1,137 @@
+# Circuit breaker para dependencias externas de Caffe & Miga
+# Tras varias fallas seguidas (o una tasa de fallas alta, contando las llamadas lentas como
+# fallas) se "abre" y rechaza llamadas al instante durante un tiempo, en vez de dejar a
+# cada worker esperando a un servicio caído
+
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída; se rechaza la llamada sin intentarla"""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} no disponible temporalmente, reintentar en {retry_after}s")
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, failure_rate=None, window_size=20,
+                 slow_call_seconds=None):
+        """
+        Args:
+            name: Nombre de la dependencia (aparece en logs y errores)
+            failure_threshold: Fallas seguidas que abren el circuito
+            reset_timeout: Segundos abierto antes de dejar pasar una llamada de prueba
+            failure_rate: Fracción de fallas entre las últimas `window_size` llamadas que
+                abre el circuito (None = solo fallas seguidas)
+            window_size: Llamadas recientes consideradas para failure_rate
+            slow_call_seconds: Una llamada exitosa más lenta que esto cuenta como falla
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.recent = deque(maxlen=window_size)  # True = falla
+        self.state = CLOSED
+        self.failures = 0
+        self.total_failures = 0
+        self.opened_at = 0
+        self.last_error = None
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Verificar si se puede llamar; lanza CircuitOpenError si el circuito está abierto"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+
+            remaining = self.opened_at + self.reset_timeout - time.time()
+            if self.state == OPEN and remaining <= 0:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+
+            # Medio abierto: una sola llamada de prueba a la vez
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(1, int(remaining + 0.999)))
+
+    def record_success(self, duration=None):
+        """Registrar una llamada exitosa (si tardó más que slow_call_seconds cuenta como falla)"""
+        if self.slow_call_seconds and duration is not None and duration > self.slow_call_seconds:
+            self.record_failure(f"llamada lenta ({duration:.2f}s)")
+            return
+
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"✅ Circuito {self.name} cerrado de nuevo")
+                self.recent.clear()
+            self.state = CLOSED
+            self.failures = 0
+            self.recent.append(False)
+            self._probe_in_flight = False
+
+    def _rate_exceeded(self):
+        """True si la tasa de fallas de la ventana llena supera failure_rate (con el lock tomado)"""
+        if self.failure_rate is None or len(self.recent) < self.recent.maxlen:
+            return False
+        return sum(self.recent) / len(self.recent) >= self.failure_rate
+
+    def record_failure(self, error=None):
+        """Registrar una falla: abre el circuito al llegar al umbral o si falla la prueba"""
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.recent.append(True)
+            self.last_error = str(error) if error else None
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold or self._rate_exceeded():
+                if self.state != OPEN:
+                    logger.warning(f"🔌 Circuito {self.name} abierto tras {self.failures} fallas: {error}")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def call(self, func, *args, **kwargs):
+        """Ejecutar func protegida por el circuito; cualquier excepción cuenta como falla"""
+        self.before_call()
+        inicio = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.monotonic() - inicio)
+        return result
+
+    @property
+    def is_open(self):
+        """True mientras el circuito rechaza llamadas (abierto y sin prueba disponible aún)"""
+        with self._lock:
+            return self.state == OPEN and time.time() < self.opened_at + self.reset_timeout
+
+    def stats(self):
+        """Estado actual del circuito"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'total_failures': self.total_failures,
+                'recent_failure_rate': round(sum(self.recent) / len(self.recent), 3) if self.recent else 0,
+                'rejected_calls': self.rejected,
+                'last_error': self.last_error,
+                'retry_after': max(0, round(self.opened_at + self.reset_timeout - time.time(), 1))
+                               if self.state == OPEN else 0
+            }
@@ -0,0 +1,125 @@
+# Cliente de eventos en tiempo real para el POS de Caffe & Miga
+# Se suscribe a /pos/events (Server-Sent Events) en un hilo de fondo
+
+import requests
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SuscriptorEventosPOS:
+    def __init__(self, server_url, al_recibir_evento, espera_reconexion=3):
+        """
+        Suscriptor SSE con reconexión automática y reenvío por Last-Event-ID
+
+        Args:
+            server_url: URL del servidor de Caffe & Miga
+            al_recibir_evento: Función llamada como al_recibir_evento(tipo, datos)
+                desde el hilo de fondo (en Tkinter, reprogramar con `after`)
+            espera_reconexion: Segundos iniciales de espera antes de reconectar
+        """
+        self.server_url = server_url.rstrip('/')
+        self.al_recibir_evento = al_recibir_evento
+        self.espera_reconexion = espera_reconexion
+        self.ultimo_evento_id = None
+        self.ejecutando = False
+        self.hilo = None
+        self._respuesta = None
+
+    def iniciar(self):
+        """Iniciar la suscripción en un hilo daemon"""
+        if self.ejecutando:
+            return False
+
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        logger.info(f"📡 Suscrito a eventos de pedidos: {self.server_url}/pos/events")
+        return True
+
+    def detener(self):
+        """Detener la suscripción y cerrar la conexión abierta"""
+        self.ejecutando = False
+        if self._respuesta is not None:
+            try:
+                self._respuesta.close()
+            except Exception:
+                pass
+
+    def _bucle(self):
+        """Mantener la conexión abierta, reconectando con espera creciente"""
+        espera = self.espera_reconexion
+
+        while self.ejecutando:
+            try:
+                headers = {'Accept': 'text/event-stream'}
+                if self.ultimo_evento_id:
+                    headers['Last-Event-ID'] = str(self.ultimo_evento_id)
+
+                with requests.get(f"{self.server_url}/pos/events", headers=headers,
+                                  stream=True, timeout=(5, 60)) as respuesta:
+                    self._respuesta = respuesta
+                    if respuesta.status_code != 200:
+                        raise Exception(f"Servidor respondió {respuesta.status_code}")
+
+                    espera = self.espera_reconexion
+                    self._leer_stream(respuesta)
+
+            except Exception as e:
+                if not self.ejecutando:
+                    break
+                logger.warning(f"⚠️ Conexión de eventos perdida: {e}. Reintentando en {espera}s")
+                time.sleep(espera)
+                espera = min(espera * 2, 60)
+            finally:
+                self._respuesta = None
+
+    def _leer_stream(self, respuesta):
+        """Interpretar las líneas text/event-stream y despachar cada evento"""
+        evento_id, tipo, datos = None, 'message', []
+
+        for linea in respuesta.iter_lines(decode_unicode=True):
+            if not self.ejecutando:
+                return
+
+            if linea is None:
+                continue
+
+            if linea == '':
+                # Línea vacía: fin del evento
+                if datos:
+                    self._despachar(evento_id, tipo, '\n'.join(datos))
+                evento_id, tipo, datos = None, 'message', []
+                continue
+
+            if linea.startswith(':'):
+                continue  # keep-alive
+
+            campo, _, valor = linea.partition(':')
+            valor = valor[1:] if valor.startswith(' ') else valor
+
+            if campo == 'id':
+                evento_id = valor
+            elif campo == 'event':
+                tipo = valor
+            elif campo == 'data':
+                datos.append(valor)
+            elif campo == 'retry' and valor.isdigit():
+                self.espera_reconexion = int(valor) / 1000
+
+    def _despachar(self, evento_id, tipo, datos_texto):
+        """Registrar el ID recibido y llamar al callback del POS"""
+        if evento_id:
+            self.ultimo_evento_id = evento_id
+
+        try:
+            datos = json.loads(datos_texto)
+        except ValueError:
+            datos = datos_texto
+
+        try:
+            self.al_recibir_evento(tipo, datos)
+        except Exception as e:
+            logger.error(f"❌ Error procesando evento {tipo}: {e}")
@@ -0,0 +1,107 @@
+# Servidor falso de Mercado Pago para pruebas de carga sin conexión
+# Simula las rutas que usa main.py, con latencia y errores configurables.
+#
+# Uso:
+#   python fake_mercadopago.py --port 8090 --latency 0.2 --error-rate 0.1
+#   MERCADO_PAGO_API_URL=http://127.0.0.1:8090 python main.py
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from flask import Flask, request, jsonify
+
+def create_fake_app(latency=0.0, error_rate=0.0, payment_status='approved'):
+    """
+    Crear la app falsa
+
+    Args:
+        latency: Segundos de espera agregados a cada respuesta
+        error_rate: Fracción de respuestas que devuelven 503 (0 a 1)
+        payment_status: Estado que se devuelve al consultar cualquier pago
+    """
+    app = Flask(__name__)
+    app.config['FAKE_LATENCY'] = latency
+    app.config['FAKE_ERROR_RATE'] = error_rate
+    app.config['FAKE_PAYMENT_STATUS'] = payment_status
+    preferences = {}
+    counter = {'requests': 0}
+    lock = threading.Lock()
+
+    @app.before_request
+    def simulate_conditions():
+        with lock:
+            counter['requests'] += 1
+        if request.path.startswith('/_fake'):
+            return None
+        if app.config['FAKE_LATENCY']:
+            time.sleep(app.config['FAKE_LATENCY'])
+        if random.random() < app.config['FAKE_ERROR_RATE']:
+            return jsonify({"message": "Service Unavailable (simulado)", "status": 503}), 503
+        return None
+
+    @app.route('/checkout/preferences', methods=['POST'])
+    def create_preference():
+        data = request.get_json(force=True, silent=True) or {}
+        preference_id = f"fake-{len(preferences) + 1}-{int(time.time() * 1000)}"
+        preference = {
+            "id": preference_id,
+            "external_reference": data.get('external_reference'),
+            "items": data.get('items', []),
+            "init_point": f"https://fake.mercadopago.local/checkout?pref_id={preference_id}",
+            "sandbox_init_point": f"https://fake.mercadopago.local/sandbox?pref_id={preference_id}",
+            "date_created": datetime.now().isoformat()
+        }
+        preferences[preference_id] = preference
+        return jsonify(preference), 201
+
+    @app.route('/v1/payments/<payment_id>', methods=['GET'])
+    def get_payment(payment_id):
+        return jsonify({
+            "id": int(payment_id) if payment_id.isdigit() else payment_id,
+            "status": app.config['FAKE_PAYMENT_STATUS'],
+            "status_detail": "accredited",
+            "external_reference": f"fake_ref_{payment_id}",
+            "transaction_amount": 100.0,
+            "currency_id": "MXN",
+            "date_created": datetime.now().isoformat(),
+            "date_approved": datetime.now().isoformat(),
+            "payer": {"first_name": "Cliente", "last_name": "Prueba", "email": "test@caffeymiga.com"},
+            "additional_info": {"items": []}
+        })
+
+    @app.route('/v1/payment_methods', methods=['GET'])
+    def payment_methods():
+        return jsonify([{"id": "visa", "name": "Visa", "payment_type_id": "credit_card"}])
+
+    @app.route('/_fake/config', methods=['GET', 'POST'])
+    def fake_config():
+        """Cambiar latencia/errores en caliente: POST {"latency": 2, "error_rate": 0.5}"""
+        data = request.get_json(silent=True) or {}
+        for key in ('latency', 'error_rate', 'payment_status'):
+            if key in data:
+                app.config[f'FAKE_{key.upper()}'] = data[key]
+        return jsonify({
+            "latency": app.config['FAKE_LATENCY'],
+            "error_rate": app.config['FAKE_ERROR_RATE'],
+            "payment_status": app.config['FAKE_PAYMENT_STATUS'],
+            "requests": counter['requests'],
+            "preferences": len(preferences)
+        })
+
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor falso de Mercado Pago')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='Segundos de latencia por respuesta')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de respuestas 503')
+    parser.add_argument('--payment-status', default='approved')
+    args = parser.parse_args()
+
+    print(f"🧪 Mercado Pago falso en http://127.0.0.1:{args.port} "
+          f"(latencia {args.latency}s, errores {args.error_rate:.0%})")
+    create_fake_app(args.latency, args.error_rate, args.payment_status).run(
+        host='127.0.0.1', port=args.port, threaded=True
+    )
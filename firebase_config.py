@@ -1,26 +1,135 @@
 # Firebase Configuration para Caffe & Miga
 # Sistema de gestión de pedidos en tiempo real
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+import os
 import json
-from datetime import datetime
+import time
+import threading
+import base64
+from datetime import datetime, timedelta
 import logging
+from open_orders_view import OpenOrdersView, CLOSED_POS_STATUSES
+from metrics import metrics, timed
+from circuit_breaker import CircuitBreaker
+from order_ids import new_order_id
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# Máximo de operaciones que Firestore acepta en un solo batch
+BATCH_LIMIT = 500
+
+def _is_client_error(error):
+    """True si Firestore rechazó la operación (4xx, salvo 429) en lugar de fallar o no responder"""
+    try:
+        from google.api_core.exceptions import ClientError, TooManyRequests
+    except ImportError:
+        return False
+    return isinstance(error, ClientError) and not isinstance(error, TooManyRequests)
+
+def _is_already_exists(error):
+    """True si create() falló porque el documento ya existe (un reintento de una escritura que sí llegó)"""
+    try:
+        from google.api_core.exceptions import AlreadyExists
+    except ImportError:
+        return False
+    return isinstance(error, AlreadyExists)
+
 class FirebaseManager:
     def __init__(self):
-        self.db = None
-        self.initialize_firebase()
+        """
+        Crear el manager sin conectar: Firebase se inicializa al primer uso de `db`
+        o en segundo plano con warm_up(), así importar este módulo no carga credenciales
+        """
+        self._db = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        # Vista en memoria de pedidos abiertos, mantenida por start_open_orders_listener
+        self.open_orders = OpenOrdersView()
+        self._open_orders_watch = None
+        # Timeout por llamada y circuito: con Firestore lento o caído se falla rápido
+        # (y FailoverOrderStore pasa al almacén local) en vez de esperar a cada request
+        self.timeout = float(os.getenv('FIRESTORE_TIMEOUT', 5))
+        self.breaker = CircuitBreaker(
+            'firestore',
+            failure_threshold=int(os.getenv('FIRESTORE_BREAKER_THRESHOLD', 5)),
+            reset_timeout=int(os.getenv('FIRESTORE_BREAKER_RESET', 30)),
+            failure_rate=float(os.getenv('FIRESTORE_BREAKER_FAILURE_RATE', 0.5)),
+            slow_call_seconds=float(os.getenv('FIRESTORE_SLOW_CALL_SECONDS', 2))
+        )
+    
+    @property
+    def db(self):
+        """Cliente de Firestore (None si no se pudo inicializar); se inicializa al primer acceso"""
+        if not self._initialized:
+            self.initialize_firebase()
+        return self._db
+    
+    @db.setter
+    def db(self, value):
+        self._db = value
+        self._initialized = True
+    
+    @property
+    def ready(self):
+        """True cuando la inicialización terminó (con o sin éxito)"""
+        return self._initialized
+    
+    def warm_up(self):
+        """Inicializar Firebase en un hilo de fondo"""
+        hilo = threading.Thread(target=self.initialize_firebase, name='firebase-warm-up', daemon=True)
+        hilo.start()
+        return hilo
     
     def initialize_firebase(self):
+        """Inicializar Firebase una sola vez, aunque varios hilos lo pidan a la vez"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._connect_firebase()
+            self._initialized = True
+    
+    def _not_initialized(self):
+        """Error de Firebase sin inicializar; cuenta como error del @timed en curso aunque se atrape"""
+        metrics.mark_error('firestore')
+        return Exception("Firebase no inicializado")
+    
+    @contextmanager
+    def _firestore_call(self):
+        """
+        Ejecutar un bloque que llama a Firestore bajo el circuito (lanza CircuitOpenError si está
+        abierto). Una falla marca como error el @timed en curso aunque el método la atrape
+        """
+        try:
+            self.breaker.before_call()
+        except Exception:
+            metrics.mark_error('firestore')
+            raise
+        inicio = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            metrics.mark_error('firestore')
+            if _is_client_error(e):
+                # Firestore respondió (p. ej. NotFound): el servicio está bien, el pedido no
+                self.breaker.record_success(time.monotonic() - inicio)
+            else:
+                self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success(time.monotonic() - inicio)
+    
+    @timed('firestore')
+    def _connect_firebase(self):
         """Inicializar Firebase con credenciales"""
+        # Importación diferida: firebase_admin tarda en cargar y no todos los scripts lo usan
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        
         try:
             # Si ya está inicializado, obtener la instancia
             if firebase_admin._apps:
                 app = firebase_admin.get_app()
-                self.db = firestore.client(app)
+                self._db = firestore.client(app)
                 logger.info("✅ Firebase ya inicializado - usando instancia existente")
                 return
             
@@ -93,15 +202,35 @@ class FirebaseManager:
                     logger.info("✅ Firebase inicializado con credenciales por defecto")
                 except Exception as fallback_error:
                     logger.error(f"❌ Error con credenciales por defecto: {fallback_error}")
-                    self.db = None
+                    self._db = None
                     return
             
-            self.db = firestore.client()
+            self._db = firestore.client()
             
         except Exception as e:
             logger.error(f"❌ Error inicializando Firebase: {e}")
-            self.db = None
+            self._db = None
+    
+    @timed('firestore')
+    def ping(self):
+        """Consulta mínima a Firestore para la sonda de salud (lanza excepción si falla)"""
+        if not self.db:
+            raise Exception("Not initialized")
+        with self._firestore_call():
+            self.db.collection('test').limit(1).get(timeout=self.timeout)
     
+    def _create_order(self, order_id, order_data):
+        """Crear el documento del pedido; si ya existe (reintento de una escritura que sí llegó) no se toca"""
+        with self._firestore_call():
+            try:
+                self.db.collection('orders').document(order_id).create(order_data, timeout=self.timeout)
+            except Exception as e:
+                if not _is_already_exists(e):
+                    raise
+                # create() no pisa los cambios que el POS ya haya hecho al pedido
+                logger.info(f"↩️ El pedido {order_id} ya estaba en Firebase")
+    
+    @timed('firestore')
     def save_order(self, order_data):
         """Guardar pedido en Firestore"""
         try:
@@ -109,21 +238,24 @@ class FirebaseManager:
             
             if not self.db:
                 logger.error("❌ Firebase database no inicializada")
-                raise Exception("Firebase no inicializado")
+                raise self._not_initialized()
             
             logger.info("✅ Firebase database está disponible")
             
-            # Agregar timestamp
+            # Agregar timestamp (updated_at alimenta el feed incremental del POS)
             order_data['created_at'] = datetime.now()
+            order_data['updated_at'] = order_data['created_at']
             order_data['status'] = 'nuevo'
             order_data['pos_status'] = 'pendiente'
+            # El ID del pedido (order_ids) es el ID del documento: si un timeout escondió una
+            # escritura que sí llegó, el reintento (outbox, reconciliación) no crea otro documento
+            order_id = order_data.setdefault('id', new_order_id('web'))
             
-            logger.info(f"📦 Datos del pedido preparados: ID={order_data.get('id', 'N/A')}")
+            logger.info(f"📦 Datos del pedido preparados: ID={order_id}")
             
             # Guardar en colección 'orders'
             logger.info("💾 Guardando en colección 'orders'...")
-            doc_ref = self.db.collection('orders').add(order_data)
-            order_id = doc_ref[1].id
+            self._create_order(order_id, order_data)
             
             logger.info(f"✅ Pedido guardado en Firebase: {order_id}")
             return order_id
@@ -133,16 +265,19 @@ class FirebaseManager:
             logger.error(f"🔍 Tipo de error: {type(e).__name__}")
             return None
     
+    @timed('firestore')
     def update_payment_status(self, order_id, payment_data):
         """Actualizar estado del pago"""
         try:
             if not self.db:
+                self._not_initialized()
                 return False
             
             update_data = {
                 'payment_status': payment_data.get('status'),
                 'payment_id': payment_data.get('payment_id'),
-                'payment_updated_at': datetime.now()
+                'payment_updated_at': datetime.now(),
+                'updated_at': datetime.now()
             }
             
             # Si el pago fue aprobado
@@ -150,7 +285,8 @@ class FirebaseManager:
                 update_data['status'] = 'pagado'
                 update_data['pos_status'] = 'listo_para_preparar'
             
-            self.db.collection('orders').document(order_id).update(update_data)
+            with self._firestore_call():
+                self.db.collection('orders').document(order_id).update(update_data, timeout=self.timeout)
             logger.info(f"✅ Estado de pago actualizado: {order_id}")
             return True
             
@@ -158,41 +294,176 @@ class FirebaseManager:
             logger.error(f"❌ Error actualizando pago: {e}")
             return False
     
-    def get_pending_orders(self):
-        """Obtener pedidos pendientes para el POS"""
+    @timed('firestore')
+    def _commit_batches(self, operations, on_conflict=None):
+        """
+        Ejecutar operaciones en batches de hasta BATCH_LIMIT (un round trip por batch)
+        
+        Args:
+            operations: Lista de (id, función que recibe el batch y agrega su escritura)
+            on_conflict: Función opcional que recibe el chunk cuando el batch falla con
+                AlreadyExists y devuelve sus resultados (se reintenta operación por operación)
+        
+        Returns:
+            Lista de resultados {'id', 'success', 'error'} en el mismo orden. Cada batch es
+            atómico: si falla, todas sus operaciones se reportan como fallidas.
+        """
+        results = []
+        for start in range(0, len(operations), BATCH_LIMIT):
+            chunk = operations[start:start + BATCH_LIMIT]
+            try:
+                if not self.db:
+                    raise self._not_initialized()
+                
+                batch = self.db.batch()
+                for _, add_write in chunk:
+                    add_write(batch)
+                with self._firestore_call():
+                    batch.commit(timeout=self.timeout)
+                results.extend({'id': op_id, 'success': True, 'error': None} for op_id, _ in chunk)
+                
+            except Exception as e:
+                if on_conflict and _is_already_exists(e):
+                    # Un batch anterior llegó aunque no se confirmó: crear uno por uno
+                    logger.info(f"↩️ Batch con documentos ya existentes, se crean de a uno ({len(chunk)})")
+                    results.extend(on_conflict(chunk))
+                    continue
+                logger.error(f"❌ Error en batch de {len(chunk)} operaciones: {e}")
+                results.extend({'id': op_id, 'success': False, 'error': str(e)} for op_id, _ in chunk)
+        
+        logger.info(f"✅ Batch Firestore: {sum(r['success'] for r in results)}/{len(results)} operaciones")
+        return results
+    
+    def save_orders_batch(self, orders):
+        """Guardar varios pedidos en Firestore. Devuelve un resultado por pedido con su ID de documento"""
+        operations = []
+        for order_data in orders:
+            order_data['created_at'] = datetime.now()
+            order_data['updated_at'] = order_data['created_at']
+            order_data['status'] = 'nuevo'
+            order_data['pos_status'] = 'pendiente'
+            
+            # El ID del pedido es el ID del documento y se escribe con create(): reenviar un batch
+            # que sí llegó no duplica ni reinicia los pedidos (igual que save_order)
+            order_id = order_data.setdefault('id', new_order_id('web'))
+            operations.append((
+                order_id,
+                lambda batch, order_id=order_id, order_data=order_data: batch.create(
+                    self.db.collection('orders').document(order_id), order_data
+                )
+            ))
+        
+        orders_by_id = {order_data['id']: order_data for order_data in orders}
+        return self._commit_batches(operations, on_conflict=lambda chunk: [
+            self._create_order_result(order_id, orders_by_id[order_id]) for order_id, _ in chunk
+        ])
+    
+    def _create_order_result(self, order_id, order_data):
+        """create() de un pedido como resultado {'id', 'success', 'error'} de batch"""
+        try:
+            self._create_order(order_id, order_data)
+            return {'id': order_id, 'success': True, 'error': None}
+        except Exception as e:
+            logger.error(f"❌ Error guardando pedido {order_id} en Firebase: {e}")
+            return {'id': order_id, 'success': False, 'error': str(e)}
+    
+    def update_order_statuses_batch(self, updates):
+        """
+        Actualizar el estado POS de varios pedidos
+        
+        Args:
+            updates: Lista de (order_id, new_status)
+        """
+        now = datetime.now()
+        operations = [
+            (order_id, lambda batch, order_id=order_id, new_status=new_status: batch.update(
+                self.db.collection('orders').document(order_id),
+                {'pos_status': new_status, 'status_updated_at': now, 'updated_at': now}
+            ))
+            for order_id, new_status in updates
+        ]
+        return self._commit_batches(operations)
+    
+    def upsert_orders_batch(self, documents):
+        """
+        Escribir documentos completos con su ID (set): usado para reconciliar pedidos
+        guardados en el almacén local mientras Firestore no estaba disponible
+        
+        Args:
+            documents: Lista de (order_id, order_data)
+        """
+        operations = []
+        for order_id, order_data in documents:
+            operations.append((order_id, lambda batch, order_id=order_id, order_data=order_data: batch.set(
+                self.db.collection('orders').document(order_id), order_data
+            )))
+        return self._commit_batches(operations)
+    
+    def update_orders_batch(self, updates):
+        """
+        Aplicar cambios de campos a pedidos existentes: usado para reconciliar los cambios
+        recibidos mientras Firestore no estaba disponible
+        
+        Args:
+            updates: Lista de (order_id, campos)
+        """
+        operations = [
+            (order_id, lambda batch, order_id=order_id, update_data=update_data: batch.update(
+                self.db.collection('orders').document(order_id), update_data
+            ))
+            for order_id, update_data in updates
+        ]
+        return self._commit_batches(operations)
+    
+    @timed('firestore')
+    def get_pending_orders(self, raise_errors=False):
+        """
+        Obtener pedidos pendientes para el POS
+        
+        Args:
+            raise_errors: Lanzar la excepción en vez de devolver [] (FailoverOrderStore
+                necesita distinguir "no hay pedidos" de "Firestore falló")
+        """
         try:
             if not self.db:
-                return []
+                raise self._not_initialized()
             
             orders = self.db.collection('orders')\
                            .where('pos_status', '==', 'listo_para_preparar')\
                            .order_by('created_at')\
-                           .stream()
+                           .stream(timeout=self.timeout)
             
             order_list = []
-            for order in orders:
-                order_data = order.to_dict()
-                order_data['id'] = order.id
-                order_list.append(order_data)
+            with self._firestore_call():
+                for order in orders:
+                    order_data = order.to_dict()
+                    order_data['id'] = order.id
+                    order_list.append(order_data)
             
             return order_list
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo pedidos: {e}")
+            if raise_errors:
+                raise
             return []
     
+    @timed('firestore')
     def update_order_status(self, order_id, new_status):
         """Actualizar estado del pedido desde el POS"""
         try:
             if not self.db:
+                self._not_initialized()
                 return False
             
             update_data = {
                 'pos_status': new_status,
-                'status_updated_at': datetime.now()
+                'status_updated_at': datetime.now(),
+                'updated_at': datetime.now()
             }
             
-            self.db.collection('orders').document(order_id).update(update_data)
+            with self._firestore_call():
+                self.db.collection('orders').document(order_id).update(update_data, timeout=self.timeout)
             logger.info(f"✅ Estado actualizado: {order_id} -> {new_status}")
             return True
             
@@ -200,30 +471,246 @@ class FirebaseManager:
             logger.error(f"❌ Error actualizando estado: {e}")
             return False
         
-    def get_all_orders(self):
-        """Obtener todos los pedidos de Firebase"""
+    @timed('firestore')
+    def get_all_orders(self, raise_errors=False):
+        """Obtener los 50 pedidos más recientes de Firebase (raise_errors: ver get_pending_orders)"""
         try:
             if not self.db:
-                logger.warning("⚠️ Firebase no inicializado")
-                return []
+                raise self._not_initialized()
             
             orders = self.db.collection('orders')\
-                           .order_by('created_at', direction=firestore.Query.DESCENDING)\
+                           .order_by('created_at', direction='DESCENDING')\
                            .limit(50)\
-                           .stream()
+                           .stream(timeout=self.timeout)
             
             order_list = []
-            for order in orders:
-                order_data = order.to_dict()
-                order_data['id'] = order.id
-                order_list.append(order_data)
+            with self._firestore_call():
+                for order in orders:
+                    order_data = order.to_dict()
+                    order_data['id'] = order.id
+                    order_list.append(order_data)
             
             logger.info(f"✅ Obtenidos {len(order_list)} pedidos de Firebase")
             return order_list
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo todos los pedidos: {e}")
+            if raise_errors:
+                raise
             return []
+    
+    @timed('firestore')
+    def get_orders_changed_since(self, since, limit=50, raise_errors=False):
+        """
+        Obtener solo los pedidos creados o modificados después de `since` (datetime)
+        (raise_errors: ver get_pending_orders)
+        """
+        try:
+            if not self.db:
+                raise self._not_initialized()
+            
+            orders = self.db.collection('orders')\
+                           .where('updated_at', '>', since)\
+                           .order_by('updated_at')\
+                           .limit(limit)\
+                           .stream(timeout=self.timeout)
+            
+            order_list = []
+            with self._firestore_call():
+                for order in orders:
+                    order_data = order.to_dict()
+                    order_data['id'] = order.id
+                    order_list.append(order_data)
+            
+            logger.info(f"✅ Obtenidos {len(order_list)} pedidos modificados desde {since.isoformat()}")
+            return order_list
+            
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo pedidos modificados: {e}")
+            if raise_errors:
+                raise
+            return []
+
+    @timed('firestore')
+    def query_orders(self, status=None, pos_status=None, payment_status=None, start=None, end=None,
+                     limit=50, page_token=None, fields=None):
+        """
+        Consultar pedidos con filtros, paginación por cursor y proyección de campos
+        
+        Args:
+            status, pos_status, payment_status: Filtros de igualdad opcionales
+            start, end: Rango de created_at (datetime, `start` incluido, `end` excluido)
+            limit: Pedidos por página
+            page_token: Token devuelto por la página anterior (start_after sobre created_at)
+            fields: Lista de campos a traer (select); None trae el documento completo
+        
+        Returns:
+            (lista de pedidos, token de la página siguiente o None)
+        
+        Nota: combinar filtros de igualdad con el orden por created_at requiere
+        índices compuestos en Firestore (la consola ofrece crearlos al primer uso).
+        """
+        if not self.db:
+            raise self._not_initialized()
+        
+        query = self.db.collection('orders')
+        for field, value in (('status', status), ('pos_status', pos_status), ('payment_status', payment_status)):
+            if value is not None:
+                query = query.where(field, '==', value)
+        if start:
+            query = query.where('created_at', '>=', start)
+        if end:
+            query = query.where('created_at', '<', end)
+        
+        query = query.order_by('created_at', direction='DESCENDING')
+        
+        if fields:
+            # created_at siempre se trae: es el cursor de la página siguiente
+            query = query.select(sorted(set(fields) | {'created_at'}))
+        
+        if page_token:
+            query = query.start_after({'created_at': decode_page_token(page_token)})
+        
+        order_list = []
+        with self._firestore_call():
+            for order in query.limit(limit).stream(timeout=self.timeout):
+                order_data = order.to_dict()
+                order_data['id'] = order.id
+                order_list.append(order_data)
+        
+        next_token = None
+        if len(order_list) == limit and order_list[-1].get('created_at'):
+            next_token = encode_page_token(order_list[-1]['created_at'])
+        
+        logger.info(f"✅ Consulta de pedidos: {len(order_list)} resultados")
+        return order_list, next_token
+    
+    def get_orders_by_status(self, payment_status, limit=100, raise_errors=False):
+        """
+        Obtener pedidos por estado de pago (ej. 'approved'), del más reciente al más antiguo
+        (raise_errors: ver get_pending_orders)
+        """
+        try:
+            orders, _ = self.query_orders(payment_status=payment_status, limit=limit)
+            return orders
+            
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo pedidos por estado {payment_status}: {e}")
+            if raise_errors:
+                raise
+            return []
+    
+    def start_open_orders_listener(self, query=None):
+        """
+        Mantener self.open_orders al día con un listener en tiempo real de Firestore
+        
+        Args:
+            query: Query a escuchar (por defecto pedidos con pos_status abierto);
+                en pruebas se puede pasar un LocalSnapshotStub
+        """
+        try:
+            if self._open_orders_watch:
+                return True
+            
+            if query is None:
+                if not self.db:
+                    logger.warning("⚠️ Firebase no inicializado, vista de pedidos abiertos desactivada")
+                    return False
+                self._backfill_pos_status()
+                query = self.db.collection('orders').where('pos_status', 'not-in', CLOSED_POS_STATUSES)
+            
+            self._open_orders_watch = query.on_snapshot(self.open_orders.on_snapshot)
+            logger.info("👁️ Listener de pedidos abiertos iniciado")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error iniciando listener de pedidos abiertos: {e}")
+            return False
+    
+    def _backfill_pos_status(self, days=7):
+        """
+        `not-in` no trae documentos sin pos_status (pedidos escritos antes de que existiera):
+        a los recientes se les pone 'nuevo', el mismo estado que la vista les asume, para que
+        entren al listener
+        """
+        try:
+            recent = self.db.collection('orders')\
+                            .where('created_at', '>=', datetime.now() - timedelta(days=days))\
+                            .select(['pos_status'])\
+                            .stream(timeout=self.timeout)
+            with self._firestore_call():
+                missing = [doc.id for doc in recent if 'pos_status' not in (doc.to_dict() or {})]
+            if missing:
+                self.update_order_statuses_batch([(order_id, 'nuevo') for order_id in missing])
+                logger.info(f"🩹 {len(missing)} pedidos sin pos_status marcados como 'nuevo'")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo completar pos_status de pedidos antiguos: {e}")
+    
+    def stop_open_orders_listener(self):
+        """Cancelar el listener de pedidos abiertos"""
+        if self._open_orders_watch:
+            self._open_orders_watch.unsubscribe()
+            self._open_orders_watch = None
+    
+    def get_open_orders(self, since=None, raise_errors=False):
+        """
+        Pedidos abiertos para el POS: desde la vista en memoria si el listener está activo,
+        si no, con una consulta a Firestore como antes
+        
+        Args:
+            since: datetime opcional; solo pedidos creados o modificados después
+            raise_errors: Ver get_pending_orders (la vista en memoria no falla)
+        """
+        if self.open_orders.ready:
+            return self.open_orders.changed_since(since) if since else self.open_orders.all()
+        
+        if since:
+            return self.get_orders_changed_since(since, raise_errors=raise_errors)
+        return self.get_all_orders(raise_errors=raise_errors)
+    
+    def get_closed_orders(self, since):
+        """
+        Pedidos que se cerraron después de `since` según la vista en memoria. Sin vista,
+        get_orders_changed_since ya los devuelve completos (con su pos_status)
+        """
+        return self.open_orders.closed_since(since) if self.open_orders.ready else []
+    
+    def get_order(self, order_id):
+        """Pedido abierto por ID desde la vista en memoria (None si no está o la vista no está lista)"""
+        return self.open_orders.get(order_id)
+
+def encode_page_token(created_at):
+    """Token opaco de paginación a partir del created_at del último pedido de la página"""
+    value = created_at.isoformat() if isinstance(created_at, datetime) else str(created_at)
+    return base64.urlsafe_b64encode(json.dumps({'created_at': value}).encode()).decode().rstrip('=')
+
+def decode_page_token(page_token):
+    """created_at (datetime) guardado en un token de paginación; ValueError si es inválido"""
+    try:
+        padded = page_token + '=' * (-len(page_token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data['created_at'])
+    except Exception:
+        raise ValueError(f"page_token inválido: {page_token}")
+
+def create_order_store():
+    """
+    Backend de pedidos según ORDER_STORE: 'firestore' (por defecto) o 'sqlite'
+    (LocalOrderStore, sin red, en LOCAL_ORDER_STORE_PATH).
+    
+    Con Firestore, salvo FIRESTORE_FAILOVER=false, se envuelve en FailoverOrderStore:
+    con el circuito abierto los pedidos se escriben en el almacén local y se reconcilian después
+    """
+    # Importaciones diferidas: local_order_store usa los tokens de página de este módulo
+    from local_order_store import LocalOrderStore
+    if os.getenv('ORDER_STORE', 'firestore').lower() == 'sqlite':
+        logger.info("💾 ORDER_STORE=sqlite: usando el almacén local de pedidos en lugar de Firestore")
+        return LocalOrderStore()
+    if os.getenv('FIRESTORE_FAILOVER', 'true').lower() == 'false':
+        return FirebaseManager()
+    from order_store_failover import FailoverOrderStore
+    return FailoverOrderStore(FirebaseManager(), LocalOrderStore(),
+                              probe_interval=float(os.getenv('FIRESTORE_PROBE_INTERVAL', 5)))
 
 # Instancia global
-firebase_manager = FirebaseManager()
+firebase_manager = create_order_store()
@@ -0,0 +1,135 @@
+# Sondas de salud para Caffe & Miga
+# Revisan Firebase, Mercado Pago y SQLite en segundo plano y guardan el último resultado,
+# para que /health, /health/ready y /pos/test respondan sin consultar las dependencias
+
+import os
+import time
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class HealthProbes:
+    def __init__(self, interval=30, history_size=20, stale_after=None):
+        """
+        Registro de sondas con resultados en caché
+
+        Args:
+            interval: Segundos entre rondas de revisión
+            history_size: Latencias que se conservan por dependencia
+            stale_after: Segundos tras los que un resultado deja de contar para readiness
+                (por defecto 3 intervalos)
+        """
+        self.interval = interval
+        self.history_size = history_size
+        self.stale_after = stale_after or interval * 3
+        self.probes = {}
+        self.results = {}
+        self.ejecutando = False
+        self.hilo = None
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+
+    def register(self, name, check, critical=True):
+        """
+        Registrar una sonda
+
+        Args:
+            name: Nombre de la dependencia (firebase, mercado_pago, sqlite...)
+            check: Función sin argumentos; devuelve un estado descriptivo o lanza excepción si falla
+            critical: Si es False, su falla no afecta a readiness
+        """
+        self.probes[name] = (check, critical)
+        with self._lock:
+            self.results[name] = {
+                'status': 'Pending',
+                'ok': False,
+                'critical': critical,
+                'error': None,
+                'latency_ms': None,
+                'checked_at': None,
+                '_checked_ts': 0,
+                '_history': deque(maxlen=self.history_size)
+            }
+
+    def run_once(self):
+        """Ejecutar todas las sondas una vez y guardar sus resultados"""
+        for name, (check, critical) in list(self.probes.items()):
+            inicio = time.perf_counter()
+            try:
+                status, ok, error = check() or 'OK', True, None
+            except Exception as e:
+                status, ok, error = 'Error', False, str(e)
+            latency_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+            with self._lock:
+                result = self.results[name]
+                result.update(status=status, ok=ok, error=error, latency_ms=latency_ms,
+                              checked_at=datetime.now().isoformat(), _checked_ts=time.time())
+                result['_history'].append(latency_ms)
+
+            if not ok:
+                logger.warning(f"⚠️ Sonda {name} falló ({latency_ms} ms): {error}")
+
+    def start(self):
+        """Iniciar el hilo que revisa las dependencias cada `interval` segundos"""
+        if self.ejecutando:
+            return
+
+        self.ejecutando = True
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        logger.info(f"🩺 Sondas de salud iniciadas (cada {self.interval}s)")
+
+    def stop(self):
+        """Detener el hilo de sondas"""
+        self.ejecutando = False
+        self._despertar.set()
+        if self.hilo:
+            self.hilo.join(timeout=5)
+            self.hilo = None
+
+    def _bucle(self):
+        """Revisar las dependencias periódicamente"""
+        while self.ejecutando:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Error en sondas de salud: {e}")
+            self._despertar.wait(self.interval)
+            self._despertar.clear()
+
+    def snapshot(self):
+        """Último resultado de cada sonda, con estadísticas de latencia"""
+        now = time.time()
+        with self._lock:
+            snapshot = {}
+            for name, result in self.results.items():
+                history = list(result['_history'])
+                snapshot[name] = {
+                    'status': result['status'],
+                    'ok': result['ok'],
+                    'critical': result['critical'],
+                    'error': result['error'],
+                    'latency_ms': result['latency_ms'],
+                    'checked_at': result['checked_at'],
+                    'age_seconds': round(now - result['_checked_ts'], 1) if result['_checked_ts'] else None,
+                    'latency_history_ms': history,
+                    'latency_avg_ms': round(sum(history) / len(history), 2) if history else None,
+                    'latency_max_ms': max(history) if history else None
+                }
+        return snapshot
+
+    def ready(self):
+        """True si todas las sondas críticas pasaron en su última revisión y el resultado es reciente"""
+        now = time.time()
+        with self._lock:
+            return all(
+                result['ok'] and now - result['_checked_ts'] <= self.stale_after
+                for result in self.results.values() if result['critical']
+            )
+
+# Instancia global
+health_probes = HealthProbes(interval=int(os.getenv('HEALTH_PROBE_INTERVAL', 30)))
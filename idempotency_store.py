@@ -0,0 +1,152 @@
+# Almacén de claves de idempotencia para Caffe & Miga
+# Si el navegador reintenta o el cliente hace doble clic, el POST con la misma
+# cabecera Idempotency-Key devuelve la respuesta original sin volver a crear el pedido
+
+import hashlib
+import os
+import time
+import logging
+from metrics import timed
+from sqlite_db import get_database
+from functools import wraps
+from flask import request, make_response, current_app
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+class IdempotencyStore:
+    def __init__(self, db_path=None, ttl_seconds=86400, lock_seconds=60):
+        """
+        Claves compartidas entre workers en SQLite (WAL), con vencimiento
+
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto IDEMPOTENCY_STORE_PATH o idempotency.db)
+            ttl_seconds: Tiempo que se recuerda una respuesta
+            lock_seconds: Tiempo máximo que una clave queda reservada mientras se procesa
+        """
+        self.db_path = db_path or os.getenv('IDEMPOTENCY_STORE_PATH', 'idempotency.db')
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.db = get_database(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Crear la tabla de claves si no existe"""
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    request_hash TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'in_progress',
+                    response_status INTEGER,
+                    response_body BLOB,
+                    content_type TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys (expires_at)')
+
+    @timed('sqlite')
+    def begin(self, scope, key, request_hash):
+        """
+        Reservar una clave antes de procesar el request
+
+        Returns:
+            ('new', None): procesar normalmente y luego llamar a complete/release
+            ('replay', (status, body, content_type)): devolver la respuesta guardada
+            ('in_progress', None): otro request con la misma clave aún se está procesando
+            ('mismatch', None): la clave ya se usó con otro cuerpo
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute('''
+                SELECT request_hash, status, response_status, response_body, content_type, expires_at
+                FROM idempotency_keys WHERE scope = ? AND key = ?
+            ''', (scope, key)).fetchone()
+
+            if row and row[5] > now:
+                if row[0] != request_hash:
+                    return 'mismatch', None
+                if row[1] == 'done':
+                    return 'replay', (row[2], row[3], row[4])
+                return 'in_progress', None
+
+            # Clave nueva o vencida: limpiar las vencidas y reservarla mientras se procesa
+            conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,))
+            conn.execute('''
+                INSERT OR REPLACE INTO idempotency_keys (scope, key, request_hash, status, expires_at)
+                VALUES (?, ?, ?, 'in_progress', ?)
+            ''', (scope, key, request_hash, now + self.lock_seconds))
+            return 'new', None
+
+    @timed('sqlite')
+    def complete(self, scope, key, status, body, content_type):
+        """Guardar la respuesta para devolverla en los reintentos"""
+        self.db.execute('''
+            UPDATE idempotency_keys
+            SET status = 'done', response_status = ?, response_body = ?, content_type = ?, expires_at = ?
+            WHERE scope = ? AND key = ?
+        ''', (status, body, content_type, time.time() + self.ttl_seconds, scope, key))
+
+    def release(self, scope, key):
+        """Liberar la clave (el request falló): un reintento volverá a procesarse"""
+        self.db.execute('DELETE FROM idempotency_keys WHERE scope = ? AND key = ?', (scope, key))
+
+    def purge_expired(self):
+        """Borrar claves vencidas"""
+        return self.db.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (time.time(),)).rowcount
+
+def idempotent(scope, store=None):
+    """
+    Decorador para rutas Flask que crean recursos: con la cabecera Idempotency-Key,
+    un request repetido devuelve la respuesta original (solo se guardan respuestas 2xx)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if request.method != 'POST' or not key:
+                return view(*args, **kwargs)
+
+            active_store = store or idempotency_store
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            outcome, saved = active_store.begin(scope, key, request_hash)
+
+            if outcome == 'replay':
+                status, body, content_type = saved
+                logger.info(f"↩️ Respuesta repetida para {IDEMPOTENCY_HEADER} {key} ({scope})")
+                response = _make_response(body, status, content_type)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if outcome == 'in_progress':
+                response = _make_response('{"error": "Solicitud en proceso, reintentar en un momento"}',
+                                          409, 'application/json')
+                response.headers['Retry-After'] = '1'
+                return response
+            if outcome == 'mismatch':
+                return _make_response(f'{{"error": "{IDEMPOTENCY_HEADER} ya usada con otro contenido"}}',
+                                      422, 'application/json')
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                active_store.release(scope, key)
+                raise
+
+            if 200 <= response.status_code < 300:
+                active_store.complete(scope, key, response.status_code, response.get_data(), response.content_type)
+            else:
+                active_store.release(scope, key)
+            return response
+        return wrapper
+    return decorator
+
+def _make_response(body, status, content_type):
+    """Respuesta Flask con cuerpo ya serializado"""
+    return current_app.response_class(body, status=status, content_type=content_type)
+
+# Instancia global
+idempotency_store = IdempotencyStore(ttl_seconds=int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400)))
@@ -0,0 +1,57 @@
+# Inicialización diferida de clientes externos para Caffe & Miga
+# El cliente se construye al primer uso (o en segundo plano con warm_up), así importar
+# un módulo no paga la carga de credenciales ni la construcción del cliente
+
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LazyClient:
+    def __init__(self, factory, name):
+        """
+        Args:
+            factory: Función sin argumentos que construye el cliente; si lanza excepción
+                el cliente queda en None (y `if not cliente` se cumple, como antes)
+            name: Nombre para los logs
+        """
+        self._factory = factory
+        self._name = name
+        self._instance = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Cliente construido (None si la construcción falló)"""
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    try:
+                        self._instance = self._factory()
+                        logger.info(f"✅ {self._name} inicializado correctamente")
+                    except Exception as e:
+                        logger.error(f"❌ Error inicializando {self._name}: {e}")
+                        self._instance = None
+                    self._initialized = True
+        return self._instance
+
+    @property
+    def ready(self):
+        """True cuando la construcción ya terminó (con o sin éxito)"""
+        return self._initialized
+
+    def warm_up(self):
+        """Construir el cliente en un hilo de fondo"""
+        hilo = threading.Thread(target=self.get, name=f"warm-up-{self._name}", daemon=True)
+        hilo.start()
+        return hilo
+
+    def __getattr__(self, name):
+        # Solo se llama para atributos que no son del proxy: se delegan al cliente real
+        instance = self.get()
+        if instance is None:
+            raise AttributeError(f"{self._name} no inicializado")
+        return getattr(instance, name)
+
+    def __bool__(self):
+        return self.get() is not None
@@ -0,0 +1,489 @@
+# Almacén local de pedidos en SQLite para Caffe & Miga
+# Implementa la misma interfaz que FirebaseManager (guardar, actualizar, consultar, escuchar)
+# sobre un archivo SQLite en modo WAL: desarrollo y benchmarks sin red, y modo degradado
+# cuando Firestore no responde. Los pedidos escritos aquí se reconcilian después con reconcile()
+#
+# Se activa con ORDER_STORE=sqlite, o como respaldo de Firestore en FailoverOrderStore
+# (ver firebase_config.py y order_store_failover.py)
+
+import json
+import os
+import threading
+import logging
+from datetime import datetime
+from open_orders_view import OpenOrdersView, CLOSED_POS_STATUSES
+from sqlite_db import get_database
+from order_ids import new_order_id
+
+logger = logging.getLogger(__name__)
+
+# Campos de fecha que Firestore devuelve como datetime
+DATETIME_FIELDS = ('created_at', 'updated_at', 'payment_updated_at', 'status_updated_at')
+
+# Intentos de reconciliación antes de descartar un cambio diferido (p. ej. el pedido no existe)
+MAX_DEFERRED_ATTEMPTS = 5
+
+def _to_iso(value):
+    """datetime (con o sin zona) -> ISO local sin zona, con microsegundos para ordenar como texto"""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat(timespec='microseconds')
+
+def _encode(order_data):
+    return json.dumps(order_data, ensure_ascii=False,
+                      default=lambda v: _to_iso(v) if isinstance(v, datetime) else str(v))
+
+def _decode(order_id, data):
+    order = json.loads(data)
+    for field in DATETIME_FIELDS:
+        if isinstance(order.get(field), str):
+            try:
+                order[field] = datetime.fromisoformat(order[field])
+            except ValueError:
+                pass
+    order['id'] = order_id
+    return order
+
+def payment_fields(payment_data):
+    """Campos que cambia FirebaseManager.update_payment_status"""
+    update_data = {
+        'payment_status': payment_data.get('status'),
+        'payment_id': payment_data.get('payment_id'),
+        'payment_updated_at': datetime.now(),
+        'updated_at': datetime.now()
+    }
+    if payment_data.get('status') == 'approved':
+        update_data['status'] = 'pagado'
+        update_data['pos_status'] = 'listo_para_preparar'
+    return update_data
+
+def status_fields(new_status):
+    """Campos que cambia FirebaseManager.update_order_status"""
+    return {'pos_status': new_status, 'status_updated_at': datetime.now(), 'updated_at': datetime.now()}
+
+class LocalOrderStore:
+    def __init__(self, db_path=None, poll_interval=2.0, defer_missing_updates=False):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto LOCAL_ORDER_STORE_PATH o local_orders.db)
+            poll_interval: Segundos entre lecturas de cambios hechos por otros procesos
+                (los del propio proceso se aplican a la vista al instante)
+            defer_missing_updates: Como respaldo de Firestore: los cambios a pedidos que no
+                están aquí (viven en Firestore) se guardan y se aplican al reconciliar
+        """
+        self.db_path = db_path or os.getenv('LOCAL_ORDER_STORE_PATH', 'local_orders.db')
+        self.poll_interval = poll_interval
+        self.defer_missing_updates = defer_missing_updates
+        self.sqlite = get_database(self.db_path)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self.open_orders = OpenOrdersView()
+        self._listening = False
+        self._last_seq = 0
+        self._stop = threading.Event()
+        self._poll_thread = None
+
+    # --- Ciclo de vida (mismo contrato que FirebaseManager) ---
+
+    @property
+    def db(self):
+        """Verdadero cuando la base está lista (equivalente al cliente de Firestore)"""
+        self._ensure_initialized()
+        return self
+
+    @property
+    def ready(self):
+        return self._initialized
+
+    def warm_up(self):
+        hilo = threading.Thread(target=self.initialize_firebase, name='local-store-warm-up', daemon=True)
+        hilo.start()
+        return hilo
+
+    def initialize_firebase(self):
+        """Crear las tablas una sola vez (el nombre se mantiene por compatibilidad)"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.init_database()
+            self._initialized = True
+            logger.info(f"💾 Almacén local de pedidos en {self.db_path}")
+
+    def _ensure_initialized(self):
+        if not self._initialized:
+            self.initialize_firebase()
+
+    def init_database(self):
+        """Crear la tabla de pedidos si no existe"""
+        with self.sqlite.transaction() as conn:
+            # data guarda el documento completo; las columnas sueltas son para filtrar y ordenar.
+            # change_seq crece con cada escritura (alimenta el listener) y synced = 0 marca
+            # los pedidos que todavía no se reconciliaron con Firestore
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS orders (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    status TEXT,
+                    pos_status TEXT,
+                    payment_status TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    change_seq INTEGER NOT NULL,
+                    synced INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders (updated_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_change_seq ON orders (change_seq)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_unsynced ON orders (synced) WHERE synced = 0')
+            # Cambios a pedidos de Firestore recibidos mientras Firestore no respondía
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS deferred_updates (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+
+    def ping(self):
+        """Consulta mínima para la sonda de salud"""
+        self._ensure_initialized()
+        self.sqlite.query('SELECT 1 FROM orders LIMIT 1')
+
+    # --- Escrituras ---
+
+    def _write(self, conn, order_id, order_data):
+        """Insertar o reemplazar un documento (dentro de una transacción abierta)"""
+        conn.execute('''
+            INSERT OR REPLACE INTO orders
+                (id, data, status, pos_status, payment_status, created_at, updated_at, change_seq, synced)
+            VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM orders), 0)
+        ''', (
+            order_id, _encode(order_data),
+            order_data.get('status'), order_data.get('pos_status'), order_data.get('payment_status'),
+            _to_iso(order_data['created_at']), _to_iso(order_data.get('updated_at') or order_data['created_at'])
+        ))
+
+    def _publish(self, change_type, order_id, order_data):
+        """Aplicar el cambio a la vista de pedidos abiertos si el listener está activo"""
+        if self._listening:
+            self.open_orders.apply(change_type, order_id, order_data)
+
+    def _new_order(self, order_data):
+        """Mismos campos que agrega FirebaseManager.save_order; devuelve el ID del documento"""
+        self._ensure_initialized()
+        order_data['created_at'] = datetime.now()
+        order_data['updated_at'] = order_data['created_at']
+        order_data['status'] = 'nuevo'
+        order_data['pos_status'] = 'pendiente'
+        # Mismo ID de documento que usaría Firestore: reconciliar un pedido que también
+        # llegó a Firestore lo reescribe en vez de duplicarlo
+        return order_data.setdefault('id', new_order_id('web'))
+
+    def save_order(self, order_data):
+        """Guardar pedido en el almacén local (un reintento del mismo pedido no lo reescribe)"""
+        try:
+            order_id = self._new_order(order_data)
+            with self.sqlite.transaction() as conn:
+                if conn.execute('SELECT 1 FROM orders WHERE id = ?', (order_id,)).fetchone():
+                    logger.info(f"↩️ El pedido {order_id} ya estaba en el almacén local")
+                    return order_id
+                self._write(conn, order_id, order_data)
+            self._publish('ADDED', order_id, order_data)
+            logger.info(f"✅ Pedido guardado en almacén local: {order_id}")
+            return order_id
+        except Exception as e:
+            logger.error(f"❌ Error guardando pedido en almacén local: {e}")
+            return None
+
+    def save_orders_batch(self, orders):
+        """Guardar varios pedidos en una sola transacción (un resultado por pedido)"""
+        saved = [(self._new_order(order_data), order_data) for order_data in orders]
+        added = []
+        try:
+            with self.sqlite.transaction() as conn:
+                for order_id, order_data in saved:
+                    if not conn.execute('SELECT 1 FROM orders WHERE id = ?', (order_id,)).fetchone():
+                        self._write(conn, order_id, order_data)
+                        added.append((order_id, order_data))
+        except Exception as e:
+            logger.error(f"❌ Error en batch local de {len(saved)} pedidos: {e}")
+            return [{'id': order_id, 'success': False, 'error': str(e)} for order_id, _ in saved]
+
+        for order_id, order_data in added:
+            self._publish('ADDED', order_id, order_data)
+        return [{'id': order_id, 'success': True, 'error': None} for order_id, _ in saved]
+
+    def _update_many(self, updates):
+        """
+        Aplicar [(order_id, campos)] como un batch atómico, con la semántica de update() de
+        Firestore: si algún documento no existe, falla todo el batch (salvo defer_missing_updates)
+        """
+        self._ensure_initialized()
+        changed = []
+        with self.sqlite.transaction() as conn:
+            for order_id, update_data in updates:
+                row = conn.execute('SELECT data FROM orders WHERE id = ?', (order_id,)).fetchone()
+                if not row and self.defer_missing_updates:
+                    conn.execute('INSERT INTO deferred_updates (order_id, fields) VALUES (?, ?)',
+                                 (order_id, _encode(update_data)))
+                    continue
+                if not row:
+                    raise KeyError(f"No existe el pedido {order_id}")
+                order = _decode(order_id, row[0])
+                order.pop('id')
+                order.update(update_data)
+                self._write(conn, order_id, order)
+                changed.append((order_id, order))
+
+        for order_id, order in changed:
+            self._publish('MODIFIED', order_id, order)
+
+    def update_payment_status(self, order_id, payment_data):
+        """Actualizar estado del pago"""
+        try:
+            self._update_many([(order_id, payment_fields(payment_data))])
+            logger.info(f"✅ Estado de pago actualizado (local): {order_id}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error actualizando pago (local): {e}")
+            return False
+
+    def update_order_status(self, order_id, new_status):
+        """Actualizar estado del pedido desde el POS"""
+        try:
+            self._update_many([(order_id, status_fields(new_status))])
+            logger.info(f"✅ Estado actualizado (local): {order_id} -> {new_status}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error actualizando estado (local): {e}")
+            return False
+
+    def _update_batch(self, updates):
+        try:
+            self._update_many(updates)
+            return [{'id': order_id, 'success': True, 'error': None} for order_id, _ in updates]
+        except Exception as e:
+            logger.error(f"❌ Error en batch local de {len(updates)} operaciones: {e}")
+            return [{'id': order_id, 'success': False, 'error': str(e)} for order_id, _ in updates]
+
+    def update_order_statuses_batch(self, updates):
+        """Cambiar el pos_status de varios pedidos: updates = [(order_id, nuevo_estado)]"""
+        return self._update_batch([(order_id, status_fields(status)) for order_id, status in updates])
+
+    # --- Lecturas ---
+
+    def _select(self, where='', params=(), order_by='created_at DESC', limit=None):
+        self._ensure_initialized()
+        sql = f'SELECT id, data FROM orders {where} ORDER BY {order_by}'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return [_decode(order_id, data) for order_id, data in self.sqlite.query(sql, params)]
+
+    def get_pending_orders(self):
+        """Pedidos pagados listos para preparar, del más antiguo al más reciente"""
+        return self._select("WHERE pos_status = 'listo_para_preparar'", order_by='created_at ASC')
+
+    def get_all_orders(self):
+        """Los 50 pedidos más recientes"""
+        return self._select(limit=50)
+
+    def get_orders_changed_since(self, since, limit=50):
+        """Pedidos creados o modificados después de `since` (datetime)"""
+        return self._select('WHERE updated_at > ?', (_to_iso(since),), order_by='updated_at ASC', limit=limit)
+
+    def query_orders(self, status=None, pos_status=None, payment_status=None, start=None, end=None,
+                     limit=50, page_token=None, fields=None):
+        """Misma consulta y mismo formato de página que FirebaseManager.query_orders"""
+        # Importación diferida: firebase_config importa este módulo al elegir el backend
+        from firebase_config import encode_page_token, decode_page_token
+
+        conditions, params = [], []
+        for field, value in (('status', status), ('pos_status', pos_status), ('payment_status', payment_status)):
+            if value is not None:
+                conditions.append(f'{field} = ?')
+                params.append(value)
+        if start:
+            conditions.append('created_at >= ?')
+            params.append(_to_iso(start))
+        if end:
+            conditions.append('created_at < ?')
+            params.append(_to_iso(end))
+        if page_token:
+            conditions.append('created_at < ?')
+            params.append(_to_iso(decode_page_token(page_token)))
+
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        order_list = self._select(where, params, limit=limit)
+        if fields:
+            keep = set(fields) | {'created_at', 'id'}
+            order_list = [{k: v for k, v in order.items() if k in keep} for order in order_list]
+
+        next_token = None
+        if len(order_list) == limit and order_list[-1].get('created_at'):
+            next_token = encode_page_token(order_list[-1]['created_at'])
+        return order_list, next_token
+
+    def has_order(self, order_id):
+        """True si el pedido está en el almacén local (abierto o no)"""
+        self._ensure_initialized()
+        return self.sqlite.query_one('SELECT 1 FROM orders WHERE id = ?', (order_id,)) is not None
+
+    def get_orders_by_status(self, payment_status, limit=100):
+        """Pedidos por estado de pago, del más reciente al más antiguo"""
+        orders, _ = self.query_orders(payment_status=payment_status, limit=limit)
+        return orders
+
+    # --- Vista de pedidos abiertos ---
+
+    def start_open_orders_listener(self, query=None):
+        """
+        Cargar los pedidos abiertos en self.open_orders y mantenerlos al día: las escrituras
+        de este proceso se aplican al instante y las de otros procesos se leen cada poll_interval
+        """
+        if self._listening:
+            return True
+
+        self._ensure_initialized()
+        placeholders = ', '.join('?' for _ in CLOSED_POS_STATUSES)
+        self._last_seq = self._max_seq()
+        for order in self._select(f'WHERE pos_status IS NULL OR pos_status NOT IN ({placeholders})',
+                                  CLOSED_POS_STATUSES):
+            self.open_orders.apply('ADDED', order.pop('id'), order)
+        self.open_orders.on_snapshot([], [], datetime.now())
+        self._listening = True
+
+        self._stop.clear()
+        self._poll_thread = threading.Thread(target=self._poll_loop, name='local-store-listener', daemon=True)
+        self._poll_thread.start()
+        logger.info("👁️ Listener local de pedidos abiertos iniciado")
+        return True
+
+    def stop_open_orders_listener(self):
+        self._listening = False
+        self._stop.set()
+
+    def _max_seq(self):
+        return self.sqlite.query_one('SELECT COALESCE(MAX(change_seq), 0) FROM orders')[0]
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll_changes()
+            except Exception as e:
+                logger.error(f"❌ Error leyendo cambios del almacén local: {e}")
+
+    def poll_changes(self):
+        """Aplicar a la vista los pedidos escritos desde la última lectura (también por otros procesos)"""
+        rows = self.sqlite.query('''
+            SELECT id, data, change_seq FROM orders WHERE change_seq > ? ORDER BY change_seq
+        ''', (self._last_seq,))
+
+        for order_id, data, seq in rows:
+            order = _decode(order_id, data)
+            order.pop('id')
+            self.open_orders.apply('MODIFIED', order_id, order)
+            self._last_seq = seq
+        return len(rows)
+
+    def get_open_orders(self, since=None):
+        """Pedidos abiertos para el POS (vista en memoria si el listener está activo)"""
+        if self.open_orders.ready:
+            return self.open_orders.changed_since(since) if since else self.open_orders.all()
+        if since:
+            return self.get_orders_changed_since(since)
+        return self.get_all_orders()
+
+    def get_closed_orders(self, since):
+        """Pedidos cerrados después de `since` (vista en memoria)"""
+        return self.open_orders.closed_since(since) if self.open_orders.ready else []
+
+    def get_order(self, order_id):
+        """Pedido abierto por ID desde la vista en memoria"""
+        return self.open_orders.get(order_id)
+
+    # --- Reconciliación con Firestore ---
+
+    def pending_sync(self):
+        """Pedidos escritos localmente y cambios diferidos que aún no están en Firestore"""
+        self._ensure_initialized()
+        orders = self.sqlite.query_one('SELECT COUNT(*) FROM orders WHERE synced = 0')[0]
+        updates = self.sqlite.query_one('SELECT COUNT(*) FROM deferred_updates')[0]
+        return orders + updates
+
+    def reconcile(self, remote, limit=500):
+        """
+        Copiar a Firestore los pedidos pendientes de sincronizar, con el mismo ID de documento,
+        y luego aplicar los cambios diferidos a pedidos que viven en Firestore.
+        Se escribe el documento completo (set), así repetir la reconciliación no duplica nada.
+
+        Args:
+            remote: FirebaseManager conectado
+            limit: Pedidos (y cambios diferidos) por llamada
+
+        Returns:
+            Cantidad de pedidos y cambios reconciliados
+        """
+        self._ensure_initialized()
+        rows = self.sqlite.query('''
+            SELECT id, data, change_seq FROM orders WHERE synced = 0 ORDER BY change_seq LIMIT ?
+        ''', (limit,))
+        deferred = self.sqlite.query('''
+            SELECT seq, order_id, fields, attempts FROM deferred_updates ORDER BY seq LIMIT ?
+        ''', (limit,))
+        if not rows and not deferred:
+            return 0
+
+        synced = []
+        if rows:
+            documents = []
+            for order_id, data, _ in rows:
+                order = _decode(order_id, data)
+                order.pop('id')
+                documents.append((order_id, order))
+            results = remote.upsert_orders_batch(documents)
+
+            # Solo se marca lo que no volvió a cambiar mientras se enviaba
+            seqs = {order_id: seq for order_id, _, seq in rows}
+            synced = [(r['id'], seqs[r['id']]) for r in results if r['success']]
+
+        applied, retried = [], []
+        if deferred:
+            updates = []
+            for _, order_id, fields, _ in deferred:
+                update_data = _decode(order_id, fields)
+                update_data.pop('id')
+                updates.append((order_id, update_data))
+            # En el orden en que llegaron: un cambio de estado posterior pisa al anterior
+            results = remote.update_orders_batch(updates)
+            if len(updates) > 1 and not any(r['success'] for r in results):
+                # El batch es atómico: un pedido inexistente lo hace fallar entero, así que
+                # se reintenta uno por uno para que los demás cambios no se pierdan
+                results = [remote.update_orders_batch([update])[0] for update in updates]
+            for (seq, order_id, _, attempts), result in zip(deferred, results):
+                if result['success']:
+                    applied.append((seq,))
+                elif attempts + 1 >= MAX_DEFERRED_ATTEMPTS:
+                    logger.warning(f"⚠️ Cambio diferido descartado tras {attempts + 1} intentos: "
+                                   f"{order_id} ({result['error']})")
+                    applied.append((seq,))
+                else:
+                    retried.append((seq,))
+
+        with self.sqlite.transaction() as conn:
+            conn.executemany('UPDATE orders SET synced = 1 WHERE id = ? AND change_seq = ?', synced)
+            conn.executemany('DELETE FROM deferred_updates WHERE seq = ?', applied)
+            conn.executemany('UPDATE deferred_updates SET attempts = attempts + 1 WHERE seq = ?', retried)
+
+        logger.info(f"🔁 Reconciliados con Firestore: {len(synced)}/{len(rows)} pedidos, "
+                    f"{len(applied)}/{len(deferred)} cambios diferidos")
+        return len(synced) + len(applied)
+
+    def stats(self):
+        """Tamaño del almacén y pedidos pendientes de reconciliar"""
+        self._ensure_initialized()
+        total, pending = self.sqlite.query_one('SELECT COUNT(*), COALESCE(SUM(synced = 0), 0) FROM orders')
+        deferred = self.sqlite.query_one('SELECT COUNT(*) FROM deferred_updates')[0]
+        return {'orders': total, 'pending_sync': pending, 'deferred_updates': deferred,
+                'listening': self._listening}
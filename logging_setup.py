@@ -0,0 +1,214 @@
+# Configuración de logging compartida para Caffe & Miga
+# Los registros se encolan en el hilo que loguea y un hilo aparte los escribe en consola y
+# en archivo con rotación por tamaño, así el request no espera la E/S. Los DEBUG se limitan
+# por punto de llamada para que un pedido por segundo no inunde el log
+
+import os
+import sys
+import json
+import time
+import queue
+import random
+import copy
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Atributos propios de LogRecord; el resto son campos estructurados pasados con extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+def _file_defaults():
+    """LOG_MAX_SIZE y LOG_BACKUP_COUNT de config_rendimiento (1MB y 5 si no está disponible)"""
+    try:
+        from config_rendimiento import get_config
+    except ImportError:
+        try:
+            from cafeteria_sistema.config_rendimiento import get_config
+        except ImportError:
+            return 1024 * 1024, 5
+    return get_config('FILES', 'LOG_MAX_SIZE'), get_config('FILES', 'LOG_BACKUP_COUNT')
+
+def record_fields(record):
+    """Campos estructurados del registro (los pasados con extra={...})"""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith('_')}
+
+class StructuredFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, logger, msg y los campos de extra"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto de siempre, con los campos de extra al final como clave=valor"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, DATE_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' | ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+class DebugSampler(logging.Filter):
+    def __init__(self, max_per_interval=20, interval=60, sample_rate=0.0, max_level=logging.DEBUG):
+        """
+        Limitar los registros de nivel bajo por punto de llamada (archivo:línea)
+
+        Args:
+            max_per_interval: Registros que pasan siempre en cada intervalo
+            interval: Segundos del intervalo
+            sample_rate: Fracción (0-1) de los registros excedentes que igual pasan
+            max_level: Nivel máximo afectado (INFO y superiores pasan siempre por defecto)
+        """
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.max_level = max_level
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    # El primer registro del intervalo nuevo informa cuántos se descartaron
+                    record.suppressed = suppressed
+
+            window[1] += 1
+            if window[1] <= self.max_per_interval or random.random() < self.sample_rate:
+                return True
+            window[2] += 1
+            return False
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler que deja el traceback aparte (exc_text) en lugar de pegarlo al mensaje"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+def _parse_levels(value):
+    """'firebase_config=WARNING,urllib3=ERROR' -> {'firebase_config': 'WARNING', 'urllib3': 'ERROR'}"""
+    levels = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(log_file=None, level=logging.INFO, module_levels=None, console=True, structured=None):
+    """
+    Configurar el logger raíz una sola vez por proceso (las llamadas siguientes solo
+    ajustan niveles). Cada punto de entrada la llama en lugar de logging.basicConfig.
+
+    Variables de entorno (tienen prioridad sobre los argumentos):
+        LOG_LEVEL: Nivel raíz (DEBUG, INFO, ...)
+        LOG_FILE: Archivo con rotación (vacío = solo consola)
+        LOG_FORMAT: 'json' o 'text' para la consola (el archivo siempre es JSON)
+        LOG_MODULE_LEVELS: Niveles por módulo, 'firebase_config=WARNING,urllib3=ERROR'
+        LOG_DEBUG_MAX_PER_MINUTE / LOG_DEBUG_SAMPLE_RATE: Límite de DEBUG por punto de llamada
+        LOG_MAX_SIZE / LOG_BACKUP_COUNT: Rotación (por defecto los de config_rendimiento)
+
+    Args:
+        log_file: Archivo de log del proceso
+        level: Nivel raíz por defecto
+        module_levels: Dict {logger: nivel} por defecto
+        console: Escribir también en stderr
+        structured: Consola en JSON (None = según LOG_FORMAT, texto por defecto)
+    """
+    global _listener, _queue_handler
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', '').upper() or level)
+
+    levels = dict(module_levels or {})
+    levels.update(_parse_levels(os.getenv('LOG_MODULE_LEVELS')))
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    with _setup_lock:
+        if _listener is not None:
+            return root
+
+        handlers = []
+        if console:
+            if structured is None:
+                structured = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+            stream = logging.StreamHandler(sys.stderr)
+            stream.setFormatter(StructuredFormatter() if structured else TextFormatter())
+            handlers.append(stream)
+
+        log_file = os.getenv('LOG_FILE', log_file)
+        if log_file:
+            max_size, backup_count = _file_defaults()
+            rotating = RotatingFileHandler(
+                log_file,
+                maxBytes=int(os.getenv('LOG_MAX_SIZE', max_size)),
+                backupCount=int(os.getenv('LOG_BACKUP_COUNT', backup_count)),
+                encoding='utf-8'
+            )
+            rotating.setFormatter(StructuredFormatter())
+            handlers.append(rotating)
+
+        # Reemplazar cualquier handler previo (basicConfig de una librería, etc.)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _QueueHandler(log_queue)
+        _queue_handler.addFilter(DebugSampler(
+            max_per_interval=int(os.getenv('LOG_DEBUG_MAX_PER_MINUTE', 20)),
+            interval=60,
+            sample_rate=float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.0))
+        ))
+        root.addHandler(_queue_handler)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return root
+
+def shutdown_logging():
+    """Vaciar la cola y detener el hilo escritor (se llama solo al salir)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            if _queue_handler is not None:
+                logging.getLogger().removeHandler(_queue_handler)
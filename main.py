@@ -1,27 +1,52 @@
 # Servidor Backend para Caffe & Miga - Mercado Pago Integration
 # Python Flask Backend
 
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import mercadopago
 import os
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 from firebase_config import firebase_manager
-import sqlite3
+from order_journal import order_journal
+from order_events import order_events, format_sse
+from order_outbox import order_outbox
+from webhook_queue import webhook_queue
+from order_ids import new_order_id, order_id_time
+from order_stats import order_stats, parse_stats_date
+from health_probes import health_probes
+from mercadopago_http import mercadopago_http
+from circuit_breaker import CircuitOpenError
+from idempotency_store import idempotency_store, idempotent
+from admission_control import order_admission, admission_controlled
+from lazy_client import LazyClient
+from metrics import metrics, timed
+from logging_setup import configure_logging
+from order_schema import get_orders_database, now_timestamp
 import json
+import time
+import threading
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()  # LOG_LEVEL, LOG_FILE, LOG_MODULE_LEVELS... ver logging_setup.py
 logger = logging.getLogger(__name__)
 
 # Crear aplicación Flask con soporte para archivos estáticos
 app = Flask(__name__, static_folder='.', static_url_path='')
-CORS(app)  # Permitir requests desde el frontend
+
+# Proxies delante del servidor (el de Render es uno) cuyo X-Forwarded-For es confiable: ProxyFix
+# toma de ahí request.remote_addr, la IP que usa el control de admisión. 0 = sin proxy
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+CORS(app, expose_headers=['Retry-After', 'ETag'])  # Permitir requests desde el frontend (y que lea estos headers)
+metrics.init_app(app)  # Tiempos por ruta para /metrics
 
 # Configuración de Mercado Pago - Leer desde .env
 PROD_ACCESS_TOKEN = os.getenv('PROD_ACCESS_TOKEN')
@@ -44,13 +69,19 @@ else:
 # Integración: CheckoutPro
 # Modelo: Marketplace, BilleteraMercadopago
 
-# Inicializar SDK de Mercado Pago
-try:
-    sdk = mercadopago.SDK(ACCESS_TOKEN)
-    logger.info("✅ SDK de Mercado Pago inicializado correctamente")
-except Exception as e:
-    logger.error(f"❌ Error inicializando SDK: {e}")
-    sdk = None
+# Inicializar SDK de Mercado Pago al primer uso (o en el warm-up en segundo plano)
+# Transporte con pool keep-alive, timeouts y circuit breaker (mercadopago_http.py)
+sdk = LazyClient(lambda: mercadopago.SDK(ACCESS_TOKEN, http_client=mercadopago_http), 'SDK de Mercado Pago')
+
+# Stream del diario compartido con los pedidos pendientes de sincronizar
+PENDING_ORDERS_STREAM = 'pending_orders'
+
+# Máximo de cambios por respuesta del feed de /pos/orders (el resto va en la siguiente, con el cursor)
+POS_FEED_LIMIT = int(os.getenv('POS_FEED_LIMIT', 200))
+
+# Duración máxima de una conexión SSE de /pos/events: al cerrarse, el cliente reconecta con
+# Last-Event-ID y no se pierde nada, pero el hilo del servidor no queda ocupado para siempre
+SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
 
 # Configuración del servidor
 PORT = int(os.getenv('PORT', 3000))
@@ -61,59 +92,84 @@ def serve_index():
     """Servir la página principal"""
     return send_file('index.html')
 
+def circuit_open_response(error):
+    """Respuesta rápida cuando Mercado Pago está marcado como caído (circuito abierto)"""
+    logger.warning(f"🔌 {error}")
+    response = jsonify({
+        "error": "Mercado Pago no disponible temporalmente",
+        "retry_after": error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+# Con failover, Firestore caído no saca al servicio del balanceador: los pedidos van al almacén local
+FIRESTORE_FAILOVER = hasattr(firebase_manager, 'failover_stats')
+
+def probe_firebase():
+    """Sonda de Firebase: consulta mínima a Firestore"""
+    firebase_manager.ping()
+    return "Connected"
+
+def probe_mercado_pago():
+    """Sonda de Mercado Pago: lectura liviana de la API con el token configurado"""
+    if not sdk:
+        raise Exception("Not initialized")
+    response = sdk.payment_methods().list_all()
+    if response["status"] != 200:
+        raise Exception(f"Mercado Pago respondió {response['status']}")
+    return "OK"
+
+def probe_sqlite():
+    """Sonda de SQLite: diario compartido y, en desarrollo, la base del POS"""
+    order_journal.last_seq(PENDING_ORDERS_STREAM)
+    
+    if os.getenv('ENVIRONMENT', 'development') == 'development':
+        get_orders_database().query_one('SELECT MAX(version) FROM schema_version')
+    return "Connected"
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: el proceso responde. No consulta dependencias"""
+    return jsonify({"status": "OK", "timestamp": datetime.now().isoformat()})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: las dependencias críticas pasaron su última sonda (resultado en caché)"""
+    ready = health_probes.ready() and firebase_manager.ready and sdk.ready
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "degraded": FIRESTORE_FAILOVER and firebase_manager.degraded,
+        "clients": {"firebase": firebase_manager.ready, "mercado_pago": sdk.ready},
+        "services": {name: result['status'] for name, result in health_probes.snapshot().items()},
+        "timestamp": datetime.now().isoformat()
+    }), 200 if ready else 503
+
 @app.route('/health', methods=['GET'])
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Endpoint de diagnóstico para verificar el estado del servidor"""
+    """Endpoint de diagnóstico para verificar el estado del servidor
+    
+    Los estados de Firebase, Mercado Pago y SQLite vienen de las sondas en segundo plano
+    (health_probes), con su antigüedad e historial de latencias.
+    """
     try:
-        # Verificar Firebase
-        firebase_status = "OK"
-        firebase_error = None
-        try:
-            if firebase_manager.db:
-                # Intentar una consulta simple
-                firebase_manager.db.collection('test').limit(1).get()
-                firebase_status = "Connected"
-            else:
-                firebase_status = "Not initialized"
-        except Exception as e:
-            firebase_status = "Error"
-            firebase_error = str(e)
-        
-        # Verificar Mercado Pago
-        mp_status = "OK" if sdk else "Not initialized"
-        
-        # Verificar SQLite (solo en desarrollo)
-        sqlite_status = "N/A (Production)"
-        if os.getenv('ENVIRONMENT', 'development') == 'development':
-            try:
-                db_path = "cafeteria_sistema/pos_pedidos.db"
-                if os.path.exists(db_path):
-                    import sqlite3
-                    conn = sqlite3.connect(db_path)
-                    conn.close()
-                    sqlite_status = "Connected"
-                else:
-                    sqlite_status = "Database not found"
-            except Exception as e:
-                sqlite_status = f"Error: {str(e)}"
+        probes = health_probes.snapshot()
+        probes['mercado_pago']['mode'] = "TEST" if USE_TEST_MODE else "PRODUCTION"
+        probes['mercado_pago']['circuit'] = mercadopago_http.breaker.stats()
+        if FIRESTORE_FAILOVER:
+            probes['firebase']['failover'] = firebase_manager.failover_stats()
         
         health_data = {
             "status": "OK",
+            "ready": health_probes.ready(),
             "timestamp": datetime.now().isoformat(),
             "environment": os.getenv('ENVIRONMENT', 'development'),
             "services": {
-                "firebase": {
-                    "status": firebase_status,
-                    "error": firebase_error
-                },
-                "mercado_pago": {
-                    "status": mp_status,
-                    "mode": "TEST" if USE_TEST_MODE else "PRODUCTION"
-                },
-                "sqlite": {
-                    "status": sqlite_status
-                }
+                **probes,
+                "outbox": order_outbox.stats(),
+                "webhook_queue": webhook_queue.stats(),
+                "admission": order_admission.stats(),
+                "open_orders_view": firebase_manager.open_orders.stats()
             }
         }
         
@@ -127,6 +183,8 @@ def health_check():
         }), 500
 
 @app.route('/create_preference', methods=['POST'])
+@admission_controlled('create_preference')
+@idempotent('create_preference')
 def create_preference():
     """Crear preferencia de pago para Mercado Pago"""
     try:
@@ -184,7 +242,7 @@ def create_preference():
             },
             "notification_url": f"http://localhost:{PORT}/webhook",  # URL para webhooks
             "statement_descriptor": "CAFFE&MIGA",
-            "external_reference": data.get('external_reference', f"caffeymiga_{int(datetime.now().timestamp())}"),
+            "external_reference": data.get('external_reference', new_order_id('caffeymiga')),
             "expires": False,
             "metadata": data.get('metadata', {})
         }
@@ -198,6 +256,7 @@ def create_preference():
             
             # 🔥 GUARDAR PEDIDO EN FIREBASE 🔥
             order_data = {
+                "id": new_order_id('web'),
                 "preference_id": preference["id"],
                 "external_reference": preference.get("external_reference"),
                 "customer": {
@@ -215,15 +274,12 @@ def create_preference():
                 "source": "web_ecommerce"
             }
             
-            # Guardar en Firebase
-            order_id = firebase_manager.save_order(order_data)
-            if order_id:
-                logger.info(f"🔥 Pedido guardado en Firebase: {order_id}")
-            else:
-                logger.warning("⚠️ No se pudo guardar en Firebase, continuando...")
+            # Guardar en el outbox; Firebase y SQLite local se escriben en segundo plano
+            outbox_seq = order_outbox.enqueue(order_data)
+            order_stats.record_order(order_data)
             
-            # Guardar también en SQLite local
-            save_order_to_sqlite(order_data)
+            # Avisar a los POS suscritos
+            order_events.publish('order_created', format_order_for_pos(order_data))
             
             return jsonify({
                 "id": preference["id"],
@@ -232,7 +288,8 @@ def create_preference():
                 "status": "success",
                 "external_reference": preference.get("external_reference"),
                 "total": total,
-                "firebase_order_id": order_id
+                "firebase_order_id": None,  # Se asigna cuando el outbox lo envía a Firebase
+                "outbox_seq": outbox_seq
             })
         else:
             logger.error(f"❌ Error creando preferencia: {preference_response}")
@@ -241,6 +298,8 @@ def create_preference():
                 "details": preference_response
             }), 400
             
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except Exception as e:
         logger.error(f"❌ Error en create_preference: {str(e)}")
         return jsonify({
@@ -250,7 +309,11 @@ def create_preference():
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    """Recibir notificaciones de Mercado Pago"""
+    """Recibir notificaciones de Mercado Pago
+    
+    Solo se registra el payment_id en la cola persistente y se responde de inmediato;
+    el pago se consulta y procesa en segundo plano (process_payment_notification).
+    """
     try:
         data = request.get_json()
         logger.info(f"🔔 Webhook recibido: {data}")
@@ -260,71 +323,7 @@ def webhook():
             payment_id = data.get('data', {}).get('id')
             
             if payment_id:
-                # Obtener información del pago
-                payment_info = sdk.payment().get(payment_id)
-                
-                if payment_info["status"] == 200:
-                    payment = payment_info["response"]
-                    status = payment.get('status')
-                    external_reference = payment.get('external_reference')
-                    
-                    logger.info(f"💳 Pago {payment_id}: {status}")
-                    
-                    # 🔥 ACTUALIZAR ESTADO EN FIREBASE 🔥
-                    payment_data = {
-                        'status': status,
-                        'payment_id': payment_id,
-                        'external_reference': external_reference,
-                        'payment_method': payment.get('payment_method_id'),
-                        'amount': payment.get('transaction_amount')
-                    }
-                    
-                    # Buscar el pedido por external_reference y actualizar
-                    # (En una implementación más robusta, almacenarías la relación preference_id -> firebase_order_id)
-                    
-                    # Aquí puedes procesar según el estado del pago
-                    if status == 'approved':
-                        logger.info(f"✅ Pago aprobado: {external_reference}")
-                        logger.info(f"🔥 Creando pedido completo desde Mercado Pago")
-                        
-                        # Extraer información completa del pago
-                        payer = payment.get('payer', {})
-                        additional_info = payment.get('additional_info', {})
-                        items = additional_info.get('items', [])
-                        
-                        # Crear pedido completo para POS
-                        order_data = {
-                            'id': f"web_{payment_id}",
-                            'preference_id': external_reference,
-                            'firebase_id': f"mp_{payment_id}",
-                            'timestamp': datetime.now().isoformat(),
-                            'status': 'approved',
-                            'payment_status': 'approved',
-                            'pos_status': 'nuevo',
-                            'total': payment.get('transaction_amount', 0),
-                            'customer': {
-                                'name': payer.get('first_name', '') + ' ' + payer.get('last_name', ''),
-                                'phone': payer.get('phone', {}).get('number', ''),
-                                'email': payer.get('email', ''),
-                                'payment_method': f"Terminal Mercado Pago en sucursal"
-                            },
-                            'items': items,
-                            'metadata': additional_info.get('payer', {}),
-                            'notes': f"Pago ID: {payment_id}",
-                            'source': 'mercado_pago_webhook'
-                        }
-                        
-                        # Guardar en Firebase y memoria para sincronización
-                        firebase_result = firebase_manager.save_order(order_data)
-                        if firebase_result:
-                            save_order_to_sqlite(order_data)
-                            logger.info(f"✅ Pedido completo creado desde webhook MP: {order_data['id']}")
-                        
-                    elif status == 'rejected':
-                        logger.info(f"❌ Pago rechazado: {external_reference}")
-                        
-                    elif status == 'pending':
-                        logger.info(f"⏳ Pago pendiente: {external_reference}")
+                webhook_queue.enqueue(payment_id)
         
         return jsonify({"status": "ok"}), 200
         
@@ -332,6 +331,81 @@ def webhook():
         logger.error(f"❌ Error en webhook: {str(e)}")
         return jsonify({"error": "Error procesando webhook"}), 500
 
+def process_payment_notification(payment_id):
+    """Consultar un pago en Mercado Pago y crear su pedido si fue aprobado (worker de webhook_queue)
+    
+    Es idempotente: el pedido de un pago aprobado se crea una sola vez aunque
+    Mercado Pago reintente la notificación.
+    """
+    if not sdk:
+        raise Exception("SDK de Mercado Pago no inicializado")
+    
+    # Obtener información del pago
+    payment_info = sdk.payment().get(payment_id)
+    
+    if payment_info["status"] != 200:
+        raise Exception(f"Mercado Pago respondió {payment_info['status']} para el pago {payment_id}")
+    
+    payment = payment_info["response"]
+    status = payment.get('status')
+    external_reference = payment.get('external_reference')
+    
+    logger.info(f"💳 Pago {payment_id}: {status}")
+    
+    # El pedido de la preferencia se contó como 'pending': mover su contador al estado del pago
+    if external_reference:
+        order_stats.record_status_change(external_reference, payment_status=status)
+    
+    # Aquí puedes procesar según el estado del pago
+    if status == 'approved':
+        logger.info(f"✅ Pago aprobado: {external_reference}")
+        logger.info(f"🔥 Creando pedido completo desde Mercado Pago")
+        
+        # Extraer información completa del pago
+        payer = payment.get('payer', {})
+        additional_info = payment.get('additional_info', {})
+        items = additional_info.get('items', [])
+        
+        # Crear pedido completo para POS
+        order_data = {
+            'id': f"web_{payment_id}",
+            'preference_id': external_reference,
+            'firebase_id': f"mp_{payment_id}",
+            'timestamp': datetime.now().isoformat(),
+            'status': 'approved',
+            'payment_status': 'approved',
+            'pos_status': 'nuevo',
+            'total': payment.get('transaction_amount', 0),
+            'customer': {
+                'name': payer.get('first_name', '') + ' ' + payer.get('last_name', ''),
+                'phone': payer.get('phone', {}).get('number', ''),
+                'email': payer.get('email', ''),
+                'payment_method': f"Terminal Mercado Pago en sucursal"
+            },
+            'items': items,
+            'metadata': additional_info.get('payer', {}),
+            'notes': f"Pago ID: {payment_id}",
+            'source': 'mercado_pago_webhook'
+        }
+        
+        # Firebase y SQLite local se escriben desde el outbox, con reintentos. La clave del
+        # pago se marca en la misma transacción: una notificación repetida no encola otro pedido
+        if order_outbox.enqueue(order_data, dedupe_key=f"mp_payment:{payment_id}") is None:
+            logger.info(f"↩️ Pedido del pago {payment_id} ya creado, se ignora la notificación repetida")
+            return status
+        
+        order_stats.record_order(order_data)
+        order_events.publish('order_created', format_order_for_pos(order_data))
+        logger.info(f"✅ Pedido completo creado desde webhook MP: {order_data['id']}")
+        
+    elif status == 'rejected':
+        logger.info(f"❌ Pago rechazado: {external_reference}")
+        
+    elif status == 'pending':
+        logger.info(f"⏳ Pago pendiente: {external_reference}")
+    
+    return status
+
 @app.route('/payment_status/<payment_id>', methods=['GET'])
 def get_payment_status(payment_id):
     """Obtener estado de un pago específico"""
@@ -356,6 +430,8 @@ def get_payment_status(payment_id):
         else:
             return jsonify({"error": "Pago no encontrado"}), 404
             
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except Exception as e:
         logger.error(f"❌ Error obteniendo estado del pago: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -364,51 +440,86 @@ def get_payment_status(payment_id):
 # 🔥 SISTEMA POS INTEGRADO 🔥
 # ===============================
 
+def parse_order_cursor(value):
+    """Convertir el cursor `since` (ISO 8601 o un ID de pedido) en datetime sin zona horaria"""
+    moment = order_id_time(value)
+    if moment:
+        return moment
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+def order_changed_at(order):
+    """Momento del último cambio de un pedido (updated_at, created_at o timestamp)"""
+    for key in ('updated_at', 'created_at', 'timestamp', 'fecha'):
+        value = order.get(key)
+        if not value:
+            continue
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=None)
+        try:
+            return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+        except ValueError:
+            continue
+    return None
+
+def format_order_for_pos(order):
+    """Formatear un pedido de Firebase/memoria para compatibilidad con el POS"""
+    # Extraer información del cliente
+    customer = order.get('customer', {})
+    items = order.get('items', [])
+    
+    formatted_order = {
+        'id': order.get('id', ''),
+        'firebase_id': order.get('firebase_id', ''),
+        'preference_id': order.get('preference_id', ''),
+        'cliente': {
+            'nombre': customer.get('name', 'Cliente Web'),
+            'telefono': customer.get('phone', 'N/A'),
+            'email': customer.get('email', 'N/A')
+        },
+        'productos': [],
+        'total': order.get('total', 0),
+        'metodo_pago': customer.get('payment_method', 'Tarjeta'),
+        'estado': order.get('status', 'pending'),
+        'pos_status': order.get('pos_status', 'nuevo'),
+        'fecha': order.get('timestamp', datetime.now().isoformat()),
+        'payment_status': order.get('payment_status', 'pending')
+    }
+    
+    # Formatear productos
+    for item in items:
+        formatted_order['productos'].append({
+            'nombre': item.get('title', 'Producto'),
+            'cantidad': item.get('quantity', 1),
+            'precio': item.get('unit_price', 0),
+            'descripcion': item.get('description', '')
+        })
+    
+    return formatted_order
+
 @app.route('/pos/orders', methods=['GET', 'POST'])
+@admission_controlled('pos_orders')
+@idempotent('pos_orders')
 def pos_orders():
-    """Obtener todos los pedidos para el sistema POS o crear un pedido nuevo (efectivo/terminal)"""
+    """Obtener todos los pedidos para el sistema POS o crear un pedido nuevo (efectivo/terminal)
+    
+    GET acepta `?since=<cursor>` para recibir solo los pedidos creados o modificados
+    después del cursor, y responde 304 si no hubo cambios (también con If-None-Match).
+    Con filtros, `page_token` o `fields` recorre el historial completo (query_pos_orders_page).
+    """
     
     if request.method == 'POST':
         # Crear pedido en efectivo o terminal
         try:
-            # SUPER DEBUG: Ver el request completo
-            print("=" * 80)
-            print("🔥 SUPER DEBUG - NUEVO PEDIDO")
-            print(f"Request Content-Type: {request.content_type}")
-            print(f"Request Method: {request.method}")
-            print(f"Request Headers: {dict(request.headers)}")
-            
-            # Obtener datos raw del request
-            raw_data = request.get_data(as_text=True)
-            print(f"RAW DATA: {raw_data}")
-            
-            # Obtener datos parseados
-            data = request.get_json()
-            print(f"PARSED DATA: {data}")
-            print(f"DATA TYPE: {type(data)}")
-            print(f"DATA KEYS: {list(data.keys()) if data else 'None'}")
-            
-            if data and 'payer' in data:
-                print(f"PAYER OBJECT: {data['payer']}")
-                print(f"PAYER TYPE: {type(data['payer'])}")
-                if isinstance(data['payer'], dict):
-                    print(f"PAYER KEYS: {list(data['payer'].keys())}")
-                    print(f"NAME: '{data['payer'].get('name', '')}'")
-                    print(f"PHONE: {data['payer'].get('phone', {})}")
-                    print(f"EMAIL: '{data['payer'].get('email', '')}'")
-            else:
-                print("NO PAYER DATA FOUND!")
-            
-            print("=" * 80)
-            
             data = request.get_json()
             logger.info(f"📦 Procesando pedido {data.get('payment_method', 'efectivo')}: {data.get('payer', {}).get('name', 'Sin nombre')}")
-            
-            # DEBUG: Ver qué datos llegan exactamente
-            logger.info(f"🔍 DEBUG RAW DATA:")
-            logger.info(f"   data.keys(): {list(data.keys())}")
-            logger.info(f"   payer completo: {data.get('payer', {})}")
-            logger.info(f"   metadata completo: {data.get('metadata', {})}")
+            if logger.isEnabledFor(logging.DEBUG):
+                # Detalle del request solo con LOG_LEVEL=DEBUG (y limitado por logging_setup)
+                logger.debug("🔍 Datos del pedido recibido", extra={
+                    'content_type': request.content_type,
+                    'data_keys': list(data.keys()),
+                    'payer': data.get('payer', {}),
+                    'metadata': data.get('metadata', {})
+                })
             
             # Validar datos requeridos
             if not data.get('items') or len(data['items']) == 0:
@@ -422,7 +533,7 @@ def pos_orders():
                 total += price * quantity
             
             # Crear ID único para el pedido
-            order_id = f"efectivo_{int(datetime.now().timestamp())}"
+            order_id = new_order_id('efectivo')
             
             # Estructura del pedido para Firebase
             order_data = {
@@ -446,118 +557,101 @@ def pos_orders():
                 'source': 'web_cash_order'
             }
             
-            # Intentar guardar en Firebase primero
-            firebase_result = firebase_manager.save_order(order_data)
+            # Guardar una sola vez en el outbox local; Firestore y SQLite del POS se escriben en segundo plano
+            order_outbox.enqueue(order_data)
+            order_stats.record_order(order_data)
+            logger.info(f"✅ Pedido {data.get('payment_method')} aceptado: {order_id}")
             
-            # IMPORTANTE: También guardar en memoria para sincronización en producción
-            if os.getenv('ENVIRONMENT') == 'production':
-                if not hasattr(app, 'pending_orders'):
-                    app.pending_orders = []
-                app.pending_orders.append(order_data)
-                # Mantener solo los últimos 50 pedidos en memoria
-                if len(app.pending_orders) > 50:
-                    app.pending_orders = app.pending_orders[-50:]
-                logger.info(f"✅ Pedido {data.get('payment_method')} agregado a pending_orders para sincronización")
+            order_events.publish('order_created', format_order_for_pos(order_data))
             
-            if firebase_result:
-                logger.info(f"✅ Pedido {data.get('payment_method')} guardado en Firebase: {order_id}")
-                
-                # Guardar también en SQLite local para sincronización con POS
-                sqlite_result = save_order_to_sqlite(order_data)
-                if sqlite_result:
-                    logger.info(f"✅ Pedido {order_id} también guardado en SQLite local")
-                else:
-                    logger.warning(f"⚠️ Pedido {order_id} guardado en Firebase pero falló SQLite")
-                
-                return jsonify({
-                    "success": True,
-                    "message": f"Pedido {data.get('payment_method')} procesado correctamente",
-                    "order_id": order_id,
-                    "total": total,
-                    "payment_method": data.get('payment_method'),
-                    "customer_name": data.get('payer', {}).get('name', ''),
-                    "pickup_time": data.get('metadata', {}).get('pickup_time', '')
-                })
-            else:
-                # Si Firebase falla, intentar guardar solo localmente en SQLite
-                logger.warning(f"⚠️ Firebase falló para pedido {order_id}, intentando solo SQLite")
-                sqlite_result = save_order_to_sqlite(order_data)
-                
-                if sqlite_result:
-                    logger.info(f"✅ Pedido {order_id} guardado solo en SQLite (Firebase no disponible)")
-                    return jsonify({
-                        "success": True,
-                        "message": f"Pedido {data.get('payment_method')} procesado correctamente (solo local)",
-                        "order_id": order_id,
-                        "total": total,
-                        "payment_method": data.get('payment_method'),
-                        "customer_name": data.get('payer', {}).get('name', ''),
-                        "pickup_time": data.get('metadata', {}).get('pickup_time', ''),
-                        "warning": "Firebase no disponible - pedido guardado solo localmente"
-                    })
-                else:
-                    return jsonify({"error": "Error guardando el pedido en Firebase y SQLite"}), 500
+            return jsonify({
+                "success": True,
+                "message": f"Pedido {data.get('payment_method')} procesado correctamente",
+                "order_id": order_id,
+                "total": total,
+                "payment_method": data.get('payment_method'),
+                "customer_name": data.get('payer', {}).get('name', ''),
+                "pickup_time": data.get('metadata', {}).get('pickup_time', '')
+            })
                 
         except Exception as e:
             logger.error(f"❌ Error procesando pedido efectivo/terminal: {str(e)}")
             return jsonify({"error": f"Error al procesar el pedido: {str(e)}"}), 500
     
     # Si es GET, continuar con la lógica original
+    
+    # Modo historial: filtros, paginación (`page_token`) y proyección (`fields`) contra Firestore
+    history_params = ('page_token', 'fields', 'status', 'pos_status', 'payment_status', 'from', 'to', 'limit')
+    if any(param in request.args for param in history_params):
+        return query_pos_orders_page()
+    
     try:
-        # Obtener órdenes de Firebase
-        firebase_orders = firebase_manager.get_all_orders()
-        
-        # Obtener órdenes pendientes en memoria
-        pending_orders = getattr(app, 'pending_orders', [])
-        
-        # Combinar ambas fuentes
-        all_orders = list(firebase_orders) + list(pending_orders)
+        # Modo incremental: el POS envía el cursor (`since`) que recibió en la última consulta
+        since_param = request.args.get('since')
+        since = None
+        if since_param:
+            try:
+                since = parse_order_cursor(since_param)
+            except ValueError:
+                return jsonify({"status": "error", "error": f"Cursor 'since' inválido: {since_param}", "orders": []}), 400
+        
+        # Pedidos abiertos desde la vista en memoria (listener de Firestore); con `since`,
+        # solo los creados o modificados después del cursor, más los que se cerraron
+        firebase_orders = firebase_manager.get_open_orders(since)
+        closed_orders = firebase_manager.get_closed_orders(since) if since else []
+        
+        # Obtener órdenes pendientes del diario compartido (visible desde cualquier worker)
+        pending_orders = order_journal.recent(PENDING_ORDERS_STREAM, 50)
+        if since:
+            pending_orders = [o for o in pending_orders if (order_changed_at(o) or since) > since]
+        
+        # Combinar ambas fuentes y paginar: los cambios más antiguos primero, hasta POS_FEED_LIMIT
+        changes = sorted(
+            [(order_changed_at(o), False, o) for o in list(firebase_orders) + list(pending_orders)]
+            + [(entry['changed_at'], True, entry) for entry in closed_orders],
+            key=lambda change: change[0] or datetime.min
+        )
+        has_more = len(changes) > POS_FEED_LIMIT
+        if has_more:
+            # No cortar entre cambios del mismo momento: el siguiente `since` los saltaría
+            end = POS_FEED_LIMIT
+            while end < len(changes) and changes[end][0] == changes[POS_FEED_LIMIT - 1][0]:
+                end += 1
+            changes = changes[:end]
+        all_orders = [order for _, closed, order in changes if not closed]
+        closed_orders = [{'id': entry['id'], 'pos_status': entry['pos_status'],
+                          'changed_at': entry['changed_at'].isoformat()}
+                         for _, closed, entry in changes if closed]
+        
+        # El nuevo cursor es el cambio más reciente enviado (o el mismo si no hubo cambios)
+        changed_times = [changed_at for changed_at, _, _ in changes if changed_at]
+        cursor = max(changed_times).isoformat() if changed_times else (since_param or '')
+        etag = f"{len(changes)}-{cursor}"
+        
+        # Nada cambió: 304 sin cuerpo
+        if (since and not changes) or request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
         # Formatear pedidos para el POS
-        formatted_orders = []
-        for order in all_orders:
-            # Extraer información del cliente
-            customer = order.get('customer', {})
-            items = order.get('items', [])
-            
-            # Formatear para compatibilidad con el POS
-            formatted_order = {
-                'id': order.get('id', ''),
-                'firebase_id': order.get('firebase_id', ''),
-                'preference_id': order.get('preference_id', ''),
-                'cliente': {
-                    'nombre': customer.get('name', 'Cliente Web'),
-                    'telefono': customer.get('phone', 'N/A'),
-                    'email': customer.get('email', 'N/A')
-                },
-                'productos': [],
-                'total': order.get('total', 0),
-                'metodo_pago': customer.get('payment_method', 'Tarjeta'),
-                'estado': order.get('status', 'pending'),
-                'pos_status': order.get('pos_status', 'nuevo'),
-                'fecha': order.get('timestamp', datetime.now().isoformat()),
-                'payment_status': order.get('payment_status', 'pending')
-            }
-            
-            # Formatear productos
-            for item in items:
-                formatted_order['productos'].append({
-                    'nombre': item.get('title', 'Producto'),
-                    'cantidad': item.get('quantity', 1),
-                    'precio': item.get('unit_price', 0),
-                    'descripcion': item.get('description', '')
-                })
-            
-            formatted_orders.append(formatted_order)
+        formatted_orders = [format_order_for_pos(order) for order in all_orders]
         
         logger.info(f"📋 Enviando {len(formatted_orders)} pedidos al POS")
         
-        return jsonify({
+        response = jsonify({
             "status": "success",
             "orders": formatted_orders,
             "count": len(formatted_orders),
+            # Pedidos que salieron de la vista (entregados, cancelados): el POS los quita
+            "closed": closed_orders,
+            "cursor": cursor,
+            # Hay más cambios: pedir de nuevo con este cursor
+            "has_more": has_more,
             "timestamp": datetime.now().isoformat()
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"❌ Error obteniendo pedidos POS: {str(e)}")
@@ -567,6 +661,58 @@ def pos_orders():
             "orders": []
         }), 500
 
+def query_pos_orders_page():
+    """Página de pedidos para historial y conciliación (GET /pos/orders con filtros)
+    
+    Parámetros: status, pos_status, payment_status, from/to (YYYY-MM-DD o ISO 8601),
+    limit (máx. 500), page_token (de la respuesta anterior) y fields (lista separada por comas).
+    """
+    try:
+        try:
+            start = parse_order_cursor(request.args['from']) if request.args.get('from') else None
+            end = parse_order_cursor(request.args['to']) if request.args.get('to') else None
+            limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        except ValueError as e:
+            return jsonify({"status": "error", "error": f"Parámetros inválidos: {e}", "orders": []}), 400
+        
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+        
+        try:
+            orders, next_page_token = firebase_manager.query_orders(
+                status=request.args.get('status'),
+                pos_status=request.args.get('pos_status'),
+                payment_status=request.args.get('payment_status'),
+                start=start,
+                end=end,
+                limit=limit,
+                page_token=request.args.get('page_token'),
+                fields=fields
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e), "orders": []}), 400
+        
+        # Con proyección se devuelven solo los campos pedidos; sin ella, el formato del POS
+        if fields:
+            orders = [{key: order.get(key) for key in ['id'] + fields} for order in orders]
+        else:
+            orders = [format_order_for_pos(order) for order in orders]
+        
+        return jsonify({
+            "status": "success",
+            "orders": orders,
+            "count": len(orders),
+            "next_page_token": next_page_token,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"❌ Error consultando historial de pedidos: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "error": str(e),
+            "orders": []
+        }), 500
+
 @app.route('/pos/order/<order_id>/status', methods=['PUT'])
 def update_pos_order_status(order_id):
     """Actualizar estado de pedido desde el POS"""
@@ -590,6 +736,11 @@ def update_pos_order_status(order_id):
         
         if success:
             logger.info(f"✅ Estado del pedido {order_id} actualizado a: {new_status}")
+            order_stats.record_status_change(order_id, pos_status=new_status)
+            order_events.publish('order_status_changed', {
+                'id': order_id,
+                'pos_status': new_status
+            })
             return jsonify({
                 "status": "success",
                 "message": f"Pedido actualizado a {new_status}",
@@ -603,6 +754,104 @@ def update_pos_order_status(order_id):
         logger.error(f"❌ Error actualizando estado POS: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/pos/orders/status', methods=['PUT'])
+def update_pos_orders_status_batch():
+    """Actualizar el estado de varios pedidos en una sola llamada (ej. cierre del día)
+    
+    Body: {"updates": [{"id": "...", "status": "entregado"}, ...]}
+    Se escriben en batches de Firestore y se devuelve un resultado por pedido.
+    """
+    try:
+        data = request.get_json() or {}
+        updates = data.get('updates', [])
+        
+        valid_statuses = ['nuevo', 'preparando', 'listo', 'entregado', 'cancelado']
+        
+        if not updates:
+            return jsonify({"error": "No se recibieron actualizaciones"}), 400
+        
+        invalid = [u for u in updates if not u.get('id') or u.get('status') not in valid_statuses]
+        if invalid:
+            return jsonify({
+                "error": f"Actualizaciones inválidas. Cada una necesita 'id' y 'status' en: {valid_statuses}",
+                "invalid": invalid
+            }), 400
+        
+        results = firebase_manager.update_order_statuses_batch(
+            [(u['id'], u['status']) for u in updates]
+        )
+        
+        for update, result in zip(updates, results):
+            result['status'] = update['status']
+            if result['success']:
+                order_stats.record_status_change(update['id'], pos_status=update['status'])
+                order_events.publish('order_status_changed', {
+                    'id': update['id'],
+                    'pos_status': update['status']
+                })
+        
+        updated = sum(1 for r in results if r['success'])
+        logger.info(f"✅ {updated}/{len(results)} pedidos actualizados en batch")
+        
+        return jsonify({
+            "status": "success" if updated == len(results) else "partial",
+            "updated": updated,
+            "failed": len(results) - updated,
+            "results": results
+        }), 200 if updated else 500
+        
+    except Exception as e:
+        logger.error(f"❌ Error actualizando estados en batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/pos/events', methods=['GET'])
+def pos_events():
+    """Stream SSE de pedidos creados y cambios de estado para el POS
+    
+    Al reconectar, el cliente envía `Last-Event-ID` (o `?last_event_id=`) y recibe
+    primero los eventos que se perdió mientras estuvo desconectado. Cada conexión dura
+    como máximo SSE_MAX_STREAM_SECONDS; después el cliente reconecta (retry: 3000).
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID inválido"}), 400
+    
+    # Un ID mayor al último conocido (diario reiniciado) no debe dejar al cliente esperando para siempre
+    last_event_id = min(last_event_id, order_events.last_event_id())
+    
+    def generate(last_id):
+        # Indicar al navegador/cliente cada cuánto reintentar si se corta
+        yield "retry: 3000\n\n"
+        
+        for event in order_events.events_since(last_id):
+            last_id = event['id']
+            yield format_sse(event)
+        
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Fin de la conexión: el cliente vuelve a conectar desde last_id
+                return
+            events = order_events.wait_for_events(last_id, timeout=min(15, remaining))
+            if not events:
+                # Comentario keep-alive para que proxies no cierren la conexión
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                last_id = event['id']
+                yield format_sse(event)
+    
+    return Response(
+        stream_with_context(generate(last_event_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/pos/sync', methods=['POST'])
 def sync_pos_orders():
     """Sincronizar pedidos entre web y POS"""
@@ -634,48 +883,19 @@ def sync_pos_orders():
 
 @app.route('/pos/stats', methods=['GET'])
 def get_pos_stats():
-    """Obtener estadísticas para el POS"""
+    """Obtener estadísticas para el POS
+    
+    Se leen de los contadores diarios (order_stats); `from` y `to` (YYYY-MM-DD)
+    limitan el rango de días.
+    """
     try:
-        orders = firebase_manager.get_all_orders()
-        
-        # Calcular estadísticas
-        stats = {
-            'total_orders': len(orders),
-            'pending_orders': 0,
-            'completed_orders': 0,
-            'total_revenue': 0,
-            'orders_by_status': {
-                'nuevo': 0,
-                'preparando': 0,
-                'listo': 0,
-                'entregado': 0,
-                'cancelado': 0
-            },
-            'orders_today': 0
-        }
-        
-        today = datetime.now().date()
+        try:
+            start = parse_stats_date(request.args.get('from'))
+            end = parse_stats_date(request.args.get('to'))
+        except ValueError:
+            return jsonify({"error": "Parámetros 'from'/'to' inválidos, usar YYYY-MM-DD"}), 400
         
-        for order in orders:
-            # Contar por estado POS
-            pos_status = order.get('pos_status', 'nuevo')
-            if pos_status in stats['orders_by_status']:
-                stats['orders_by_status'][pos_status] += 1
-            
-            # Contar pagos aprobados
-            if order.get('payment_status') == 'approved':
-                stats['completed_orders'] += 1
-                stats['total_revenue'] += order.get('total', 0)
-            else:
-                stats['pending_orders'] += 1
-            
-            # Contar pedidos de hoy
-            try:
-                order_date = datetime.fromisoformat(order.get('timestamp', '')).date()
-                if order_date == today:
-                    stats['orders_today'] += 1
-            except:
-                pass
+        stats = order_stats.summary(start, end)
         
         return jsonify({
             "status": "success",
@@ -694,12 +914,11 @@ def get_pos_stats():
 def test_pos_connection():
     """Probar conexión del POS"""
     try:
-        # Verificar conexión a Firebase
-        firebase_status = "connected" if firebase_manager.db else "disconnected"
+        # Estado de Firebase según la última sonda (sin consultar Firestore en cada llamada)
+        firebase_status = "connected" if health_probes.snapshot()['firebase']['ok'] else "disconnected"
         
-        # Contar pedidos
-        orders = firebase_manager.get_all_orders()
-        order_count = len(orders)
+        # Contar pedidos desde los contadores locales
+        order_count = order_stats.summary()['total_orders']
         
         return jsonify({
             "status": "success",
@@ -711,7 +930,8 @@ def test_pos_connection():
                 "get_orders": "/pos/orders",
                 "update_status": "/pos/order/<id>/status",
                 "sync": "/pos/sync",
-                "stats": "/pos/stats"
+                "stats": "/pos/stats",
+                "events": "/pos/events"
             }
         })
         
@@ -722,6 +942,20 @@ def test_pos_connection():
             "error": str(e)
         }), 500
 
+@app.route('/pos/outbox', methods=['GET'])
+def pos_outbox_stats():
+    """Profundidad y retraso del outbox de pedidos pendientes de enviar a Firebase"""
+    return jsonify({
+        "status": "success",
+        "outbox": order_outbox.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latencias por ruta y por dependencia (Firestore, Mercado Pago, SQLite) en formato Prometheus"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/test', methods=['GET'])
 def test_endpoint():
     """Endpoint de prueba simple"""
@@ -757,16 +991,17 @@ def serve_images(filename):
     """Servir imágenes desde la carpeta img"""
     return send_from_directory('img', filename)
 
+@timed('sqlite')
 def save_order_to_sqlite(order_data):
     """Guardar pedido también en SQLite local para sincronización con POS"""
     try:
         # En producción (Render), guardar en memoria para sincronización
         if os.getenv('ENVIRONMENT') == 'production':
-            logger.info("🌐 Entorno de producción - guardando en memoria para sincronización")
+            logger.info("🌐 Entorno de producción - guardando en el diario para sincronización")
             
             # Crear estructura para sincronización
             order_for_sync = {
-                'id': order_data.get('id', f"web_{int(datetime.now().timestamp())}"),
+                'id': order_data.get('id', new_order_id('web')),
                 'cliente': {
                     'nombre': order_data.get('customer', {}).get('name', 'Cliente Web').strip(),
                     'telefono': order_data.get('customer', {}).get('phone', 'N/A'),
@@ -795,27 +1030,15 @@ def save_order_to_sqlite(order_data):
                 }
                 order_for_sync['productos'].append(product_info)
             
-            # Guardar en variable global para endpoint
-            if not hasattr(app, 'pending_orders'):
-                app.pending_orders = []
+            # Guardar en el diario compartido para el endpoint
+            order_journal.append(PENDING_ORDERS_STREAM, 'order', order_for_sync)
             
-            app.pending_orders.append(order_for_sync)
-            
-            # Mantener solo los últimos 50 pedidos en memoria
-            if len(app.pending_orders) > 50:
-                app.pending_orders = app.pending_orders[-50:]
-            
-            logger.info(f"✅ Pedido guardado en memoria para sincronización: {order_for_sync['id']}")
+            logger.info(f"✅ Pedido guardado en el diario para sincronización: {order_for_sync['id']}")
             return True
         
-        # En desarrollo local, usar SQLite
-        db_path = "pos_pedidos.db"  # Usar la base de datos en el directorio raíz
-        
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Generar ID único para el pedido
-        order_id = order_data.get('external_reference', f"web_{int(datetime.now().timestamp())}")
+        # En desarrollo local, usar el almacén de pedidos del POS (ver order_schema.py)
+        # El ID es el del outbox y de Firestore: cada reintento de la copia local usa el mismo
+        order_id = order_data.get('id') or order_data.get('external_reference') or new_order_id('web')
         customer = order_data.get('customer', {})
         items = order_data.get('items', [])
         metadata = order_data.get('metadata', {})
@@ -832,27 +1055,28 @@ def save_order_to_sqlite(order_data):
         
         items_json = json.dumps(formatted_items, ensure_ascii=False)
         
-        # Insertar en la tabla pedidos
-        c.execute("""
-            INSERT INTO pedidos (id, cliente_nombre, cliente_telefono, hora_recogida, 
-                               items, total, estado, metodo_pago, fecha_creacion, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        # Insertar en la tabla pedidos (un reintento del outbox no duplica el pedido, tiene el mismo
+        # ID); el trigger del almacén normaliza los items en pedido_items en la misma sentencia
+        get_orders_database().execute("""
+            INSERT OR IGNORE INTO pedidos (id, firebase_id, cliente_nombre, cliente_email, cliente_telefono, hora_recogida,
+                               items, total, estado, estado_pago, metodo_pago, fecha_creacion, fecha_actualizacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
+            order_id,
             order_id,
             customer.get('name', ''),
+            customer.get('email', ''),
             customer.get('phone', ''),
             order_data.get('pickup_time', metadata.get('pickup_time', '')),
             items_json,
             order_data.get('total', 0),
             'pendiente',
+            order_data.get('payment_status', 'pending'),
             customer.get('payment_method', 'mercado_pago'),
-            datetime.now().isoformat(),
-            datetime.now().isoformat()
+            now_timestamp(),
+            now_timestamp()
         ))
         
-        conn.commit()
-        conn.close()
-        
         logger.info(f"✅ Pedido guardado en SQLite: {order_id}")
         logger.info(f"📱 Cliente: {customer.get('name', '')}")
         logger.info(f"💰 Total: ${order_data.get('total', 0)}")
@@ -864,7 +1088,15 @@ def save_order_to_sqlite(order_data):
         return False
         return False
 
+def persist_order_locally(order_data):
+    """Copia local del pedido para sincronización con el POS (la ejecuta el flusher del outbox)"""
+    # Los pedidos en efectivo/terminal también van completos al diario en producción
+    if os.getenv('ENVIRONMENT') == 'production' and order_data.get('source') == 'web_cash_order':
+        order_journal.append(PENDING_ORDERS_STREAM, 'order', order_data)
+    return save_order_to_sqlite(order_data)
+
 @app.route('/pos/orders/simple', methods=['POST'])
+@idempotent('pos_orders_simple')
 def pos_orders_simple():
     """Endpoint simplificado para crear pedidos y guardar en SQLite"""
     try:
@@ -880,7 +1112,7 @@ def pos_orders_simple():
         total = sum(item.get('price', 0) * item.get('quantity', 1) for item in data['items'])
         
         # Crear ID único para el pedido
-        order_id = f"simple_{int(datetime.now().timestamp())}"
+        order_id = new_order_id('simple')
         
         # Preparar datos para SQLite
         order_data = {
@@ -903,6 +1135,7 @@ def pos_orders_simple():
         except Exception as sqlite_error:
             logger.error(f"❌ Error guardando en SQLite: {sqlite_error}")
         
+        order_stats.record_order(order_data)
         logger.info(f"✅ Pedido simple procesado: {order_id} - Total: ${total}")
         
         return jsonify({
@@ -934,8 +1167,9 @@ def pos_orders_basic():
         total = sum(item.get('price', 0) * item.get('quantity', 1) for item in data['items'])
         
         # Crear ID único para el pedido
-        order_id = f"basic_{int(datetime.now().timestamp())}"
+        order_id = new_order_id('basic')
         
+        order_stats.record_order({'id': order_id, 'total': total})
         logger.info(f"✅ Pedido básico procesado: {order_id} - Total: ${total}")
         
         return jsonify({
@@ -985,7 +1219,7 @@ def test_mercadopago():
                 "failure": "http://localhost:3000/failure.html",
                 "pending": "http://localhost:3000/pending.html"
             },
-            "external_reference": f"test_{int(datetime.now().timestamp())}"
+            "external_reference": new_order_id('test')
         }
         
         # Intentar crear preferencia
@@ -1001,6 +1235,8 @@ def test_mercadopago():
             "error": response if response.get("status") != 201 else None
         })
         
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except Exception as e:
         logger.error(f"❌ Error en test Mercado Pago: {str(e)}")
         return jsonify({
@@ -1011,6 +1247,7 @@ def test_mercadopago():
         }), 500
 
 @app.route('/api/orders/save', methods=['POST'])
+@admission_controlled('save_order_for_sync')
 def save_order_for_sync():
     """Guardar pedido para sincronización automática"""
     try:
@@ -1019,7 +1256,7 @@ def save_order_for_sync():
         
         # Crear estructura del pedido para sincronización
         order_for_sync = {
-            'id': data.get('external_reference', f"sync_{int(datetime.now().timestamp())}"),
+            'id': data.get('external_reference') or new_order_id('sync'),
             'cliente_nombre': data.get('customer', {}).get('name', ''),
             'cliente_telefono': data.get('customer', {}).get('phone', ''),
             'hora_recogida': data.get('metadata', {}).get('pickup_time', ''),
@@ -1043,15 +1280,9 @@ def save_order_for_sync():
         # Guardar en Firebase con estructura para sincronización
         firebase_order_id = firebase_manager.save_order(order_for_sync)
         
-        # También guardar en variable global para endpoint
-        if not hasattr(app, 'pending_orders'):
-            app.pending_orders = []
-        
-        app.pending_orders.append(order_for_sync)
-        
-        # Mantener solo los últimos 50 pedidos en memoria
-        if len(app.pending_orders) > 50:
-            app.pending_orders = app.pending_orders[-50:]
+        # También guardar en el diario compartido para el endpoint
+        order_journal.append(PENDING_ORDERS_STREAM, 'order', order_for_sync)
+        order_stats.record_order(order_for_sync)
         
         logger.info(f"✅ Pedido guardado para sincronización: {order_for_sync['id']}")
         
@@ -1066,6 +1297,57 @@ def save_order_for_sync():
         logger.error(f"❌ Error guardando pedido para sync: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Vaciar el outbox hacia Firebase en segundo plano
+order_outbox.start(firebase_manager.save_order, persist_order_locally,
+                   batch_writer=firebase_manager.save_orders_batch)
+
+# Procesar las notificaciones de Mercado Pago en segundo plano
+webhook_queue.start(process_payment_notification, workers=int(os.getenv('WEBHOOK_WORKERS', 2)))
+
+# Campos de Firestore que necesitan los contadores de order_stats
+STATS_FIELDS = ['pos_status', 'payment_status', 'total', 'external_reference', 'preference_id']
+
+def backfill_order_stats():
+    """
+    Cargar en los contadores de /pos/stats los pedidos de hoy que ya estaban en Firestore
+    antes de que order_stats empezara a contarlos (deploy con la base nueva). Una vez por día
+    """
+    if order_stats.is_backfilled():
+        return
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    orders, page_token = [], None
+    while True:
+        page, page_token = firebase_manager.query_orders(start=start, limit=500, page_token=page_token,
+                                                         fields=STATS_FIELDS)
+        orders.extend(page)
+        if not page_token:
+            break
+    added = order_stats.backfill(orders, start.date())
+    logger.info(f"📊 Estadísticas de hoy cargadas desde Firestore: {added} pedidos agregados")
+
+def warm_up_clients():
+    """Inicializar Mercado Pago y Firebase en segundo plano para no demorar el arranque"""
+    sdk.get()
+    firebase_manager.initialize_firebase()
+    
+    # Mantener en memoria los pedidos abiertos (listener en tiempo real de Firestore)
+    firebase_manager.start_open_orders_listener()
+    
+    try:
+        backfill_order_stats()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron cargar las estadísticas de hoy desde Firestore: {e}")
+    logger.info("🔥 Warm-up de clientes terminado")
+
+if os.getenv('WARM_UP_CLIENTS', 'true').lower() == 'true':
+    threading.Thread(target=warm_up_clients, name='warm-up', daemon=True).start()
+
+# Revisar dependencias en segundo plano para /health y /health/ready
+health_probes.register('firebase', probe_firebase, critical=not FIRESTORE_FAILOVER)
+health_probes.register('mercado_pago', probe_mercado_pago)
+health_probes.register('sqlite', probe_sqlite)
+health_probes.start()
+
 if __name__ == '__main__':
     print("\n" + "="*50)
     print("🚀 Iniciando servidor Caffe & Miga")
@@ -0,0 +1,95 @@
+# Transporte HTTP para el SDK de Mercado Pago en Caffe & Miga
+# Una sola sesión con pool keep-alive, timeouts explícitos, reintentos acotados
+# y circuit breaker, en lugar de una sesión nueva sin timeout por cada llamada
+
+import os
+import re
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from mercadopago.http.http_client import HttpClient
+from circuit_breaker import CircuitBreaker
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MERCADO_PAGO_API_URL = 'https://api.mercadopago.com'
+
+class PooledHttpClient(HttpClient):
+    def __init__(self, base_url=None, connect_timeout=3, read_timeout=10, retries=2,
+                 pool_size=20, breaker=None):
+        """
+        Args:
+            base_url: Reemplaza https://api.mercadopago.com (ej. el servidor falso local)
+            connect_timeout: Segundos para establecer la conexión
+            read_timeout: Segundos de espera por la respuesta
+            retries: Reintentos ante errores de conexión o 429/5xx (solo métodos idempotentes)
+            pool_size: Conexiones keep-alive que se mantienen abiertas
+            breaker: CircuitBreaker que protege las llamadas
+        """
+        self.base_url = (base_url or MERCADO_PAGO_API_URL).rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker('mercado_pago')
+
+        # POST no se reintenta: podría crear una preferencia duplicada
+        retry_strategy = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET', 'PUT', 'DELETE'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry_strategy)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        """Llamada a la API con timeout fijo, protegida por el circuit breaker"""
+        if url.startswith(MERCADO_PAGO_API_URL):
+            url = self.base_url + url[len(MERCADO_PAGO_API_URL):]
+        # El SDK manda su propio timeout (60s por defecto) y maxretries; se usan los del pool
+        kwargs['timeout'] = self.timeout
+
+        self.breaker.before_call()
+        try:
+            with metrics.span('mercado_pago', f"{method} {_path_template(url)}"):
+                api_result = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.record_failure(e)
+            raise
+
+        # 429 y 5xx indican que Mercado Pago está saturado o caído; 4xx son errores del pedido
+        if api_result.status_code == 429 or api_result.status_code >= 500:
+            self.breaker.record_failure(f"HTTP {api_result.status_code}")
+        else:
+            self.breaker.record_success()
+
+        try:
+            body = api_result.json()
+        except ValueError:
+            body = {'message': api_result.text}
+
+        return {
+            "status": api_result.status_code,
+            "response": body
+        }
+
+def _path_template(url):
+    """Ruta sin IDs para agrupar métricas: /v1/payments/123 -> /v1/payments/:id"""
+    path = re.sub(r'^https?://[^/]+', '', url).split('?')[0]
+    # Segmentos con dígitos son IDs, salvo la versión de la API (/v1)
+    return re.sub(r'/(?!v\d+(?:/|$))[^/]*\d[^/]*', '/:id', path)
+
+# Instancia global
+mercadopago_http = PooledHttpClient(
+    base_url=os.getenv('MERCADO_PAGO_API_URL'),
+    connect_timeout=float(os.getenv('MERCADO_PAGO_CONNECT_TIMEOUT', 3)),
+    read_timeout=float(os.getenv('MERCADO_PAGO_READ_TIMEOUT', 10)),
+    breaker=CircuitBreaker(
+        'mercado_pago',
+        failure_threshold=int(os.getenv('MERCADO_PAGO_BREAKER_THRESHOLD', 5)),
+        reset_timeout=int(os.getenv('MERCADO_PAGO_BREAKER_RESET', 30))
+    )
+)
@@ -0,0 +1,168 @@
+# Métricas de latencia para Caffe & Miga
+# Histogramas en memoria por ruta HTTP y por dependencia (Firestore, Mercado Pago, SQLite),
+# expuestos en formato de texto de Prometheus en /metrics
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Límites de los buckets en segundos (estilo Prometheus, acumulativos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size=1024):
+        """
+        Args:
+            buckets: Límites superiores de los buckets
+            reservoir_size: Observaciones recientes que se guardan para calcular p50/p95/p99
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir_size)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, limit in enumerate(self.buckets):
+            if seconds <= limit:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Percentil aproximado sobre las observaciones recientes"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class MetricsRegistry:
+    def __init__(self, prefix='caffeymiga'):
+        self.prefix = prefix
+        self.families = {
+            'http_request_duration_seconds': ('Duración de requests HTTP por ruta', {}),
+            'dependency_call_duration_seconds': ('Duración de llamadas a dependencias externas y SQLite', {})
+        }
+        self._lock = threading.Lock()
+        # Spans abiertos de cada hilo, para que mark_error marque la llamada en curso
+        self._local = threading.local()
+
+    def observe(self, family, labels, seconds):
+        """Registrar una duración en la familia con estas etiquetas"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histograms = self.families[family][1]
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def _open_spans(self):
+        spans = getattr(self._local, 'spans', None)
+        if spans is None:
+            spans = self._local.spans = []
+        return spans
+
+    @contextmanager
+    def span(self, dependency, operation):
+        """Medir un bloque como llamada a una dependencia (outcome=ok|error)"""
+        inicio = time.perf_counter()
+        current = {'dependency': dependency, 'outcome': 'ok'}
+        spans = self._open_spans()
+        spans.append(current)
+        try:
+            yield
+        except Exception:
+            current['outcome'] = 'error'
+            raise
+        finally:
+            spans.remove(current)
+            self.observe('dependency_call_duration_seconds',
+                         {'dependency': dependency, 'operation': operation, 'outcome': current['outcome']},
+                         time.perf_counter() - inicio)
+
+    def mark_error(self, dependency):
+        """
+        Marcar como error los spans abiertos de `dependency` en este hilo: para funciones
+        medidas con @timed que atrapan la excepción y devuelven [] o None
+        """
+        for current in self._open_spans():
+            if current['dependency'] == dependency:
+                current['outcome'] = 'error'
+
+    def timed(self, dependency, operation=None):
+        """Decorador: medir cada llamada a la función como span de `dependency`"""
+        def decorator(func):
+            name = operation or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(dependency, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def init_app(self, app):
+        """Registrar el middleware de tiempos en una app Flask"""
+        from flask import request, g
+
+        @app.before_request
+        def _iniciar_cronometro():
+            g._metrics_inicio = time.perf_counter()
+
+        @app.after_request
+        def _registrar_duracion(response):
+            inicio = getattr(g, '_metrics_inicio', None)
+            if inicio is not None:
+                route = request.url_rule.rule if request.url_rule else 'unmatched'
+                self.observe('http_request_duration_seconds',
+                             {'route': route, 'method': request.method, 'status': str(response.status_code)},
+                             time.perf_counter() - inicio)
+            return response
+
+    def render_prometheus(self):
+        """Todas las métricas en formato de texto de Prometheus (0.0.4)"""
+        lines = []
+        with self._lock:
+            for family, (help_text, histograms) in self.families.items():
+                name = f"{self.prefix}_{family}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(histograms.items()):
+                    labels = _format_labels(key)
+                    acumulado = 0
+                    for limit, count in zip(histogram.buckets, histogram.counts):
+                        acumulado += count
+                        lines.append(f'{name}_bucket{_format_labels(key + (("le", repr(limit)),))} {acumulado}')
+                    lines.append(f'{name}_bucket{_format_labels(key + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f"{name}_sum{labels} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{labels} {histogram.count}")
+
+                # Percentiles recientes como summary aparte (p50/p95/p99)
+                summary = f"{name}_recent"
+                lines.append(f"# HELP {summary} Percentiles de las últimas observaciones de {family}")
+                lines.append(f"# TYPE {summary} summary")
+                for key, histogram in sorted(histograms.items()):
+                    for q in QUANTILES:
+                        lines.append(f'{summary}{_format_labels(key + (("quantile", str(q)),))} '
+                                     f'{histogram.quantile(q):.6f}')
+                    lines.append(f"{summary}_sum{_format_labels(key)} {sum(histogram.recent):.6f}")
+                    lines.append(f"{summary}_count{_format_labels(key)} {len(histogram.recent)}")
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(pairs):
+    """Etiquetas {a="1",b="2"} con escape de comillas y barras"""
+    if not pairs:
+        return ''
+    escaped = (f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+# Instancia global
+metrics = MetricsRegistry()
+timed = metrics.timed
@@ -0,0 +1,193 @@
+# Vista en memoria de pedidos abiertos para Caffe & Miga
+# Un listener de Firestore (on_snapshot) la mantiene al día, así las lecturas del POS
+# y del navegador se sirven desde memoria sin consultar Firestore en cada request
+
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Estados POS que sacan a un pedido de la vista
+CLOSED_POS_STATUSES = ['entregado', 'cancelado']
+
+# Pedidos cerrados recientes que se recuerdan para el feed incremental del POS
+CLOSED_HISTORY = 1000
+
+class OpenOrdersView:
+    def __init__(self):
+        """Pedidos no cerrados indexados por ID y por pos_status"""
+        self.orders = {}
+        self.by_status = {}
+        # Pedidos que salieron de la vista: {id: {'id', 'pos_status', 'changed_at'}}
+        self.closed = OrderedDict()
+        self.ready = False
+        self.last_read_time = None
+        self.changes_applied = 0
+        self._lock = threading.Lock()
+
+    def on_snapshot(self, doc_snapshots, changes, read_time):
+        """Callback para Query.on_snapshot: aplica los cambios del snapshot"""
+        for change in changes:
+            order_id = change.document.id
+            if change.type.name == 'REMOVED':
+                self.apply('REMOVED', order_id)
+            else:
+                self.apply(change.type.name, order_id, change.document.to_dict())
+
+        with self._lock:
+            self.last_read_time = read_time
+            if not self.ready:
+                self.ready = True
+                logger.info(f"👁️ Vista de pedidos abiertos lista: {len(self.orders)} pedidos")
+
+    def apply(self, change_type, order_id, data=None):
+        """Aplicar un cambio (ADDED, MODIFIED o REMOVED) a la vista"""
+        with self._lock:
+            was_open = self._remove(order_id)
+            if change_type != 'REMOVED' and data is not None:
+                order = dict(data)
+                order['id'] = order_id
+                if self._status_key(order) not in CLOSED_POS_STATUSES:
+                    self.orders[order_id] = order
+                    self.by_status.setdefault(self._status_key(order), {})[order_id] = order
+                    self.closed.pop(order_id, None)
+                else:
+                    self._record_closed(order_id, self._status_key(order), self._changed_at(order))
+            elif was_open:
+                # Firestore avisa REMOVED cuando el pedido deja de cumplir la query (se cerró)
+                self._record_closed(order_id, None, datetime.now())
+            self.changes_applied += 1
+
+    def _remove(self, order_id):
+        """Quitar un pedido de ambos índices (con el lock tomado). Devuelve True si estaba"""
+        order = self.orders.pop(order_id, None)
+        if order:
+            bucket = self.by_status.get(self._status_key(order), {})
+            bucket.pop(order_id, None)
+        return order is not None
+
+    def _record_closed(self, order_id, pos_status, changed_at):
+        """Recordar un pedido cerrado para el feed incremental (con el lock tomado)"""
+        self.closed.pop(order_id, None)
+        self.closed[order_id] = {'id': order_id, 'pos_status': pos_status, 'changed_at': changed_at or datetime.now()}
+        while len(self.closed) > CLOSED_HISTORY:
+            self.closed.popitem(last=False)
+
+    @staticmethod
+    def _status_key(order):
+        """pos_status como clave de índice (algunos pedidos antiguos no lo tienen)"""
+        status = order.get('pos_status', 'nuevo')
+        return status if isinstance(status, str) else str(status)
+
+    def get(self, order_id):
+        """Pedido abierto por ID (o None)"""
+        with self._lock:
+            order = self.orders.get(order_id)
+            return dict(order) if order else None
+
+    def by_pos_status(self, pos_status):
+        """Pedidos abiertos con un pos_status"""
+        with self._lock:
+            return [dict(order) for order in self.by_status.get(pos_status, {}).values()]
+
+    def all(self):
+        """Todos los pedidos abiertos"""
+        with self._lock:
+            return [dict(order) for order in self.orders.values()]
+
+    def changed_since(self, since):
+        """Pedidos abiertos creados o modificados después de `since` (datetime sin zona)"""
+        with self._lock:
+            return [dict(order) for order in self.orders.values()
+                    if (self._changed_at(order) or since) > since]
+
+    def closed_since(self, since):
+        """Pedidos cerrados (o quitados de la query) después de `since`: {'id', 'pos_status', 'changed_at'}"""
+        with self._lock:
+            return [dict(entry) for entry in self.closed.values() if entry['changed_at'] > since]
+
+    @staticmethod
+    def _changed_at(order):
+        """updated_at/created_at del pedido como datetime sin zona"""
+        for key in ('updated_at', 'created_at', 'timestamp'):
+            value = order.get(key)
+            if isinstance(value, datetime):
+                return value.replace(tzinfo=None)
+            if value:
+                try:
+                    return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+                except ValueError:
+                    continue
+        return None
+
+    def stats(self):
+        """Tamaño y estado de la vista"""
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'open_orders': len(self.orders),
+                'by_pos_status': {status: len(bucket) for status, bucket in self.by_status.items() if bucket},
+                'changes_applied': self.changes_applied,
+                'last_read_time': str(self.last_read_time) if self.last_read_time else None
+            }
+
+class LocalSnapshotStub:
+    """
+    Sustituto local de una Query de Firestore para pruebas sin conexión:
+    expone on_snapshot y permite agregar, modificar o quitar documentos a mano
+    """
+
+    class _Type:
+        def __init__(self, name):
+            self.name = name
+
+    class _Document:
+        def __init__(self, doc_id, data):
+            self.id = doc_id
+            self._data = data
+
+        def to_dict(self):
+            return dict(self._data) if self._data is not None else None
+
+    class _Change:
+        def __init__(self, change_type, doc_id, data):
+            self.type = LocalSnapshotStub._Type(change_type)
+            self.document = LocalSnapshotStub._Document(doc_id, data)
+
+    class _Watch:
+        def __init__(self, stub, callback):
+            self.stub = stub
+            self.callback = callback
+
+        def unsubscribe(self):
+            if self.callback in self.stub.callbacks:
+                self.stub.callbacks.remove(self.callback)
+
+    def __init__(self, documents=None):
+        self.documents = dict(documents or {})
+        self.callbacks = []
+
+    def on_snapshot(self, callback):
+        """Registrar el callback y entregar el snapshot inicial, como Firestore"""
+        self.callbacks.append(callback)
+        changes = [self._Change('ADDED', doc_id, data) for doc_id, data in self.documents.items()]
+        callback(list(self.documents), changes, 'stub')
+        return self._Watch(self, callback)
+
+    def _emit(self, change_type, doc_id, data):
+        for callback in list(self.callbacks):
+            callback(list(self.documents), [self._Change(change_type, doc_id, data)], 'stub')
+
+    def add(self, doc_id, data):
+        self.documents[doc_id] = data
+        self._emit('ADDED', doc_id, data)
+
+    def modify(self, doc_id, data):
+        self.documents[doc_id] = data
+        self._emit('MODIFIED', doc_id, data)
+
+    def remove(self, doc_id):
+        data = self.documents.pop(doc_id, None)
+        self._emit('REMOVED', doc_id, data)
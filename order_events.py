@@ -0,0 +1,66 @@
+# Canal de eventos de pedidos para Caffe & Miga
+# Publica pedidos creados y cambios de estado para el stream SSE del POS (/pos/events)
+
+import json
+import threading
+import time
+import logging
+from order_journal import order_journal
+
+logger = logging.getLogger(__name__)
+
+EVENTS_STREAM = 'events'
+
+class OrderEventBus:
+    def __init__(self, journal, poll_interval=1.0):
+        """
+        Bus de eventos respaldado por el diario compartido, para que un cliente SSE
+        conectado a cualquier worker reciba los eventos publicados por los demás
+
+        Args:
+            journal: OrderJournal donde se guardan los eventos (el seq es el ID del evento)
+            poll_interval: Segundos entre revisiones del diario mientras se espera
+        """
+        self.journal = journal
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+
+    def publish(self, event_type, data):
+        """Publicar un evento y despertar a los suscriptores de este proceso"""
+        event_id = self.journal.append(EVENTS_STREAM, event_type, data)
+        with self._condition:
+            self._condition.notify_all()
+
+        logger.info(f"📣 Evento {event_type} publicado: {event_id}")
+        return event_id
+
+    def last_event_id(self):
+        """ID del evento más reciente (0 si no hay ninguno)"""
+        return self.journal.last_seq(EVENTS_STREAM)
+
+    def events_since(self, last_event_id):
+        """Eventos con ID mayor a `last_event_id` que siguen en el diario"""
+        return [
+            {'id': entry['seq'], 'type': entry['kind'], 'data': entry['payload']}
+            for entry in self.journal.read_since(EVENTS_STREAM, last_event_id)
+        ]
+
+    def wait_for_events(self, last_event_id, timeout=15):
+        """Esperar hasta `timeout` segundos a que haya eventos nuevos"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.events_since(last_event_id)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            # Despierta al instante si publica este proceso; los demás workers se ven en el siguiente sondeo
+            with self._condition:
+                self._condition.wait(min(self.poll_interval, remaining))
+
+def format_sse(event):
+    """Serializar un evento en formato text/event-stream"""
+    data = json.dumps(event['data'], ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+# Instancia global
+order_events = OrderEventBus(order_journal)
@@ -0,0 +1,79 @@
+# Generador de IDs de pedidos para Caffe & Miga
+# IDs tipo ULID: 48 bits de milisegundos + 80 bits aleatorios, en base32 de Crockford.
+# Son únicos entre procesos, ordenables por tiempo y sirven como cursor de sincronización
+# Formato: "{prefijo}_{ulid}", por ejemplo "efectivo_01J9Z3K8QW4X7M2N5P6R8S9T0V"
+
+import os
+import time
+import threading
+from datetime import datetime
+
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LARGO_ULID = 26
+MAX_ALEATORIO = (1 << 80) - 1
+
+class OrderIdGenerator:
+    def __init__(self):
+        """Generador monótono: dentro del mismo milisegundo incrementa la parte aleatoria"""
+        self._lock = threading.Lock()
+        self._ultimo_ms = -1
+        self._ultimo_aleatorio = 0
+
+    def new_ulid(self):
+        """Nuevo ULID de 26 caracteres, siempre mayor que el anterior de este proceso"""
+        with self._lock:
+            ms = int(time.time() * 1000)
+            if ms <= self._ultimo_ms:
+                # Mismo milisegundo (o reloj atrasado): seguir la secuencia en vez de retroceder
+                ms = self._ultimo_ms
+                aleatorio = self._ultimo_aleatorio + 1
+                if aleatorio > MAX_ALEATORIO:
+                    ms += 1
+                    aleatorio = int.from_bytes(os.urandom(10), 'big')
+            else:
+                aleatorio = int.from_bytes(os.urandom(10), 'big')
+
+            self._ultimo_ms = ms
+            self._ultimo_aleatorio = aleatorio
+
+        return _codificar((ms << 80) | aleatorio)
+
+    def new_order_id(self, prefix):
+        """Nuevo ID de pedido con prefijo de origen (efectivo, web, simple, basic, POS...)"""
+        return f"{prefix}_{self.new_ulid()}"
+
+def _codificar(valor):
+    """Entero de 128 bits a base32 de Crockford (26 caracteres)"""
+    caracteres = []
+    for _ in range(LARGO_ULID):
+        caracteres.append(ALFABETO[valor & 31])
+        valor >>= 5
+    return ''.join(reversed(caracteres))
+
+def order_id_key(order_id):
+    """Parte ULID del ID (ordenable entre prefijos distintos), o None si no es un ID generado aquí"""
+    if not order_id:
+        return None
+    ulid = str(order_id).rsplit('_', 1)[-1].upper()
+    if len(ulid) != LARGO_ULID or any(c not in ALFABETO for c in ulid) or ulid[0] > '7':
+        return None
+    return ulid
+
+def order_id_time(order_id):
+    """Momento de creación codificado en el ID (datetime local sin zona), o None si no aplica"""
+    ulid = order_id_key(order_id)
+    if not ulid:
+        return None
+    ms = 0
+    for c in ulid[:10]:
+        ms = ms * 32 + ALFABETO.index(c)
+    return datetime.fromtimestamp(ms / 1000)
+
+def min_order_id_key(moment):
+    """Menor ULID posible para un datetime: sirve para filtrar `WHERE clave >= ?`"""
+    ms = int(moment.timestamp() * 1000)
+    return _codificar(ms << 80)
+
+# Instancia global
+order_ids = OrderIdGenerator()
+new_order_id = order_ids.new_order_id
@@ -0,0 +1,97 @@
+# Diario compartido de pedidos para Caffe & Miga
+# Reemplaza la lista en memoria app.pending_orders por un archivo SQLite en modo WAL
+# que todos los workers (gunicorn/threads) pueden escribir y leer sin perder pedidos
+
+import json
+import os
+import logging
+from metrics import timed
+from sqlite_db import get_database
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class OrderJournal:
+    def __init__(self, db_path=None, max_entries=500):
+        """
+        Diario append-only y acotado, persistente entre reinicios
+
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto ORDER_JOURNAL_PATH u order_journal.db)
+            max_entries: Entradas que se conservan por stream; las más antiguas se descartan
+        """
+        self.db_path = db_path or os.getenv('ORDER_JOURNAL_PATH', 'order_journal.db')
+        self.max_entries = max_entries
+        self.db = get_database(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Crear la tabla del diario si no existe"""
+        with self.db.transaction() as conn:
+            # AUTOINCREMENT garantiza que un seq nunca se reutiliza, aunque se recorte el diario
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stream TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    order_id TEXT,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_stream_seq ON journal (stream, seq)')
+
+    @timed('sqlite')
+    def append(self, stream, kind, payload):
+        """Agregar una entrada y recortar el stream a `max_entries`. Devuelve el seq asignado"""
+        # La transacción toma el lock de escritura desde el inicio: sin carreras entre workers
+        with self.db.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO journal (stream, kind, order_id, payload, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                stream,
+                kind,
+                str(payload.get('id', '')) if isinstance(payload, dict) else None,
+                json.dumps(payload, ensure_ascii=False, default=str),
+                datetime.now().isoformat()
+            ))
+            seq = cursor.lastrowid
+            conn.execute('''
+                DELETE FROM journal
+                WHERE stream = ? AND seq <= (
+                    SELECT seq FROM journal WHERE stream = ?
+                    ORDER BY seq DESC LIMIT 1 OFFSET ?
+                )
+            ''', (stream, stream, self.max_entries))
+            return seq
+
+    def read_since(self, stream, after_seq=0, limit=500):
+        """Entradas del stream con seq mayor a `after_seq`, en orden"""
+        rows = self.db.query('''
+            SELECT seq, kind, payload FROM journal
+            WHERE stream = ? AND seq > ?
+            ORDER BY seq ASC
+            LIMIT ?
+        ''', (stream, after_seq, limit))
+
+        return [{'seq': row[0], 'kind': row[1], 'payload': json.loads(row[2])} for row in rows]
+
+    def recent(self, stream, limit=50):
+        """Últimos `limit` payloads del stream, del más antiguo al más reciente"""
+        rows = self.db.query('''
+            SELECT payload FROM journal
+            WHERE stream = ?
+            ORDER BY seq DESC
+            LIMIT ?
+        ''', (stream, limit))
+
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def last_seq(self, stream):
+        """Seq más reciente del stream (0 si está vacío)"""
+        row = self.db.query_one('SELECT MAX(seq) FROM journal WHERE stream = ?', (stream,))
+        return row[0] or 0
+
+# Instancia global
+order_journal = OrderJournal()
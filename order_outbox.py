@@ -0,0 +1,297 @@
+# Outbox de pedidos para Caffe & Miga (write-behind hacia Firestore)
+# El request guarda el pedido una sola vez en SQLite local y responde de inmediato;
+# un hilo de fondo lo empuja a Firestore en orden, con reintentos y backoff exponencial
+
+import json
+import os
+import time
+import threading
+import logging
+from metrics import timed
+from sqlite_db import get_database
+from order_ids import new_order_id
+
+logger = logging.getLogger(__name__)
+
+class OrderOutbox:
+    def __init__(self, db_path=None, base_delay=2, max_delay=300, lease_seconds=60, max_attempts=10):
+        """
+        Cola durable de pedidos pendientes de persistir en Firestore
+
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto ORDER_OUTBOX_PATH u order_outbox.db)
+            base_delay: Segundos de espera tras el primer fallo (se duplica en cada intento)
+            max_delay: Espera máxima entre reintentos
+            lease_seconds: Tiempo que un worker reserva la cabeza de la cola mientras la envía
+            max_attempts: Intentos antes de apartar la entrada como 'dead' para que no bloquee la cola
+        """
+        self.db_path = db_path or os.getenv('ORDER_OUTBOX_PATH', 'order_outbox.db')
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.remote_writer = None
+        self.local_writer = None
+        self.batch_writer = None
+        self.batch_size = 1
+        self.ejecutando = False
+        self.hilo = None
+        self._despertar = threading.Event()
+        self.db = get_database(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Crear la tabla del outbox si no existe"""
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    local_done INTEGER NOT NULL DEFAULT 0,
+                    remote_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    sent_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status_seq ON outbox (status, seq)')
+            # Claves de deduplicación (ej. el pago de Mercado Pago que originó el pedido): se
+            # insertan en la misma transacción que la entrada, en el mismo archivo
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbox_keys (
+                    key TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+
+    @timed('sqlite')
+    def enqueue(self, order_data, dedupe_key=None):
+        """
+        Guardar el pedido en el outbox (única escritura en el request). Devuelve su seq
+
+        Args:
+            order_data: Pedido a enviar
+            dedupe_key: Clave opcional; si ya se encoló un pedido con ella no se encola otro
+                y se devuelve None (la marca y la entrada se escriben en una sola transacción)
+        """
+        # El ID viaja en el payload: cada reintento escribe el mismo documento en Firestore
+        order_data.setdefault('id', new_order_id('web'))
+        now = time.time()
+        with self.db.transaction() as conn:
+            if dedupe_key is not None:
+                known = conn.execute('SELECT seq FROM outbox_keys WHERE key = ?', (str(dedupe_key),)).fetchone()
+                if known:
+                    logger.info(f"↩️ Pedido con clave {dedupe_key} ya estaba en el outbox (seq {known[0]})")
+                    return None
+
+            seq = conn.execute('''
+                INSERT INTO outbox (order_id, payload, created_at) VALUES (?, ?, ?)
+            ''', (
+                order_data.get('id'),
+                json.dumps(order_data, ensure_ascii=False, default=str),
+                now
+            )).lastrowid
+
+            if dedupe_key is not None:
+                conn.execute('INSERT INTO outbox_keys (key, seq, created_at) VALUES (?, ?, ?)',
+                             (str(dedupe_key), seq, now))
+
+        self._despertar.set()
+        logger.info(f"📥 Pedido {order_data.get('id', 'N/A')} en outbox (seq {seq})")
+        return seq
+
+    def start(self, remote_writer, local_writer=None, poll_interval=1.0, batch_writer=None, batch_size=500):
+        """
+        Iniciar el hilo que vacía el outbox
+
+        Args:
+            remote_writer: Función que guarda en Firestore; devuelve el ID o None si falló
+            local_writer: Función opcional para la copia local (SQLite del POS), se ejecuta primero
+            poll_interval: Segundos entre revisiones cuando la cola está vacía o en espera
+            batch_writer: Función opcional que guarda una lista de pedidos en un solo round trip;
+                devuelve un resultado {'id', 'success', 'error'} por pedido. Se usa para ponerse al día
+            batch_size: Máximo de entradas enviadas por batch
+        """
+        self.remote_writer = remote_writer
+        self.local_writer = local_writer
+        self.batch_writer = batch_writer
+        self.batch_size = batch_size
+        if self.ejecutando:
+            return
+
+        self.ejecutando = True
+        self.poll_interval = poll_interval
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        logger.info("🚚 Flusher del outbox iniciado")
+
+    def stop(self):
+        """Detener el hilo del flusher"""
+        self.ejecutando = False
+        self._despertar.set()
+        if self.hilo:
+            self.hilo.join(timeout=5)
+            self.hilo = None
+
+    def _bucle(self):
+        """Procesar la cola mientras haya trabajo; dormir cuando no"""
+        ultima_purga = 0
+        while self.ejecutando:
+            try:
+                if self.flush_once():
+                    continue
+                # Con la cola al día, limpiar cada hora las entradas ya enviadas
+                if time.time() - ultima_purga > 3600:
+                    self.purge_sent()
+                    ultima_purga = time.time()
+            except Exception as e:
+                logger.error(f"❌ Error en flusher del outbox: {e}")
+            self._despertar.wait(self.poll_interval)
+            self._despertar.clear()
+
+    def _claim_head(self, limit=1):
+        """
+        Reservar las entradas más antiguas que estén listas (hasta `limit`).
+        Respeta el orden: se corta en la primera que espera, y si la cabeza espera, todos esperan
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            rows = conn.execute('''
+                SELECT seq, payload, local_done, remote_id, attempts, next_attempt_at, leased_until
+                FROM outbox WHERE status = 'pending'
+                ORDER BY seq ASC LIMIT ?
+            ''', (limit,)).fetchall()
+
+            ready = []
+            for row in rows:
+                if row[5] > now or row[6] > now:
+                    break
+                ready.append(row)
+
+            conn.executemany('UPDATE outbox SET leased_until = ? WHERE seq = ?',
+                             [(now + self.lease_seconds, row[0]) for row in ready])
+            return ready
+
+    def _update(self, seq, **fields):
+        """Actualizar columnas de una entrada"""
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        self.db.execute(f"UPDATE outbox SET {columns} WHERE seq = ?", (*fields.values(), seq))
+
+    def flush_once(self):
+        """Intentar enviar la cabeza de la cola (o un batch si hay atraso). Devuelve True si procesó entradas"""
+        rows = self._claim_head(self.batch_size if self.batch_writer else 1)
+        if not rows:
+            return False
+
+        pending = []
+        for seq, payload, local_done, remote_id, attempts in (row[:5] for row in rows):
+            order_data = json.loads(payload)
+
+            # Copia local primero: el POS no depende de que Firestore responda
+            if not local_done and self.local_writer:
+                try:
+                    if self.local_writer(dict(order_data)):
+                        self._update(seq, local_done=1)
+                        local_done = 1
+                except Exception as e:
+                    logger.warning(f"⚠️ Copia local del pedido {order_data.get('id')} falló: {e}")
+            local_ok = bool(local_done) or not self.local_writer
+
+            if remote_id:
+                self._mark_delivered(seq, attempts, remote_id, local_ok)
+            else:
+                pending.append((seq, attempts, local_ok, order_data))
+
+        if len(pending) > 1:
+            results = self.batch_writer([dict(order_data) for *_, order_data in pending])
+            for (seq, attempts, local_ok, _), result in zip(pending, results):
+                if result.get('success') and result.get('id'):
+                    self._mark_delivered(seq, attempts, result['id'], local_ok)
+                else:
+                    self._mark_failed(seq, attempts, result.get('error') or "Firestore no confirmó el guardado")
+            return True
+
+        for seq, attempts, local_ok, order_data in pending:
+            try:
+                remote_id = self.remote_writer(dict(order_data))
+                if not remote_id:
+                    raise Exception("Firestore no confirmó el guardado")
+                self._mark_delivered(seq, attempts, remote_id, local_ok)
+            except Exception as e:
+                self._mark_failed(seq, attempts, e)
+
+        return True
+
+    def _mark_delivered(self, seq, attempts, remote_id, local_ok):
+        """
+        Firestore ya tiene el pedido: la entrada se cierra solo si la copia local también está.
+        Si no, queda pendiente con su remote_id y el reintento solo repite la copia local
+        """
+        if local_ok:
+            self._mark_sent(seq, remote_id)
+        else:
+            self._update(seq, remote_id=remote_id)
+            self._mark_failed(seq, attempts, "Copia local del pedido pendiente")
+
+    def _mark_sent(self, seq, remote_id):
+        """Marcar una entrada como enviada a Firestore"""
+        self._update(seq, status='sent', remote_id=remote_id, sent_at=time.time(),
+                     leased_until=0, last_error=None)
+        logger.info(f"✅ Outbox seq {seq} enviado a Firestore: {remote_id}")
+
+    def _mark_failed(self, seq, attempts, error):
+        """Programar el reintento de una entrada con backoff exponencial (o apartarla si agotó los intentos)"""
+        attempts += 1
+        if attempts >= self.max_attempts:
+            # Dead letter: la entrada queda con su último error y la cola sigue con las siguientes
+            self._update(seq, status='dead', attempts=attempts, leased_until=0, last_error=str(error))
+            logger.error(f"💀 Outbox seq {seq} apartado tras {attempts} intentos: {error}")
+            return
+        delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+        self._update(seq, attempts=attempts, next_attempt_at=time.time() + delay,
+                     leased_until=0, last_error=str(error))
+        logger.warning(f"⚠️ Outbox seq {seq} falló (intento {attempts}), reintento en {delay}s: {error}")
+
+    def purge_sent(self, older_than_seconds=86400, keys_older_than_seconds=30 * 86400):
+        """
+        Borrar entradas ya enviadas hace más de `older_than_seconds` y claves de deduplicación
+        más viejas que `keys_older_than_seconds` (Mercado Pago no reenvía pagos tan antiguos)
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM outbox_keys WHERE created_at < ?', (now - keys_older_than_seconds,))
+            return conn.execute('''
+                DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?
+            ''', (now - older_than_seconds,)).rowcount
+
+    def stats(self):
+        """Profundidad de la cola y retraso del pedido más antiguo sin enviar"""
+        depth, oldest = self.db.query_one('''
+            SELECT COUNT(*), MIN(created_at) FROM outbox WHERE status = 'pending'
+        ''')
+        head = self.db.query_one('''
+            SELECT seq, attempts, last_error FROM outbox WHERE status = 'pending'
+            ORDER BY seq ASC LIMIT 1
+        ''')
+        last_sent = self.db.query_one("SELECT MAX(sent_at) FROM outbox WHERE status = 'sent'")[0]
+        dead = self.db.query_one("SELECT COUNT(*) FROM outbox WHERE status = 'dead'")[0]
+
+        return {
+            'queue_depth': depth,
+            'lag_seconds': round(time.time() - oldest, 3) if oldest else 0,
+            'head_seq': head[0] if head else None,
+            'head_attempts': head[1] if head else 0,
+            'last_error': head[2] if head else None,
+            'last_sent_at': last_sent,
+            'dead_letters': dead,
+            'flusher_running': self.ejecutando
+        }
+
+# Instancia global
+order_outbox = OrderOutbox()
@@ -0,0 +1,492 @@
+# Esquema canónico de pedidos del POS para Caffe & Miga
+# Antes los pedidos vivían en varios archivos con esquemas distintos: pos_pedidos.db
+# (`items`/`estado` o `items_json`/`estado_pos`, según quién lo creara), caffeymiga_pedidos.db,
+# cafeteria.db y la tabla `pedidos` de ventas.db. Ahora hay un solo almacén (ORDERS_DB_PATH,
+# por defecto caffeymiga.db en la raíz del proyecto) con un esquema versionado:
+#
+#   - schema_version registra las migraciones aplicadas; migrate() (sqlite_db.py) aplica las que falten
+#   - QUERIES reúne las consultas de producción sobre el almacén; test_query_plans.py verifica
+#     que ninguna recorra la tabla completa
+#   - import_legacy() copia los pedidos de los archivos viejos (idempotente: INSERT OR IGNORE)
+#   - pedido_items tiene los items ya normalizados: un trigger expande `pedidos.items` (JSON) al
+#     insertar el pedido, sea quien sea el que escribe; las lecturas no vuelven a decodificar JSON
+#
+# Uso:
+#     db = get_orders_database()
+#     pendientes = db.query(QUERIES['pedidos_pendientes'])
+#     items = items_by_order(db.query(QUERIES['items_pedidos_pendientes']))
+#     resumen = db.query(QUERIES['pedidos_por_estado_pos_en_rango'], day_range())
+#
+# Por línea de comandos (migra e importa de nuevo los archivos viejos):
+#     python order_schema.py [archivo_legado.db ...]
+
+import json
+import os
+import sys
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from sqlite_db import get_database, schema_version, migrate, day_range
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Ruta fija respecto a la raíz: el POS Tk corre desde cafeteria_sistema/ y el backend desde la raíz
+ORDERS_DB_PATH = os.getenv('ORDERS_DB_PATH', os.path.join(PROJECT_ROOT, 'caffeymiga.db'))
+
+# Archivos que se importan (relativos a la raíz del proyecto)
+LEGACY_DATABASES = [
+    'pos_pedidos.db',
+    'cafeteria_sistema/pos_pedidos.db',
+    'caffeymiga_pedidos.db',
+    'cafeteria.db',
+    'cafeteria_sistema/cafeteria.db',
+    'ventas.db',
+    'cafeteria_sistema/ventas.db',
+]
+
+# Formato de fechas del almacén: hora local, ordenable como texto
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Expande `{pedido}.items` (lista JSON) en filas de pedido_items. Los nombres de campo de cada
+# origen (web: name/price, Firebase/Mercado Pago: title/unit_price, scripts: nombre/precio) se
+# resuelven aquí una sola vez; lo que no es una lista de objetos no genera items
+ITEMS_FROM_JSON = '''
+    INSERT INTO pedido_items
+        (pedido_id, posicion, datos, item_id, nombre, cantidad, precio_unitario, precio_total)
+    SELECT pedido_id, posicion, datos, item_id, nombre, cantidad, precio, cantidad * precio
+    FROM (
+        SELECT {pedido}.id AS pedido_id, j.key AS posicion, j.value AS datos,
+               CAST(COALESCE(json_extract(j.value, '$.id'), json_extract(j.value, '$.item_id')) AS TEXT) AS item_id,
+               CAST(COALESCE(json_extract(j.value, '$.name'), json_extract(j.value, '$.title'),
+                             json_extract(j.value, '$.nombre'), 'Producto') AS TEXT) AS nombre,
+               CAST(COALESCE(json_extract(j.value, '$.quantity'), json_extract(j.value, '$.cantidad'), 1) AS INTEGER) AS cantidad,
+               CAST(COALESCE(json_extract(j.value, '$.price'), json_extract(j.value, '$.precio'),
+                             json_extract(j.value, '$.unit_price'), 0) AS REAL) AS precio
+        FROM {desde}json_each(CASE WHEN NOT json_valid({pedido}.items) THEN '[]'
+                            WHEN json_type({pedido}.items) = 'array' THEN {pedido}.items
+                            ELSE '[]' END) AS j
+        WHERE j.type = 'object'
+    )
+'''
+
+def _rebuild_items(conn):
+    """Migración 3: items de los pedidos ya guardados, a partir de su JSON"""
+    # Los pedidos sin lista JSON de objetos no generan filas: conservan las que tuvieran
+    # (copiadas de pedido_items de archivos viejos)
+    conn.execute('''
+        DELETE FROM pedido_items WHERE pedido_id IN (
+            SELECT p.id FROM pedidos p, json_each(CASE WHEN NOT json_valid(p.items) THEN '[]'
+                                                       WHEN json_type(p.items) = 'array' THEN p.items
+                                                       ELSE '[]' END) AS j
+            WHERE j.type = 'object'
+        )
+    ''')
+    conn.execute(ITEMS_FROM_JSON.format(pedido='pedidos', desde='pedidos, '))
+
+# Migraciones en orden: (versión, descripción, sentencias). Nunca se editan las ya publicadas;
+# los cambios van en una versión nueva
+MIGRATIONS = [
+    (1, 'Tabla canónica de pedidos, items e historial de estados', [
+        '''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id TEXT PRIMARY KEY,
+            firebase_id TEXT UNIQUE,
+            origen TEXT NOT NULL DEFAULT 'web',
+            cliente_nombre TEXT NOT NULL DEFAULT '',
+            cliente_email TEXT,
+            cliente_telefono TEXT,
+            hora_recogida TEXT,
+            metodo_pago TEXT,
+            items TEXT NOT NULL DEFAULT '[]',
+            total REAL NOT NULL DEFAULT 0,
+            moneda TEXT NOT NULL DEFAULT 'MXN',
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            estado_pago TEXT NOT NULL DEFAULT 'pending',
+            estado_pos TEXT NOT NULL DEFAULT 'nuevo',
+            notas TEXT,
+            fecha_creacion TEXT NOT NULL,
+            fecha_actualizacion TEXT,
+            sincronizado INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pedido_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pedido_id TEXT NOT NULL REFERENCES pedidos (id),
+            item_id TEXT,
+            nombre TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario REAL NOT NULL,
+            precio_total REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS estado_historial (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pedido_id TEXT NOT NULL REFERENCES pedidos (id),
+            estado_anterior TEXT,
+            estado_nuevo TEXT NOT NULL,
+            fecha_cambio TEXT NOT NULL,
+            usuario TEXT
+        )
+        ''',
+        # Qué se importó de cada archivo viejo, para consultarlo después
+        '''
+        CREATE TABLE IF NOT EXISTS legacy_imports (
+            source TEXT NOT NULL,
+            tabla TEXT NOT NULL,
+            filas INTEGER NOT NULL,
+            importadas INTEGER NOT NULL,
+            imported_at TEXT NOT NULL,
+            PRIMARY KEY (source, tabla)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_pedidos_estado_fecha ON pedidos (estado, fecha_creacion)',
+        'CREATE INDEX IF NOT EXISTS idx_pedido_items_pedido ON pedido_items (pedido_id)',
+        'CREATE INDEX IF NOT EXISTS idx_estado_historial_pedido ON estado_historial (pedido_id)',
+    ]),
+    (2, 'Índices de pedidos activos y de estadísticas por rango de fechas', [
+        # Vista de cocina: índice parcial con solo los pedidos abiertos, ya en orden de llegada
+        '''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_activos ON pedidos (fecha_creacion)
+        WHERE estado_pos IN ('nuevo', 'preparando', 'listo')
+        ''',
+        # Estadísticas del día/semana: cubre estado_pos y total, no se lee la tabla
+        'CREATE INDEX IF NOT EXISTS idx_pedidos_fecha ON pedidos (fecha_creacion, estado_pos, total)',
+    ]),
+    (3, 'Items normalizados al entrar el pedido (trigger JSON1) y columnas generadas del item original', [
+        # Posición del item en el pedido y el item tal como llegó (objeto JSON), para lo que no se normaliza
+        'ALTER TABLE pedido_items ADD COLUMN posicion INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE pedido_items ADD COLUMN datos TEXT',
+        '''
+        ALTER TABLE pedido_items ADD COLUMN descripcion TEXT GENERATED ALWAYS AS (
+            COALESCE(json_extract(datos, '$.description'), json_extract(datos, '$.descripcion'))
+        ) VIRTUAL
+        ''',
+        '''
+        ALTER TABLE pedido_items ADD COLUMN categoria TEXT GENERATED ALWAYS AS (
+            COALESCE(json_extract(datos, '$.category_id'), json_extract(datos, '$.categoria'))
+        ) VIRTUAL
+        ''',
+        # Items en el orden del pedido sin ordenar aparte; reemplaza al índice de solo pedido_id
+        'DROP INDEX IF EXISTS idx_pedido_items_pedido',
+        'CREATE INDEX IF NOT EXISTS idx_pedido_items_pedido ON pedido_items (pedido_id, posicion)',
+        'CREATE INDEX IF NOT EXISTS idx_pedido_items_nombre ON pedido_items (nombre)',
+        _rebuild_items,
+        # Cualquier escritor de `pedidos` (backend, cliente POS, scripts viejos, INSERT OR REPLACE)
+        # deja los items normalizados en la misma transacción
+        f'''
+        CREATE TRIGGER IF NOT EXISTS pedidos_items_ai AFTER INSERT ON pedidos
+        BEGIN
+            DELETE FROM pedido_items WHERE pedido_id = NEW.id;
+            {ITEMS_FROM_JSON.format(pedido='NEW', desde='')};
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS pedidos_items_au AFTER UPDATE OF items ON pedidos
+        BEGIN
+            DELETE FROM pedido_items WHERE pedido_id = NEW.id;
+            {ITEMS_FROM_JSON.format(pedido='NEW', desde='')};
+        END
+        ''',
+    ]),
+]
+
+# Consultas de producción sobre el almacén. Los filtros por fecha son rangos [desde, hasta)
+# sobre fecha_creacion (ver day_range): date(fecha_creacion) = ... no puede usar índices
+QUERIES = {
+    'pedidos_pendientes': '''
+        SELECT id, cliente_nombre, cliente_telefono, hora_recogida,
+               total, estado, metodo_pago, fecha_creacion
+        FROM pedidos
+        WHERE estado = 'pendiente'
+        ORDER BY fecha_creacion ASC
+    ''',
+    # Items de todos los pendientes en una consulta, en el mismo orden (ver items_by_order)
+    'items_pedidos_pendientes': '''
+        SELECT i.pedido_id, i.nombre, i.cantidad, i.precio_unitario, i.descripcion
+        FROM pedidos p JOIN pedido_items i ON i.pedido_id = p.id
+        WHERE p.estado = 'pendiente'
+        ORDER BY p.fecha_creacion ASC, i.posicion ASC
+    ''',
+    'pedidos_pendientes_recientes': '''
+        SELECT id, cliente_nombre, total, metodo_pago, estado
+        FROM pedidos
+        WHERE estado = 'pendiente'
+        ORDER BY fecha_creacion DESC
+        LIMIT ?
+    ''',
+    'pedidos_activos': '''
+        SELECT id, firebase_id, cliente_nombre, cliente_telefono, total,
+               estado_pos, fecha_creacion
+        FROM pedidos
+        WHERE estado_pos IN ('nuevo', 'preparando', 'listo')
+        ORDER BY fecha_creacion ASC
+    ''',
+    'items_pedidos_activos': '''
+        SELECT i.pedido_id, i.nombre, i.cantidad, i.precio_unitario, i.descripcion
+        FROM pedidos p JOIN pedido_items i ON i.pedido_id = p.id
+        WHERE p.estado_pos IN ('nuevo', 'preparando', 'listo')
+        ORDER BY p.fecha_creacion ASC, i.posicion ASC
+    ''',
+    'items_de_pedido': '''
+        SELECT pedido_id, nombre, cantidad, precio_unitario, descripcion
+        FROM pedido_items
+        WHERE pedido_id = ?
+        ORDER BY posicion
+    ''',
+    'contar_por_estado': 'SELECT COUNT(*) FROM pedidos WHERE estado = ?',
+    'contar_pedidos': 'SELECT COUNT(*) FROM pedidos',
+    'pedido_por_firebase_id': 'SELECT id FROM pedidos WHERE firebase_id = ?',
+    'estado_pedido': 'SELECT estado_pos, firebase_id FROM pedidos WHERE id = ?',
+    'pedidos_por_estado_pos_en_rango': '''
+        SELECT estado_pos, COUNT(*)
+        FROM pedidos
+        WHERE fecha_creacion >= ? AND fecha_creacion < ?
+        GROUP BY estado_pos
+    ''',
+    'totales_en_rango': '''
+        SELECT COUNT(*), COALESCE(SUM(total), 0)
+        FROM pedidos
+        WHERE fecha_creacion >= ? AND fecha_creacion < ?
+    ''',
+    # Reporte por producto: unidades e importe de los pedidos no cancelados del rango
+    'productos_en_rango': '''
+        SELECT i.nombre, SUM(i.cantidad), SUM(i.precio_total)
+        FROM pedidos p JOIN pedido_items i ON i.pedido_id = p.id
+        WHERE p.fecha_creacion >= ? AND p.fecha_creacion < ? AND p.estado_pos != 'cancelado'
+        GROUP BY i.nombre
+        ORDER BY i.nombre
+    ''',
+    'actualizar_estado': 'UPDATE pedidos SET estado = ?, fecha_actualizacion = ? WHERE id = ?',
+    'actualizar_estado_pos': 'UPDATE pedidos SET estado_pos = ?, fecha_actualizacion = ? WHERE id = ?',
+}
+
+def items_by_order(rows):
+    """
+    Filas de items_* (pedido_id, nombre, cantidad, precio_unitario, descripcion) -> {pedido_id: [item]}
+    Cada item es {'nombre', 'cantidad', 'precio', 'descripcion'}, ya normalizado al guardar el pedido
+    """
+    items = {}
+    for pedido_id, nombre, cantidad, precio, descripcion in rows:
+        items.setdefault(pedido_id, []).append({
+            'nombre': nombre, 'cantidad': cantidad, 'precio': precio, 'descripcion': descripcion or ''
+        })
+    return items
+
+def now_timestamp():
+    """Fecha y hora actual en el formato del almacén"""
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def normalize_timestamp(value):
+    """ISO 8601 (con 'T', microsegundos o zona horaria) -> formato del almacén en hora local"""
+    if not value:
+        return now_timestamp()
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return str(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+# Columna canónica -> nombres posibles en los esquemas viejos (el primero que exista gana)
+LEGACY_COLUMNS = {
+    'firebase_id': ('firebase_id', 'id_web'),
+    'origen': ('origen',),
+    'cliente_nombre': ('cliente_nombre', 'cliente', 'nombre_cliente'),
+    'cliente_email': ('cliente_email', 'email', 'correo'),
+    'cliente_telefono': ('cliente_telefono', 'telefono'),
+    'hora_recogida': ('hora_recogida',),
+    'metodo_pago': ('metodo_pago', 'pago'),
+    'items': ('items_json', 'items', 'productos', 'detalle'),
+    'total': ('total',),
+    'moneda': ('moneda',),
+    'estado': ('estado',),
+    'estado_pago': ('estado_pago',),
+    'estado_pos': ('estado_pos',),
+    'notas': ('notas', 'observaciones'),
+    'fecha_creacion': ('fecha_creacion', 'fecha'),
+    'fecha_actualizacion': ('fecha_actualizacion',),
+}
+
+# CafeteriaSystemIntegration guardaba 'Nuevo' en la columna de estado de su tabla
+LEGACY_ESTADOS = {'nuevo': 'pendiente', 'pending': 'pendiente'}
+
+def _legacy_items(value):
+    """items como lista JSON; el texto libre de cafeteria.db ("2x Café ($30) | ...") queda en un solo item"""
+    if not value:
+        return '[]'
+    try:
+        items = json.loads(value)
+        if isinstance(items, list):
+            return json.dumps(items, ensure_ascii=False)
+    except (TypeError, ValueError):
+        pass
+    return json.dumps([{'name': str(value), 'quantity': 1, 'price': 0}], ensure_ascii=False)
+
+def _canonical_row(row, columns, prefix):
+    """Fila de un esquema viejo (dict) -> columnas canónicas"""
+    pedido = {}
+    for canonical, candidates in LEGACY_COLUMNS.items():
+        column = next((name for name in candidates if name in columns), None)
+        if column is not None and row[column] not in (None, ''):
+            pedido[canonical] = row[column]
+
+    # Los IDs enteros (AUTOINCREMENT) se repiten entre archivos: se prefijan con el nombre del archivo
+    legacy_id = row['id'] if 'id' in columns else row['_rowid']
+    if isinstance(legacy_id, int) or str(legacy_id).isdigit():
+        legacy_id = f"{prefix}-{legacy_id}"
+    pedido['id'] = str(legacy_id)
+
+    pedido['items'] = _legacy_items(pedido.get('items'))
+    pedido['fecha_creacion'] = normalize_timestamp(pedido.get('fecha_creacion'))
+    if pedido.get('fecha_actualizacion'):
+        pedido['fecha_actualizacion'] = normalize_timestamp(pedido['fecha_actualizacion'])
+
+    # Cada esquema viejo guardaba solo uno de los dos estados: el otro se deduce
+    estado = str(pedido.get('estado', '')).lower()
+    estado = LEGACY_ESTADOS.get(estado, estado)
+    estado_pos = str(pedido.get('estado_pos', '')).lower()
+    if not estado:
+        estado = {'entregado': 'completado', 'cancelado': 'cancelado'}.get(estado_pos, 'pendiente')
+    if not estado_pos:
+        estado_pos = 'entregado' if estado in ('completado', 'procesado') else 'nuevo'
+    pedido['estado'], pedido['estado_pos'] = estado, estado_pos
+    return pedido
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _legacy_tables(conn):
+    """Tablas de pedidos de un archivo viejo: `pedidos` y las que tienen id_web (CafeteriaSystemIntegration)"""
+    tables = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        columns = [info[1] for info in conn.execute(f'PRAGMA table_info("{name}")')]
+        if name == 'pedidos' or 'id_web' in columns:
+            tables[name] = columns
+    return tables
+
+def import_legacy(db, paths=None):
+    """
+    Copiar al almacén los pedidos de los archivos viejos. Se puede repetir sin duplicar:
+    los pedidos ya importados (mismo id o firebase_id) se ignoran
+
+    Args:
+        db: SQLiteDatabase del almacén canónico (ya migrada)
+        paths: Archivos a importar (por defecto LEGACY_DATABASES que existan)
+
+    Returns:
+        {archivo: pedidos nuevos importados}
+    """
+    if paths is None:
+        paths = [os.path.join(PROJECT_ROOT, path) for path in LEGACY_DATABASES]
+    target = os.path.abspath(db.path)
+
+    summary = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        if path == target or not os.path.exists(path):
+            continue
+
+        # Solo lectura: los archivos viejos no se tocan (ni se pasan a WAL)
+        legacy = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        legacy.row_factory = sqlite3.Row
+        prefix = os.path.relpath(path, PROJECT_ROOT)
+        if prefix.startswith(os.pardir):
+            prefix = os.path.basename(path)
+        prefix = os.path.splitext(prefix)[0].replace(os.sep, '_')
+        try:
+            tables = _legacy_tables(legacy)
+            has_items = _has_table(legacy, 'pedido_items')
+            has_history = _has_table(legacy, 'estado_historial')
+
+            imported = 0
+            for table, columns in tables.items():
+                rows = legacy.execute(f'SELECT rowid AS _rowid, * FROM "{table}"').fetchall()
+                table_imported = 0
+                with db.transaction() as conn:
+                    for row in rows:
+                        pedido = _canonical_row(row, columns, prefix)
+                        names = ', '.join(pedido)
+                        placeholders = ', '.join('?' for _ in pedido)
+                        cursor = conn.execute(f'INSERT OR IGNORE INTO pedidos ({names}) VALUES ({placeholders})',
+                                              tuple(pedido.values()))
+                        if cursor.rowcount != 1:
+                            continue
+                        table_imported += 1
+
+                        # Items e historial solo del pedido recién insertado: así no se duplican.
+                        # El trigger ya expandió los items del JSON; los de pedido_items viejos
+                        # solo se copian si el JSON no traía ninguno
+                        if table == 'pedidos' and 'id' in columns:
+                            if has_items and not conn.execute(QUERIES['items_de_pedido'], (pedido['id'],)).fetchone():
+                                conn.executemany('''
+                                    INSERT INTO pedido_items
+                                    (pedido_id, item_id, nombre, cantidad, precio_unitario, precio_total)
+                                    VALUES (?, ?, ?, ?, ?, ?)
+                                ''', [(pedido['id'], *item) for item in legacy.execute('''
+                                    SELECT item_id, nombre, cantidad, precio_unitario, precio_total
+                                    FROM pedido_items WHERE pedido_id = ?
+                                ''', (row['id'],))])
+                            if has_history:
+                                conn.executemany('''
+                                    INSERT INTO estado_historial
+                                    (pedido_id, estado_anterior, estado_nuevo, fecha_cambio, usuario)
+                                    VALUES (?, ?, ?, ?, ?)
+                                ''', [(pedido['id'], *change) for change in legacy.execute('''
+                                    SELECT estado_anterior, estado_nuevo, fecha_cambio, usuario
+                                    FROM estado_historial WHERE pedido_id = ?
+                                ''', (row['id'],))])
+
+                    conn.execute('''
+                        INSERT INTO legacy_imports (source, tabla, filas, importadas, imported_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(source, tabla) DO UPDATE SET
+                            filas = excluded.filas,
+                            importadas = importadas + excluded.importadas,
+                            imported_at = excluded.imported_at
+                    ''', (path, table, len(rows), table_imported, now_timestamp()))
+                imported += table_imported
+        except sqlite3.Error as e:
+            logger.error(f"❌ No se pudo importar {path}: {e}")
+            continue
+        finally:
+            legacy.close()
+
+        summary[path] = imported
+        logger.info(f"📦 {imported} pedidos importados de {path}")
+    return summary
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+def get_orders_database(path=None):
+    """
+    SQLiteDatabase del almacén canónico, con el esquema al día.
+    La primera vez que se crea el archivo también importa los archivos viejos
+    """
+    db = get_database(path or ORDERS_DB_PATH)
+    if db.path in _ready:
+        return db
+
+    with _ready_lock:
+        if db.path not in _ready:
+            fresh = schema_version(db) == 0
+            migrate(db, MIGRATIONS)
+            if fresh and path is None:
+                import_legacy(db)
+            _ready.add(db.path)
+    return db
+
+if __name__ == '__main__':
+    from logging_setup import configure_logging
+    configure_logging()
+    db = get_orders_database()
+    summary = import_legacy(db, sys.argv[1:] or None)
+    print(f"🗄️ {db.path}: esquema v{schema_version(db)}")
+    for source, imported in summary.items():
+        print(f"   {source}: {imported} pedidos nuevos")
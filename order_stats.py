@@ -0,0 +1,222 @@
+# Estadísticas de pedidos para Caffe & Miga
+# Contadores diarios por pos_status y payment_status, actualizados en cada alta y cambio
+# de estado, para que /pos/stats no tenga que recorrer los pedidos de Firestore
+
+import os
+import logging
+from metrics import timed
+from sqlite_db import get_database
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+POS_STATUSES = ['nuevo', 'preparando', 'listo', 'entregado', 'cancelado']
+
+class OrderStats:
+    def __init__(self, db_path=None):
+        """
+        Contadores durables en SQLite (WAL), compartidos por todos los workers
+
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto ORDER_STATS_PATH u order_stats.db)
+        """
+        self.db_path = db_path or os.getenv('ORDER_STATS_PATH', 'order_stats.db')
+        self.db = get_database(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Crear las tablas de contadores si no existen"""
+        with self.db.transaction() as conn:
+            # Estado actual de cada pedido, para saber qué contador restar al cambiar
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS order_state (
+                    order_id TEXT PRIMARY KEY,
+                    day TEXT NOT NULL,
+                    pos_status TEXT NOT NULL,
+                    payment_status TEXT NOT NULL,
+                    total REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            # Otras referencias de un pedido (external_reference, preference_id, ID del pedido del
+            # webhook): los pagos de Mercado Pago solo traen la external_reference
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS order_refs (
+                    ref TEXT PRIMARY KEY,
+                    order_id TEXT NOT NULL
+                )
+            ''')
+            # Un contador por día y dimensión: ('pos_status', 'listo'), ('payment_status', 'approved')...
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS daily_counts (
+                    day TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    orders INTEGER NOT NULL DEFAULT 0,
+                    revenue REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, dimension, value)
+                )
+            ''')
+            # Días cuyos pedidos anteriores a los contadores ya se cargaron desde Firestore
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS backfilled_days (
+                    day TEXT PRIMARY KEY,
+                    orders INTEGER NOT NULL,
+                    done_at TEXT NOT NULL
+                )
+            ''')
+
+    def _bump(self, conn, day, dimension, value, orders, revenue):
+        """Sumar (o restar) a un contador diario"""
+        conn.execute('''
+            INSERT INTO daily_counts (day, dimension, value, orders, revenue)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day, dimension, value) DO UPDATE SET
+                orders = orders + excluded.orders,
+                revenue = revenue + excluded.revenue
+        ''', (day, dimension, value, orders, revenue))
+
+    @timed('sqlite')
+    def record_order(self, order_data, day=None):
+        """
+        Contar un pedido nuevo (en el día `day`, hoy por defecto). Un mismo ID solo se cuenta
+        una vez, y un pedido cuya external_reference o preference_id ya se contó (el que crea
+        el webhook para un pago de una preferencia) solo actualiza los estados del primero
+        """
+        order_id = order_data.get('id') or order_data.get('preference_id')
+        pos_status = order_data.get('pos_status', 'nuevo')
+        payment_status = order_data.get('payment_status', 'pending')
+        total = order_data.get('total', 0) or 0
+        day = (day or date.today()).isoformat()
+        refs = {str(ref) for ref in (order_data.get('external_reference'), order_data.get('preference_id'))
+                if ref} - {str(order_id)}
+
+        with self.db.transaction() as conn:
+            if order_id and refs:
+                known = conn.execute(f'''
+                    SELECT order_id FROM order_refs WHERE ref IN ({', '.join('?' for _ in refs)})
+                ''', tuple(refs)).fetchone()
+                if known and known[0] != str(order_id):
+                    conn.execute('INSERT OR IGNORE INTO order_refs (ref, order_id) VALUES (?, ?)',
+                                 (str(order_id), known[0]))
+                    self._change(conn, known[0], pos_status, payment_status)
+                    return False
+
+            if order_id:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO order_state (order_id, day, pos_status, payment_status, total)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (str(order_id), day, pos_status, payment_status, total))
+                if cursor.rowcount == 0:
+                    return False
+                conn.executemany('INSERT OR IGNORE INTO order_refs (ref, order_id) VALUES (?, ?)',
+                                 [(ref, str(order_id)) for ref in refs])
+
+            self._bump(conn, day, 'all', 'all', 1, total)
+            self._bump(conn, day, 'pos_status', pos_status, 1, total)
+            self._bump(conn, day, 'payment_status', payment_status, 1, total)
+            return True
+
+    def is_backfilled(self, day=None):
+        """True si los pedidos de `day` (hoy por defecto) ya se cargaron con backfill()"""
+        day = (day or date.today()).isoformat()
+        return self.db.query_one('SELECT 1 FROM backfilled_days WHERE day = ?', (day,)) is not None
+
+    @timed('sqlite')
+    def backfill(self, orders, day=None):
+        """
+        Contar los pedidos de `day` que ya existían cuando los contadores empezaron a llenarse
+        (deploy con order_stats.db nuevo) y marcar el día como cargado. Es idempotente:
+        record_order salta los pedidos que ya se contaron al crearse
+
+        Returns:
+            Cantidad de pedidos agregados a los contadores
+        """
+        day = day or date.today()
+        with self.db.transaction() as conn:
+            added = sum(1 for order_data in orders if self.record_order(order_data, day))
+            conn.execute('''
+                INSERT OR REPLACE INTO backfilled_days (day, orders, done_at) VALUES (?, ?, ?)
+            ''', (day.isoformat(), added, datetime.now().isoformat()))
+        return added
+
+    @timed('sqlite')
+    def record_status_change(self, order_id, pos_status=None, payment_status=None):
+        """
+        Mover el pedido de contador al cambiar su estado (en el día en que se creó).
+        `order_id` puede ser también una de sus referencias (external_reference de un pago)
+        """
+        with self.db.transaction() as conn:
+            return self._change(conn, str(order_id), pos_status, payment_status)
+
+    def _change(self, conn, order_id, pos_status, payment_status):
+        """Aplicar un cambio de estado dentro de la transacción"""
+        row = conn.execute('''
+            SELECT order_id, day, pos_status, payment_status, total FROM order_state
+            WHERE order_id = ? OR order_id = (SELECT order_id FROM order_refs WHERE ref = ?)
+        ''', (order_id, order_id)).fetchone()
+        if not row:
+            logger.info(f"📊 Pedido {order_id} sin registro en estadísticas, cambio ignorado")
+            return False
+
+        order_id, day, old_pos, old_payment, total = row
+        for dimension, old, new in (('pos_status', old_pos, pos_status),
+                                    ('payment_status', old_payment, payment_status)):
+            if new and new != old:
+                self._bump(conn, day, dimension, old, -1, -total)
+                self._bump(conn, day, dimension, new, 1, total)
+
+        conn.execute('''
+            UPDATE order_state SET pos_status = ?, payment_status = ? WHERE order_id = ?
+        ''', (pos_status or old_pos, payment_status or old_payment, order_id))
+        return True
+
+    def summary(self, start=None, end=None):
+        """
+        Estadísticas agregadas de los buckets diarios entre `start` y `end` (fechas incluidas)
+
+        Args:
+            start: date inicial (None = desde el primer día registrado)
+            end: date final (None = hasta hoy)
+        """
+        today = date.today().isoformat()
+        rows = self.db.query('''
+            SELECT dimension, value, SUM(orders), SUM(revenue) FROM daily_counts
+            WHERE day >= ? AND day <= ?
+            GROUP BY dimension, value
+        ''', (start.isoformat() if start else '', end.isoformat() if end else '9999-12-31'))
+        orders_today = self.db.query_one('''
+            SELECT orders FROM daily_counts WHERE day = ? AND dimension = 'all'
+        ''', (today,))
+
+        stats = {
+            'total_orders': 0,
+            'pending_orders': 0,
+            'completed_orders': 0,
+            'total_revenue': 0,
+            'orders_by_status': {status: 0 for status in POS_STATUSES},
+            'orders_by_payment_status': {},
+            'orders_today': orders_today[0] if orders_today else 0
+        }
+
+        for dimension, value, orders, revenue in rows:
+            if dimension == 'all':
+                stats['total_orders'] = orders
+            elif dimension == 'pos_status':
+                stats['orders_by_status'][value] = orders
+            elif dimension == 'payment_status':
+                stats['orders_by_payment_status'][value] = orders
+                if value == 'approved':
+                    stats['completed_orders'] = orders
+                    stats['total_revenue'] = revenue
+
+        stats['pending_orders'] = stats['total_orders'] - stats['completed_orders']
+        return stats
+
+def parse_stats_date(value):
+    """Convertir un parámetro YYYY-MM-DD (o ISO 8601) en date; None si viene vacío"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).date()
+
+# Instancia global
+order_stats = OrderStats()
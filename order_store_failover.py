@@ -0,0 +1,280 @@
+# Failover de Firestore al almacén local para Caffe & Miga
+# Envuelve a FirebaseManager: mientras su circuito está abierto (o una llamada falla) las
+# escrituras van directo a LocalOrderStore y las lecturas se sirven desde ahí. Un hilo de fondo
+# hace la llamada de prueba (medio abierto) y, al cerrarse el circuito, reconcilia lo escrito
+# localmente con Firestore
+#
+# Se activa por defecto con ORDER_STORE=firestore; FIRESTORE_FAILOVER=false lo desactiva
+
+import os
+import threading
+import logging
+from datetime import datetime
+from circuit_breaker import CLOSED
+from local_order_store import payment_fields, status_fields
+
+logger = logging.getLogger(__name__)
+
+class FailoverOrderStore:
+    def __init__(self, primary, fallback, probe_interval=5.0):
+        """
+        Args:
+            primary: FirebaseManager (con su CircuitBreaker en `breaker`)
+            fallback: LocalOrderStore donde se escribe mientras Firestore no responde
+            probe_interval: Segundos entre revisiones del hilo de fondo (prueba y reconciliación)
+        """
+        self.primary = primary
+        self.fallback = fallback
+        # Los cambios a pedidos que solo están en Firestore se guardan para aplicarlos después
+        self.fallback.defer_missing_updates = True
+        self.probe_interval = probe_interval
+        self.failovers = 0
+        self.last_failover = None
+        self.last_reconcile = None
+        # Hay datos locales por reconciliar (o quedaron de una ejecución anterior)
+        self._local_pending = os.path.exists(fallback.db_path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor_thread = None
+
+    def __getattr__(self, name):
+        # db, ready, open_orders, warm_up, ping, etc. son los de Firestore
+        return getattr(self.primary, name)
+
+    @property
+    def breaker(self):
+        return self.primary.breaker
+
+    @property
+    def degraded(self):
+        """True mientras el circuito de Firestore no está cerrado"""
+        return self.breaker.state != CLOSED
+
+    def _failover(self, operation):
+        """Registrar que una operación se desvió al almacén local"""
+        with self._lock:
+            self.failovers += 1
+            self.last_failover = datetime.now()
+            first = not self._local_pending
+            self._local_pending = True
+        if first:
+            logger.warning(f"💾 Firestore no disponible ({operation}): usando el almacén local de pedidos")
+            self.fallback.start_open_orders_listener()
+
+    # --- Escrituras ---
+
+    def save_order(self, order_data):
+        """Guardar en Firestore; si el circuito está abierto o falla, en el almacén local"""
+        if not self.breaker.is_open:
+            order_id = self.primary.save_order(order_data)
+            if order_id:
+                return order_id
+        self._failover('save_order')
+        return self.fallback.save_order(order_data)
+
+    def save_orders_batch(self, orders):
+        """Guardar varios pedidos; los que Firestore no aceptó van al almacén local"""
+        if self.breaker.is_open:
+            self._failover('save_orders_batch')
+            return self.fallback.save_orders_batch(orders)
+
+        results = self.primary.save_orders_batch(orders)
+        failed = [i for i, result in enumerate(results) if not result['success']]
+        if failed:
+            self._failover('save_orders_batch')
+            for i, result in zip(failed, self.fallback.save_orders_batch([orders[i] for i in failed])):
+                results[i] = result
+        return results
+
+    def _use_fallback_for(self, order_id):
+        """
+        Tras una actualización fallida en Firestore: ir al almacén local si Firestore no
+        responde o si el pedido se escribió localmente; si no, el pedido simplemente no existe
+        """
+        return self.degraded or (self._local_pending and self.fallback.has_order(order_id))
+
+    def _update(self, operation, order_id, value, fields):
+        """Actualizar en Firestore o, si no se puede, en el almacén local (o diferido)"""
+        if not self.breaker.is_open and getattr(self.primary, operation)(order_id, value):
+            return True
+        if not self._use_fallback_for(order_id):
+            return False
+        self._failover(operation)
+        if not getattr(self.fallback, operation)(order_id, value):
+            return False
+        self._patch_primary_view([(order_id, fields(value))])
+        return True
+
+    def _update_batch(self, operation, updates, fields):
+        if self.breaker.is_open:
+            results = [{'id': order_id, 'success': False, 'error': None} for order_id, _ in updates]
+        else:
+            results = getattr(self.primary, operation)(updates)
+
+        failed = [i for i, result in enumerate(results)
+                  if not result['success'] and self._use_fallback_for(updates[i][0])]
+        if failed:
+            self._failover(operation)
+            retry = [updates[i] for i in failed]
+            for i, result in zip(failed, getattr(self.fallback, operation)(retry)):
+                results[i] = result
+            self._patch_primary_view([(order_id, fields(value)) for order_id, value in retry])
+        return results
+
+    def _patch_primary_view(self, updates):
+        """
+        Reflejar en la vista de Firestore los cambios diferidos: su listener no los verá
+        hasta la reconciliación, pero el POS debe ver el nuevo estado ya
+        """
+        for order_id, update_data in updates:
+            order = self.primary.open_orders.get(order_id)
+            if order:
+                order.pop('id')
+                order.update(update_data)
+                self.primary.open_orders.apply('MODIFIED', order_id, order)
+
+    def update_payment_status(self, order_id, payment_data):
+        """Actualizar estado del pago"""
+        return self._update('update_payment_status', order_id, payment_data, payment_fields)
+
+    def update_order_status(self, order_id, new_status):
+        """Actualizar estado del pedido desde el POS"""
+        return self._update('update_order_status', order_id, new_status, status_fields)
+
+    def update_order_statuses_batch(self, updates):
+        """Cambiar el pos_status de varios pedidos: updates = [(order_id, nuevo_estado)]"""
+        return self._update_batch('update_order_statuses_batch', updates, status_fields)
+
+    # --- Lecturas ---
+
+    def _read(self, operation, *args, **kwargs):
+        """
+        Leer de Firestore; si el circuito está abierto o la lectura falla se lee del almacén
+        local. FirebaseManager lanza la excepción (raise_errors) en vez de devolver []: una
+        lectura lenta pero exitosa, o una falla de otro hilo, no descartan el resultado
+        """
+        if not self.breaker.is_open:
+            # query_orders siempre lanza; las demás lecturas devuelven [] salvo con raise_errors
+            primary_kwargs = kwargs if operation == 'query_orders' else dict(kwargs, raise_errors=True)
+            try:
+                return getattr(self.primary, operation)(*args, **primary_kwargs), True
+            except Exception as e:
+                logger.warning(f"⚠️ Lectura {operation} de Firestore falló: {e}")
+        self._failover(operation)
+        return getattr(self.fallback, operation)(*args, **kwargs), False
+
+    def _read_list(self, operation, *args, **kwargs):
+        """Lectura de lista: con datos locales sin reconciliar se agregan los del almacén local"""
+        orders, from_primary = self._read(operation, *args, **kwargs)
+        if from_primary and self._local_pending:
+            known = {order.get('id') for order in orders}
+            orders = orders + [order for order in getattr(self.fallback, operation)(*args, **kwargs)
+                               if order.get('id') not in known]
+        return orders
+
+    def get_pending_orders(self):
+        """Obtener pedidos pendientes para el POS"""
+        return self._read_list('get_pending_orders')
+
+    def get_all_orders(self):
+        """Obtener todos los pedidos"""
+        return self._read_list('get_all_orders')
+
+    def get_orders_changed_since(self, since, limit=50):
+        """Pedidos creados o modificados después de `since`"""
+        return self._read_list('get_orders_changed_since', since, limit=limit)
+
+    def get_orders_by_status(self, payment_status, limit=100):
+        """Pedidos por estado de pago"""
+        return self._read_list('get_orders_by_status', payment_status, limit=limit)
+
+    def query_orders(self, *args, **kwargs):
+        """Consulta paginada (de un solo almacén: los tokens de página no se mezclan)"""
+        return self._read('query_orders', *args, **kwargs)[0]
+
+    def get_open_orders(self, since=None):
+        """Pedidos abiertos de la vista de Firestore más los escritos localmente sin reconciliar"""
+        return self._read_list('get_open_orders', since)
+
+    def get_closed_orders(self, since):
+        """Pedidos cerrados de la vista de Firestore y de la local mientras haya datos sin reconciliar"""
+        closed = self.primary.get_closed_orders(since)
+        if self._local_pending:
+            known = {entry['id'] for entry in closed}
+            closed += [entry for entry in self.fallback.get_closed_orders(since) if entry['id'] not in known]
+        return closed
+
+    def get_order(self, order_id):
+        """Pedido abierto por ID (vista de Firestore o, si no está, almacén local)"""
+        order = self.primary.get_order(order_id)
+        if order is None and self._local_pending:
+            order = self.fallback.get_order(order_id)
+        return order
+
+    # --- Vista, prueba medio abierta y reconciliación ---
+
+    def start_open_orders_listener(self, query=None):
+        """Iniciar el listener de Firestore y el hilo de prueba/reconciliación"""
+        started = self.primary.start_open_orders_listener(query)
+        if self._local_pending:
+            self.fallback.start_open_orders_listener()
+        if self._monitor_thread is None:
+            self._stop.clear()
+            self._monitor_thread = threading.Thread(target=self._monitor_loop, name='firestore-failover',
+                                                    daemon=True)
+            self._monitor_thread.start()
+        return started
+
+    def stop_open_orders_listener(self):
+        self.primary.stop_open_orders_listener()
+        self.fallback.stop_open_orders_listener()
+        self._stop.set()
+        self._monitor_thread = None
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"❌ Error en el monitor de failover de Firestore: {e}")
+
+    def check(self):
+        """
+        Un ciclo del hilo de fondo: con el circuito abierto y su espera cumplida, hacer la
+        llamada de prueba; con el circuito cerrado, reconcilia lo escrito localmente
+
+        Returns:
+            Cantidad de pedidos y cambios reconciliados en este ciclo
+        """
+        if self.degraded:
+            if self.breaker.is_open:
+                return 0
+            try:
+                self.primary.ping()
+                logger.info("✅ Firestore respondió la prueba, saliendo del modo degradado")
+            except Exception as e:
+                logger.warning(f"⚠️ Firestore sigue sin responder: {e}")
+                return 0
+
+        if not self._local_pending:
+            return 0
+
+        reconciled = self.fallback.reconcile(self.primary)
+        self.last_reconcile = datetime.now()
+        if self.fallback.pending_sync() == 0 and not self.degraded:
+            with self._lock:
+                self._local_pending = False
+            self.fallback.stop_open_orders_listener()
+            logger.info("🔁 Almacén local reconciliado con Firestore")
+        return reconciled
+
+    def failover_stats(self):
+        """Estado del circuito de Firestore y del almacén local para /health"""
+        return {
+            'mode': 'degraded' if self.degraded else 'normal',
+            'circuit': self.breaker.stats(),
+            'failovers': self.failovers,
+            'last_failover': self.last_failover.isoformat() if self.last_failover else None,
+            'pending_sync': self.fallback.pending_sync() if self._local_pending else 0,
+            'last_reconcile': self.last_reconcile.isoformat() if self.last_reconcile else None
+        }
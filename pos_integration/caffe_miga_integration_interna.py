@@ -8,8 +8,16 @@ import time
 import threading
 from datetime import datetime
 import os
+import sys
 import logging
 
+# Este archivo también se copia suelto al sistema de la cafetería: ahí no hay logging_setup
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from logging_setup import configure_logging
+except ImportError:
+    configure_logging = None
+
 class CafeteriaSystemIntegration:
     def __init__(self, ruta_base_datos="cafeteria.db"):
         """
@@ -22,15 +30,18 @@ class CafeteriaSystemIntegration:
         self.ruta_bd = ruta_base_datos
         self.is_running = False
         
-        # Configurar logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('caffe_miga_integration.log'),
-                logging.StreamHandler()
-            ]
-        )
+        # Configurar logging (logging_setup del proyecto si está disponible)
+        if configure_logging:
+            configure_logging(log_file='caffe_miga_integration.log')
+        else:
+            logging.basicConfig(
+                level=logging.INFO,
+                format='%(asctime)s - %(levelname)s - %(message)s',
+                handlers=[
+                    logging.FileHandler('caffe_miga_integration.log'),
+                    logging.StreamHandler()
+                ]
+            )
         self.logger = logging.getLogger(__name__)
         
         # Verificar que existe la base de datos
@@ -9,8 +9,17 @@ import json
 import threading
 import time
 from datetime import datetime
+import sys
+import os
 import logging
 
+# Este archivo también se copia suelto al sistema de la cafetería: ahí no hay logging_setup
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from logging_setup import configure_logging
+except ImportError:
+    configure_logging = None
+
 class CaffeYMigaIntegration:
     def __init__(self, master=None):
         """
@@ -30,15 +39,18 @@ class CaffeYMigaIntegration:
         self.is_running = False
         self.last_check = datetime.now()
         
-        # Configurar logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('caffe_miga_integration.log'),
-                logging.StreamHandler()
-            ]
-        )
+        # Configurar logging (logging_setup del proyecto si está disponible)
+        if configure_logging:
+            configure_logging(log_file='caffe_miga_integration.log')
+        else:
+            logging.basicConfig(
+                level=logging.INFO,
+                format='%(asctime)s - %(levelname)s - %(message)s',
+                handlers=[
+                    logging.FileHandler('caffe_miga_integration.log'),
+                    logging.StreamHandler()
+                ]
+            )
         self.logger = logging.getLogger(__name__)
         
     def verificar_conexion_servidor(self):
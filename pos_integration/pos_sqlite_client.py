@@ -2,86 +2,38 @@
 # Sistema de gestión de pedidos con base de datos SQLite
 
 import requests
-import sqlite3
 import json
 import time
-from datetime import datetime, timezone
 import logging
 import os
+import sys
+
+# Generador de IDs compartido con el backend (módulo en la carpeta raíz del proyecto)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from order_ids import new_order_id
+from order_schema import get_orders_database, now_timestamp, day_range, items_by_order, QUERIES
+from logging_setup import configure_logging
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CaffeYMigaSQLiteClient:
-    def __init__(self, server_url="http://127.0.0.1:3000", db_path="pos_pedidos.db"):
+    def __init__(self, server_url="http://127.0.0.1:3000", db_path=None):
         """
         Cliente POS para integrar con SQLite
         
         Args:
             server_url: URL del servidor de Caffe & Miga
-            db_path: Ruta de la base de datos SQLite
+            db_path: Ruta del almacén de pedidos (por defecto ORDERS_DB_PATH)
         """
         self.server_url = server_url.rstrip('/')
         self.db_path = db_path
+        self.cursor_pedidos = None  # Cursor del feed incremental de /pos/orders
         self.init_database()
     
     def init_database(self):
-        """Inicializar base de datos SQLite"""
+        """Abrir el almacén de pedidos con el esquema al día (ver order_schema.py)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Crear tabla de pedidos si no existe
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pedidos (
-                    id TEXT PRIMARY KEY,
-                    firebase_id TEXT UNIQUE,
-                    cliente_nombre TEXT NOT NULL,
-                    cliente_email TEXT,
-                    cliente_telefono TEXT,
-                    metodo_pago TEXT,
-                    total REAL NOT NULL,
-                    moneda TEXT DEFAULT 'MXN',
-                    items_json TEXT NOT NULL,
-                    estado_pago TEXT DEFAULT 'pendiente',
-                    estado_pos TEXT DEFAULT 'nuevo',
-                    notas TEXT,
-                    fecha_creacion TEXT NOT NULL,
-                    fecha_actualizacion TEXT,
-                    sincronizado INTEGER DEFAULT 0
-                )
-            ''')
-            
-            # Crear tabla de items (opcional, para mejor organización)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pedido_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pedido_id TEXT NOT NULL,
-                    item_id TEXT,
-                    nombre TEXT NOT NULL,
-                    cantidad INTEGER NOT NULL,
-                    precio_unitario REAL NOT NULL,
-                    precio_total REAL NOT NULL,
-                    FOREIGN KEY (pedido_id) REFERENCES pedidos (id)
-                )
-            ''')
-            
-            # Crear tabla de historial de estados
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS estado_historial (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pedido_id TEXT NOT NULL,
-                    estado_anterior TEXT,
-                    estado_nuevo TEXT NOT NULL,
-                    fecha_cambio TEXT NOT NULL,
-                    usuario TEXT,
-                    FOREIGN KEY (pedido_id) REFERENCES pedidos (id)
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            self.db = get_orders_database(self.db_path)
             logger.info("✅ Base de datos SQLite inicializada correctamente")
             
         except Exception as e:
@@ -90,8 +42,13 @@ class CaffeYMigaSQLiteClient:
     def obtener_pedidos_nuevos(self):
         """Obtener pedidos nuevos desde Firebase y guardarlos en SQLite"""
         try:
-            # Obtener desde el servidor
-            response = requests.get(f"{self.server_url}/pos/orders", timeout=10)
+            # Obtener desde el servidor (solo cambios desde el último cursor)
+            params = {'since': self.cursor_pedidos} if self.cursor_pedidos else {}
+            response = requests.get(f"{self.server_url}/pos/orders", params=params, timeout=10)
+            
+            if response.status_code == 304:
+                logger.info("📭 No hay pedidos nuevos")
+                return []
             
             if response.status_code != 200:
                 logger.error(f"❌ Error obteniendo pedidos: {response.status_code}")
@@ -99,6 +56,7 @@ class CaffeYMigaSQLiteClient:
             
             data = response.json()
             pedidos_firebase = data.get('orders', [])
+            self.cursor_pedidos = data.get('cursor') or self.cursor_pedidos
             
             if not pedidos_firebase:
                 logger.info("📭 No hay pedidos nuevos")
@@ -106,82 +64,64 @@ class CaffeYMigaSQLiteClient:
             
             # Guardar en SQLite
             pedidos_guardados = []
-            conn = sqlite3.connect(self.db_path)
-            
-            for pedido in pedidos_firebase:
-                try:
-                    # Verificar si ya existe
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT id FROM pedidos WHERE firebase_id = ?', (pedido['id'],))
-                    
-                    if cursor.fetchone():
-                        logger.info(f"⚠️ Pedido {pedido['id'][:8]}... ya existe en la BD")
+            with self.db.transaction():
+                for pedido in pedidos_firebase:
+                    try:
+                        # Cada pedido en su propio SAVEPOINT: si falla, solo se deshacen sus filas
+                        with self.db.transaction() as conn:
+                            cursor = conn.cursor()
+                            # Verificar si ya existe
+                            cursor.execute(QUERIES['pedido_por_firebase_id'], (pedido['id'],))
+
+                            if cursor.fetchone():
+                                logger.info(f"⚠️ Pedido {pedido['id'][:8]}... ya existe en la BD")
+                                continue
+
+                            # Insertar nuevo pedido (el trigger del almacén llena pedido_items desde `items`)
+                            customer = pedido.get('customer', {})
+                            items = pedido.get('items', [])
+                            pedido_local_id = new_order_id('POS')  # ID local
+
+                            cursor.execute('''
+                                INSERT INTO pedidos (
+                                    id, firebase_id, cliente_nombre, cliente_email, cliente_telefono,
+                                    metodo_pago, total, moneda, items, estado_pago, estado_pos,
+                                    notas, fecha_creacion, sincronizado
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (
+                                pedido_local_id,
+                                pedido['id'],  # ID de Firebase
+                                customer.get('name', 'Cliente'),
+                                customer.get('email', ''),
+                                customer.get('phone', ''),
+                                customer.get('payment_method', 'tarjeta'),
+                                pedido.get('total', 0),
+                                pedido.get('currency', 'MXN'),
+                                json.dumps(items),
+                                pedido.get('payment_status', 'approved'),
+                                'nuevo',
+                                pedido.get('notes', ''),
+                                now_timestamp(),
+                                1
+                            ))
+
+                            # Registrar en historial
+                            cursor.execute('''
+                                INSERT INTO estado_historial (pedido_id, estado_nuevo, fecha_cambio, usuario)
+                                VALUES (?, ?, ?, ?)
+                            ''', (
+                                pedido_local_id,
+                                'nuevo',
+                                now_timestamp(),
+                                'sistema'
+                            ))
+
+                            pedidos_guardados.append(pedido)
+                            logger.info(f"✅ Pedido guardado: {customer.get('name', 'Cliente')} - ${pedido.get('total', 0)}")
+
+                    except Exception as e:
+                        logger.error(f"❌ Error guardando pedido individual: {e}")
                         continue
-                    
-                    # Insertar nuevo pedido
-                    customer = pedido.get('customer', {})
-                    items = pedido.get('items', [])
-                    
-                    cursor.execute('''
-                        INSERT INTO pedidos (
-                            id, firebase_id, cliente_nombre, cliente_email, cliente_telefono,
-                            metodo_pago, total, moneda, items_json, estado_pago, estado_pos,
-                            notas, fecha_creacion, sincronizado
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        f"POS_{int(time.time())}_{pedido['id'][:8]}",  # ID local
-                        pedido['id'],  # ID de Firebase
-                        customer.get('name', 'Cliente'),
-                        customer.get('email', ''),
-                        customer.get('phone', ''),
-                        customer.get('payment_method', 'tarjeta'),
-                        pedido.get('total', 0),
-                        pedido.get('currency', 'MXN'),
-                        json.dumps(items),
-                        pedido.get('payment_status', 'approved'),
-                        'nuevo',
-                        pedido.get('notes', ''),
-                        datetime.now(timezone.utc).isoformat(),
-                        1
-                    ))
-                    
-                    pedido_local_id = cursor.lastrowid
-                    
-                    # Insertar items individuales
-                    for item in items:
-                        cursor.execute('''
-                            INSERT INTO pedido_items (
-                                pedido_id, item_id, nombre, cantidad, precio_unitario, precio_total
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (
-                            f"POS_{int(time.time())}_{pedido['id'][:8]}",
-                            item.get('id', ''),
-                            item.get('title', 'Item'),
-                            item.get('quantity', 1),
-                            item.get('unit_price', 0),
-                            item.get('quantity', 1) * item.get('unit_price', 0)
-                        ))
-                    
-                    # Registrar en historial
-                    cursor.execute('''
-                        INSERT INTO estado_historial (pedido_id, estado_nuevo, fecha_cambio, usuario)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        f"POS_{int(time.time())}_{pedido['id'][:8]}",
-                        'nuevo',
-                        datetime.now(timezone.utc).isoformat(),
-                        'sistema'
-                    ))
-                    
-                    pedidos_guardados.append(pedido)
-                    logger.info(f"✅ Pedido guardado: {customer.get('name', 'Cliente')} - ${pedido.get('total', 0)}")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error guardando pedido individual: {e}")
-                    continue
-            
-            conn.commit()
-            conn.close()
             
             logger.info(f"🔥 {len(pedidos_guardados)} nuevos pedidos guardados en SQLite")
             return pedidos_guardados
@@ -193,47 +133,37 @@ class CaffeYMigaSQLiteClient:
     def actualizar_estado_pedido(self, pedido_id, nuevo_estado, usuario="pos_user"):
         """Actualizar estado de un pedido en SQLite y Firebase"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Obtener estado actual y firebase_id
-            cursor.execute('''
-                SELECT estado_pos, firebase_id FROM pedidos WHERE id = ?
-            ''', (pedido_id,))
-            
-            resultado = cursor.fetchone()
-            if not resultado:
-                logger.error(f"❌ Pedido {pedido_id} no encontrado")
-                return False
-            
-            estado_anterior, firebase_id = resultado
-            
-            # Actualizar en SQLite
-            cursor.execute('''
-                UPDATE pedidos 
-                SET estado_pos = ?, fecha_actualizacion = ?
-                WHERE id = ?
-            ''', (nuevo_estado, datetime.now(timezone.utc).isoformat(), pedido_id))
-            
-            # Registrar en historial
-            cursor.execute('''
-                INSERT INTO estado_historial (pedido_id, estado_anterior, estado_nuevo, fecha_cambio, usuario)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                pedido_id,
-                estado_anterior,
-                nuevo_estado,
-                datetime.now(timezone.utc).isoformat(),
-                usuario
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.db.transaction() as conn:
+                cursor = conn.cursor()
+                # Obtener estado actual y firebase_id
+                cursor.execute(QUERIES['estado_pedido'], (pedido_id,))
+
+                resultado = cursor.fetchone()
+                if not resultado:
+                    logger.error(f"❌ Pedido {pedido_id} no encontrado")
+                    return False
+
+                estado_anterior, firebase_id = resultado
+
+                # Actualizar en SQLite
+                cursor.execute(QUERIES['actualizar_estado_pos'], (nuevo_estado, now_timestamp(), pedido_id))
+
+                # Registrar en historial
+                cursor.execute('''
+                    INSERT INTO estado_historial (pedido_id, estado_anterior, estado_nuevo, fecha_cambio, usuario)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    pedido_id,
+                    estado_anterior,
+                    nuevo_estado,
+                    now_timestamp(),
+                    usuario
+                ))
             
             # Actualizar en Firebase
             try:
                 response = requests.put(
-                    f"{self.server_url}/pos/orders/{firebase_id}/status",
+                    f"{self.server_url}/pos/order/{firebase_id}/status",
                     json={"status": nuevo_estado},
                     timeout=10
                 )
@@ -253,77 +183,131 @@ class CaffeYMigaSQLiteClient:
             logger.error(f"❌ Error actualizando estado: {e}")
             return False
     
+    def actualizar_estados_pedidos(self, pedido_ids, nuevo_estado, usuario="pos_user"):
+        """Actualizar el estado de varios pedidos (ej. entregados al cierre) con una sola llamada al servidor"""
+        try:
+            with self.db.transaction() as conn:
+                cursor = conn.cursor()
+                ahora = now_timestamp()
+                firebase_ids = []
+
+                for pedido_id in pedido_ids:
+                    cursor.execute(QUERIES['estado_pedido'], (pedido_id,))
+
+                    resultado = cursor.fetchone()
+                    if not resultado:
+                        logger.error(f"❌ Pedido {pedido_id} no encontrado")
+                        continue
+
+                    estado_anterior, firebase_id = resultado
+
+                    cursor.execute(QUERIES['actualizar_estado_pos'], (nuevo_estado, ahora, pedido_id))
+
+                    cursor.execute('''
+                        INSERT INTO estado_historial (pedido_id, estado_anterior, estado_nuevo, fecha_cambio, usuario)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (pedido_id, estado_anterior, nuevo_estado, ahora, usuario))
+
+                    if firebase_id:
+                        firebase_ids.append(firebase_id)
+            
+            if not firebase_ids:
+                return True
+            
+            # Actualizar en Firebase en batch
+            try:
+                response = requests.put(
+                    f"{self.server_url}/pos/orders/status",
+                    json={"updates": [{"id": fid, "status": nuevo_estado} for fid in firebase_ids]},
+                    timeout=30
+                )
+                
+                if response.status_code == 200:
+                    logger.info(f"✅ {response.json().get('updated', 0)}/{len(firebase_ids)} estados actualizados -> {nuevo_estado}")
+                else:
+                    logger.warning(f"⚠️ Actualizados en SQLite pero no en Firebase: {response.status_code}")
+                return True
+            
+            except Exception as e:
+                logger.warning(f"⚠️ Actualizados en SQLite pero error en Firebase: {e}")
+                return True
+        
+        except Exception as e:
+            logger.error(f"❌ Error actualizando estados: {e}")
+            return False
+    
     def obtener_pedidos_activos(self):
         """Obtener pedidos activos de SQLite"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.db.connection().cursor()
             
-            cursor.execute('''
-                SELECT id, firebase_id, cliente_nombre, cliente_telefono, total, 
-                       items_json, estado_pos, fecha_creacion
-                FROM pedidos 
-                WHERE estado_pos IN ('nuevo', 'preparando', 'listo')
-                ORDER BY fecha_creacion ASC
-            ''')
+            cursor.execute(QUERIES['pedidos_activos'])
+            filas = cursor.fetchall()
+            # Items ya normalizados, de todos los pedidos activos en una sola consulta
+            items = items_by_order(cursor.execute(QUERIES['items_pedidos_activos']))
             
             pedidos = []
-            for row in cursor.fetchall():
+            for row in filas:
                 pedido = {
                     'id': row[0],
                     'firebase_id': row[1],
                     'cliente': row[2],
                     'telefono': row[3],
                     'total': row[4],
-                    'items': json.loads(row[5]),
-                    'estado': row[6],
-                    'fecha': row[7]
+                    'items': items.get(row[0], []),
+                    'estado': row[5],
+                    'fecha': row[6]
                 }
                 pedidos.append(pedido)
             
-            conn.close()
             return pedidos
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo pedidos activos: {e}")
             return []
     
+    def cerrar_pedidos_listos(self, usuario="pos_user"):
+        """Al cierre: marcar como entregados todos los pedidos listos (una sola llamada al servidor)"""
+        listos = [pedido['id'] for pedido in self.obtener_pedidos_activos() if pedido['estado'] == 'listo']
+        if listos and self.actualizar_estados_pedidos(listos, 'entregado', usuario):
+            return len(listos)
+        return 0
+    
     def obtener_estadisticas(self):
         """Obtener estadísticas del POS"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.db.connection().cursor()
+            # Pedidos de hoy como rango sobre fecha_creacion: así usa idx_pedidos_fecha
+            hoy = day_range()
             
             # Contar por estados
-            cursor.execute('''
-                SELECT estado_pos, COUNT(*) 
-                FROM pedidos 
-                WHERE date(fecha_creacion) = date('now')
-                GROUP BY estado_pos
-            ''')
+            cursor.execute(QUERIES['pedidos_por_estado_pos_en_rango'], hoy)
             
             stats = {}
             for estado, count in cursor.fetchall():
                 stats[estado] = count
             
             # Total del día
-            cursor.execute('''
-                SELECT COUNT(*), COALESCE(SUM(total), 0)
-                FROM pedidos 
-                WHERE date(fecha_creacion) = date('now')
-            ''')
+            cursor.execute(QUERIES['totales_en_rango'], hoy)
             
             total_pedidos, total_ventas = cursor.fetchone()
             stats['total_pedidos'] = total_pedidos
             stats['total_ventas'] = total_ventas
             
-            conn.close()
             return stats
             
         except Exception as e:
             logger.error(f"❌ Error obteniendo estadísticas: {e}")
             return {}
     
+    def obtener_productos_del_dia(self):
+        """Unidades e importe por producto en los pedidos de hoy: [(nombre, cantidad, importe)]"""
+        try:
+            return self.db.query(QUERIES['productos_en_rango'], day_range())
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo productos del día: {e}")
+            return []
+    
     def iniciar_monitoreo(self, intervalo=30):
         """Iniciar monitoreo automático"""
         logger.info(f"🔄 Iniciando monitoreo cada {intervalo} segundos...")
@@ -380,7 +364,7 @@ def mostrar_pedidos_activos():
         print(f"Estado: {pedido['estado'].upper()}")
         print(f"Items:")
         for item in pedido['items']:
-            print(f"  • {item.get('quantity', 1)}x {item.get('title', 'Item')} - ${item.get('unit_price', 0)}")
+            print(f"  • {item['cantidad']}x {item['nombre']} - ${item['precio']}")
         print("-" * 60)
 
 def cambiar_estado_pedido():
@@ -422,6 +406,8 @@ def cambiar_estado_pedido():
         print("❌ Ingresa un número válido")
 
 if __name__ == "__main__":
+    # Configurar logging solo al ejecutarlo: importado, el proceso anfitrión ya lo configuró
+    configure_logging(log_file='pos_sqlite_client.log')
     print("🔥 Cliente POS SQLite - Caffe & Miga")
     print("=" * 40)
     
@@ -434,8 +420,9 @@ if __name__ == "__main__":
     print("3. Cambiar estado de pedido")
     print("4. Ver estadísticas")
     print("5. Iniciar monitoreo automático")
+    print("6. Cierre: entregar todos los pedidos listos")
     
-    opcion = input("\nSelecciona una opción (1-5): ")
+    opcion = input("\nSelecciona una opción (1-6): ")
     
     if opcion == "1":
         pedidos = client.obtener_pedidos_nuevos()
@@ -452,9 +439,15 @@ if __name__ == "__main__":
         print(f"\n📊 Estadísticas del día:")
         for key, value in stats.items():
             print(f"   {key}: {value}")
+        print(f"\n🛍️ Productos del día:")
+        for nombre, cantidad, importe in client.obtener_productos_del_dia():
+            print(f"   {cantidad}x {nombre} - ${importe:.2f}")
             
     elif opcion == "5":
         client.iniciar_monitoreo(30)
         
+    elif opcion == "6":
+        print(f"✅ {client.cerrar_pedidos_listos()} pedidos marcados como entregados")
+        
     else:
         print("❌ Opción inválida")
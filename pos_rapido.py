@@ -7,10 +7,10 @@ Versión optimizada para carga rápida
 
 import tkinter as tk
 from tkinter import messagebox, ttk
-import sqlite3
 import json
-from datetime import datetime
 import os
+from order_schema import get_orders_database, now_timestamp, QUERIES
+from sales_schema import get_sales_database, record_sale, QUERIES as SALES_QUERIES
 
 class POSRapido:
     def __init__(self):
@@ -28,45 +28,11 @@ class POSRapido:
         self.crear_interfaz()
         
     def init_db(self):
-        """Inicializar base de datos"""
+        """Abrir el almacén de pedidos y la base de ventas con el esquema al día"""
         try:
-            # Base de datos POS
-            conn = sqlite3.connect('pos_pedidos.db')
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS pedidos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    cliente_nombre TEXT,
-                    cliente_telefono TEXT,
-                    hora_recogida TEXT,
-                    items TEXT,
-                    total REAL,
-                    estado TEXT DEFAULT 'pendiente',
-                    metodo_pago TEXT,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            conn.close()
-            
-            # Base de datos ventas locales
-            conn = sqlite3.connect('ventas.db')
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS tickets (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha TEXT,
-                    producto TEXT,
-                    cantidad INTEGER,
-                    precio REAL,
-                    pago TEXT,
-                    estado TEXT DEFAULT 'Activo',
-                    motivo_cancelacion TEXT
-                )
-            ''')
-            conn.commit()
-            conn.close()
+            # Ver order_schema.py y sales_schema.py
+            self.db_pedidos = get_orders_database()
+            self.db_ventas = get_sales_database()
             
         except Exception as e:
             messagebox.showerror("Error DB", f"Error inicializando base de datos: {e}")
@@ -248,18 +214,7 @@ class POSRapido:
             for item in self.tree_web.get_children():
                 self.tree_web.delete(item)
             
-            conn = sqlite3.connect('pos_pedidos.db')
-            c = conn.cursor()
-            c.execute("""
-                SELECT id, cliente_nombre, total, metodo_pago, estado 
-                FROM pedidos 
-                WHERE estado = 'pendiente' 
-                ORDER BY fecha_creacion DESC
-                LIMIT 50
-            """)
-            
-            pedidos = c.fetchall()
-            conn.close()
+            pedidos = self.db_pedidos.query(QUERIES['pedidos_pendientes_recientes'], (50,))
             
             for pedido in pedidos:
                 self.tree_web.insert("", "end", values=pedido)
@@ -279,18 +234,7 @@ class POSRapido:
             for item in self.tree_local.get_children():
                 self.tree_local.delete(item)
             
-            conn = sqlite3.connect('ventas.db')
-            c = conn.cursor()
-            c.execute("""
-                SELECT id, fecha, producto, cantidad, precio, pago 
-                FROM tickets 
-                WHERE estado = 'Activo' 
-                ORDER BY fecha DESC 
-                LIMIT 50
-            """)
-            
-            ventas = c.fetchall()
-            conn.close()
+            ventas = self.db_ventas.query(SALES_QUERIES['lineas_recientes'], (50,))
             
             for venta in ventas:
                 self.tree_local.insert("", "end", values=venta)
@@ -309,15 +253,7 @@ class POSRapido:
         pedido_id = item['values'][0]
         
         try:
-            conn = sqlite3.connect('pos_pedidos.db')
-            c = conn.cursor()
-            c.execute("""
-                UPDATE pedidos 
-                SET estado = 'completado', fecha_actualizacion = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            """, (pedido_id,))
-            conn.commit()
-            conn.close()
+            self.db_pedidos.execute(QUERIES['actualizar_estado'], ('completado', now_timestamp(), pedido_id))
             
             messagebox.showinfo("Éxito", f"Pedido #{pedido_id} completado")
             self.cargar_pedidos_web()
@@ -361,14 +297,8 @@ class POSRapido:
                     messagebox.showerror("Error", "Ingresa el nombre del producto")
                     return
                 
-                conn = sqlite3.connect('ventas.db')
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado)
-                    VALUES (?, ?, ?, ?, ?, 'Activo')
-                """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), producto, cantidad, precio, pago))
-                conn.commit()
-                conn.close()
+                record_sale([{'producto': producto, 'cantidad': cantidad, 'precio': precio}], pago,
+                            db=self.db_ventas)
                 
                 messagebox.showinfo("Éxito", "Venta registrada correctamente")
                 ventana.destroy()
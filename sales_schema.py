@@ -0,0 +1,329 @@
+# Esquema de ventas del POS para Caffe & Miga
+# ventas.db guarda las ventas del mostrador y los pedidos web ya cobrados. Antes cada programa
+# (cafeteria_sistema.py, app.py, pos_rapido.py, sincronizar_web_a_ventas.py) creaba la tabla a su
+# manera; ahora el esquema está versionado aquí y se aplica con migrate() (sqlite_db.py):
+#
+#   - La migración 1 crea `tickets` (o completa las columnas origen/pedido_web_id de un archivo
+#     viejo) y los índices de las consultas por estado, fecha y origen
+#   - La migración 2 pasa a ventas (encabezado: número, totales, pago, promoción) + venta_lineas.
+#     Los tickets existentes se agrupan en ventas y `tickets` queda como vista de las líneas;
+#     un INSERT en la vista crea una venta de una línea, así los scripts viejos siguen funcionando
+#   - La migración 3 permite cancelar una línea sin cancelar la venta (estado por línea)
+#   - record_sale() guarda una venta completa en una sola transacción y cancel_sale_line()
+#     cancela una línea y recalcula los totales de su venta
+#   - QUERIES reúne las consultas de producción; test_query_plans.py verifica que ninguna
+#     recorra la tabla completa
+#
+# Uso:
+#     venta = record_sale([{'producto': 'Latte', 'cantidad': 2, 'precio': 45}], 'Efectivo')
+#     cantidad, total = get_sales_database().query_one(QUERIES['totales_periodo'], day_range())
+
+import os
+import logging
+from datetime import datetime
+from sqlite_db import get_migrated_database, day_range
+
+logger = logging.getLogger(__name__)
+
+# Relativa al directorio de trabajo, como siempre la abrió el POS
+SALES_DB_PATH = os.getenv('SALES_DB_PATH', 'ventas.db')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _add_ticket_columns(conn):
+    """Agregar a un archivo viejo las columnas que la tabla original no tenía"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(tickets)')}
+    if 'origen' not in columns:
+        conn.execute("ALTER TABLE tickets ADD COLUMN origen TEXT DEFAULT 'LOCAL'")
+    if 'pedido_web_id' not in columns:
+        conn.execute('ALTER TABLE tickets ADD COLUMN pedido_web_id TEXT')
+
+def _tickets_to_sales(conn):
+    """
+    Convertir la tabla `tickets` (una fila por producto) en ventas + líneas y borrarla.
+    Las filas con la misma fecha, pago, estado y pedido web eran una misma venta
+    """
+    tipo = conn.execute("SELECT type FROM sqlite_master WHERE name = 'tickets'").fetchone()
+    if not tipo or tipo[0] != 'table':
+        return
+
+    ventas = {}
+    for row in conn.execute('''
+        SELECT id, fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion, origen, pedido_web_id
+        FROM tickets ORDER BY id
+    '''):
+        ticket_id, fecha, producto, cantidad, precio, pago, estado, motivo, origen, pedido_web_id = row
+        clave = (fecha, pago, estado, motivo, origen, pedido_web_id)
+        ventas.setdefault(clave, []).append((ticket_id, producto or '', cantidad or 0, precio or 0))
+
+    for (fecha, pago, estado, motivo, origen, pedido_web_id), lineas in ventas.items():
+        total = sum(cantidad * precio for _, _, cantidad, precio in lineas)
+        # Los tickets web guardaban la información del pedido en motivo_cancelacion
+        notas = motivo if origen == 'WEB' else None
+        venta_id = conn.execute('''
+            INSERT INTO ventas (numero, fecha, pago, subtotal, total, articulos,
+                                estado, motivo_cancelacion, origen, pedido_web_id, notas)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            f"T-{lineas[0][0]}", fecha or '', pago, total, total, sum(linea[2] for linea in lineas),
+            estado or 'Activo', None if notas else motivo, origen or 'LOCAL', pedido_web_id, notas
+        )).lastrowid
+        # Las líneas conservan el id del ticket original
+        conn.executemany('''
+            INSERT INTO venta_lineas (id, venta_id, producto, cantidad, precio, precio_lista, importe)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(ticket_id, venta_id, producto, cantidad, precio, precio, cantidad * precio)
+              for ticket_id, producto, cantidad, precio in lineas])
+
+    conn.execute('DROP TABLE tickets')
+    logger.info(f"🎫 {sum(len(lineas) for lineas in ventas.values())} tickets agrupados en {len(ventas)} ventas")
+
+# Un INSERT en la vista `tickets` crea una venta de una línea (la usan los scripts viejos)
+TICKETS_INSERT_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS tickets_insert INSTEAD OF INSERT ON tickets
+    BEGIN
+        INSERT INTO ventas (numero, fecha, pago, subtotal, total, articulos,
+                            estado, motivo_cancelacion, origen, pedido_web_id)
+        VALUES (
+            'L-' || (SELECT COALESCE(MAX(id), 0) + 1 FROM ventas),
+            COALESCE(NEW.fecha, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')), NEW.pago,
+            COALESCE(NEW.cantidad, 1) * COALESCE(NEW.precio, 0),
+            COALESCE(NEW.cantidad, 1) * COALESCE(NEW.precio, 0),
+            COALESCE(NEW.cantidad, 1), COALESCE(NEW.estado, 'Activo'), NEW.motivo_cancelacion,
+            COALESCE(NEW.origen, 'LOCAL'), NEW.pedido_web_id
+        );
+        INSERT INTO venta_lineas (venta_id, producto, cantidad, precio, precio_lista, importe)
+        VALUES (
+            last_insert_rowid(), COALESCE(NEW.producto, ''), COALESCE(NEW.cantidad, 1),
+            COALESCE(NEW.precio, 0), COALESCE(NEW.precio, 0),
+            COALESCE(NEW.cantidad, 1) * COALESCE(NEW.precio, 0)
+        );
+    END
+'''
+
+# (versión, descripción, pasos)
+SALES_MIGRATIONS = [
+    (1, 'Tabla de tickets con origen e índices por estado, fecha y origen', [
+        '''
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT,
+            producto TEXT,
+            cantidad INTEGER,
+            precio REAL,
+            pago TEXT,
+            estado TEXT DEFAULT 'Activo',
+            motivo_cancelacion TEXT,
+            origen TEXT DEFAULT 'LOCAL',
+            pedido_web_id TEXT
+        )
+        ''',
+        _add_ticket_columns,
+        # Ventas activas por período y las últimas ventas del mostrador
+        'CREATE INDEX IF NOT EXISTS idx_tickets_estado_fecha ON tickets (estado, fecha)',
+        'CREATE INDEX IF NOT EXISTS idx_tickets_origen ON tickets (origen)',
+    ]),
+    (2, 'Ventas con encabezado y líneas; tickets pasa a ser una vista de las líneas', [
+        '''
+        CREATE TABLE IF NOT EXISTS ventas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero TEXT NOT NULL UNIQUE,
+            fecha TEXT NOT NULL,
+            pago TEXT,
+            subtotal REAL NOT NULL DEFAULT 0,
+            descuento REAL NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            promocion TEXT,
+            articulos INTEGER NOT NULL DEFAULT 0,
+            estado TEXT NOT NULL DEFAULT 'Activo',
+            motivo_cancelacion TEXT,
+            origen TEXT NOT NULL DEFAULT 'LOCAL',
+            pedido_web_id TEXT,
+            notas TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS venta_lineas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            venta_id INTEGER NOT NULL REFERENCES ventas (id),
+            producto TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio REAL NOT NULL,
+            precio_lista REAL NOT NULL,
+            importe REAL NOT NULL
+        )
+        ''',
+        # Totales por período sin leer la tabla; el número de venta ya tiene su índice (UNIQUE)
+        'CREATE INDEX IF NOT EXISTS idx_ventas_estado_fecha ON ventas (estado, fecha, total)',
+        'CREATE INDEX IF NOT EXISTS idx_ventas_origen ON ventas (origen)',
+        'CREATE INDEX IF NOT EXISTS idx_venta_lineas_venta ON venta_lineas (venta_id)',
+        _tickets_to_sales,
+        '''
+        CREATE VIEW IF NOT EXISTS tickets AS
+        SELECT l.id, v.fecha, l.producto, l.cantidad, l.precio, v.pago, v.estado,
+               v.motivo_cancelacion, v.origen, v.pedido_web_id, v.numero AS venta
+        FROM venta_lineas l JOIN ventas v ON v.id = l.venta_id
+        ''',
+        TICKETS_INSERT_TRIGGER,
+    ]),
+    (3, 'Estado por línea: cancelar una línea recalcula la venta', [
+        "ALTER TABLE venta_lineas ADD COLUMN estado TEXT NOT NULL DEFAULT 'Activo'",
+        'ALTER TABLE venta_lineas ADD COLUMN motivo_cancelacion TEXT',
+        # La vista muestra el estado de la línea; al borrarla se borra también su trigger
+        'DROP VIEW tickets',
+        '''
+        CREATE VIEW tickets AS
+        SELECT l.id, v.fecha, l.producto, l.cantidad, l.precio, v.pago,
+               CASE WHEN v.estado = 'Activo' THEN l.estado ELSE v.estado END AS estado,
+               COALESCE(l.motivo_cancelacion, v.motivo_cancelacion) AS motivo_cancelacion,
+               v.origen, v.pedido_web_id, v.numero AS venta
+        FROM venta_lineas l JOIN ventas v ON v.id = l.venta_id
+        ''',
+        TICKETS_INSERT_TRIGGER,
+    ]),
+]
+
+# Consultas de producción sobre ventas.db. Los períodos son rangos [desde, hasta) sobre fecha;
+# los totales suman encabezados, las líneas solo se leen para el detalle por producto
+QUERIES = {
+    'lineas_recientes': '''
+        SELECT l.id, v.fecha, l.producto, l.cantidad, l.precio, v.pago
+        FROM ventas v JOIN venta_lineas l ON l.venta_id = v.id
+        WHERE v.estado = 'Activo' AND l.estado = 'Activo'
+        ORDER BY v.fecha DESC
+        LIMIT ?
+    ''',
+    'totales': "SELECT COUNT(*), COALESCE(SUM(total), 0) FROM ventas WHERE estado = 'Activo'",
+    'totales_periodo': '''
+        SELECT COUNT(*), COALESCE(SUM(total), 0)
+        FROM ventas
+        WHERE estado = 'Activo' AND fecha >= ? AND fecha < ?
+    ''',
+    'productos': '''
+        SELECT l.producto, SUM(l.cantidad)
+        FROM ventas v JOIN venta_lineas l ON l.venta_id = v.id
+        WHERE v.estado = 'Activo' AND l.estado = 'Activo'
+        GROUP BY l.producto
+        ORDER BY l.producto
+    ''',
+    'productos_periodo': '''
+        SELECT l.producto, SUM(l.cantidad)
+        FROM ventas v JOIN venta_lineas l ON l.venta_id = v.id
+        WHERE v.estado = 'Activo' AND l.estado = 'Activo' AND v.fecha >= ? AND v.fecha < ?
+        GROUP BY l.producto
+        ORDER BY l.producto
+    ''',
+    'ultimo_numero_del_dia': 'SELECT MAX(numero) FROM ventas WHERE numero >= ? AND numero < ?',
+    'contar_ventas_origen': 'SELECT COUNT(*) FROM ventas WHERE origen = ?',
+    'contar_ventas': 'SELECT COUNT(*) FROM ventas',
+    # Desde el historial se cancela una línea; después se recalculan los totales de su venta
+    'cancelar_linea': '''
+        UPDATE venta_lineas SET estado = ?, motivo_cancelacion = ?
+        WHERE id = ? AND estado = 'Activo'
+    ''',
+    # Totales con las líneas activas; sin ninguna, la venta queda cancelada con el motivo dado
+    'recalcular_totales_venta': '''
+        UPDATE ventas SET
+            subtotal = (SELECT ROUND(COALESCE(SUM(cantidad * precio_lista), 0), 2)
+                        FROM venta_lineas WHERE venta_id = ventas.id AND estado = 'Activo'),
+            descuento = (SELECT ROUND(COALESCE(SUM(cantidad * (precio_lista - precio)), 0), 2)
+                         FROM venta_lineas WHERE venta_id = ventas.id AND estado = 'Activo'),
+            total = (SELECT ROUND(COALESCE(SUM(importe), 0), 2)
+                     FROM venta_lineas WHERE venta_id = ventas.id AND estado = 'Activo'),
+            articulos = (SELECT COALESCE(SUM(cantidad), 0)
+                         FROM venta_lineas WHERE venta_id = ventas.id AND estado = 'Activo'),
+            estado = CASE WHEN EXISTS (SELECT 1 FROM venta_lineas
+                                       WHERE venta_id = ventas.id AND estado = 'Activo')
+                          THEN estado ELSE ? END,
+            motivo_cancelacion = CASE WHEN EXISTS (SELECT 1 FROM venta_lineas
+                                                   WHERE venta_id = ventas.id AND estado = 'Activo')
+                                      THEN motivo_cancelacion ELSE ? END
+        WHERE id = (SELECT venta_id FROM venta_lineas WHERE id = ?)
+    ''',
+}
+
+def get_sales_database(path=None):
+    """SQLiteDatabase de ventas con el esquema al día"""
+    return get_migrated_database(path or SALES_DB_PATH, SALES_MIGRATIONS)
+
+def _next_sale_number(conn, fecha):
+    """Siguiente número de venta del día (V-AAAAMMDD-0001). Se llama dentro de la transacción de escritura"""
+    prefijo = f"V-{fecha[:10].replace('-', '')}-"
+    ultimo = conn.execute(QUERIES['ultimo_numero_del_dia'], (prefijo, prefijo[:-1] + '.')).fetchone()[0]
+    secuencia = int(ultimo.rsplit('-', 1)[1]) + 1 if ultimo else 1
+    return f"{prefijo}{secuencia:04d}"
+
+def record_sale(lineas, pago, promocion=None, origen='LOCAL', pedido_web_id=None, notas=None,
+                estado='Activo', motivo_cancelacion=None, fecha=None, db=None):
+    """
+    Guardar una venta completa (encabezado + líneas) en una sola transacción
+
+    Args:
+        lineas: Lista de dicts con producto, cantidad y precio cobrado por unidad; precio_lista
+            opcional si la línea se cobró con descuento (promoción)
+        pago: Método de pago
+        promocion: Nombre de la promoción aplicada, si hubo
+        origen: 'LOCAL' o 'WEB'
+        pedido_web_id: ID del pedido web que originó la venta
+        fecha: datetime o 'YYYY-MM-DD HH:MM:SS' (por defecto ahora)
+        db: SQLiteDatabase de ventas (por defecto get_sales_database())
+
+    Returns:
+        dict con id, numero y total de la venta
+    """
+    if not lineas:
+        raise ValueError("La venta no tiene productos")
+
+    db = db or get_sales_database()
+    fecha = fecha or datetime.now()
+    if not isinstance(fecha, str):
+        fecha = fecha.strftime(TIMESTAMP_FORMAT)
+
+    filas = []
+    subtotal = descuento = 0
+    articulos = 0
+    for linea in lineas:
+        cantidad = int(linea.get('cantidad', 1))
+        precio = float(linea.get('precio', 0))
+        precio_lista = float(linea.get('precio_lista', precio))
+        subtotal += cantidad * precio_lista
+        descuento += cantidad * (precio_lista - precio)
+        articulos += cantidad
+        filas.append((linea['producto'], cantidad, precio, precio_lista, round(cantidad * precio, 2)))
+    subtotal, descuento = round(subtotal, 2), round(descuento, 2)
+    total = round(subtotal - descuento, 2)
+
+    with db.transaction() as conn:
+        numero = _next_sale_number(conn, fecha)
+        venta_id = conn.execute('''
+            INSERT INTO ventas (numero, fecha, pago, subtotal, descuento, total, promocion, articulos,
+                                estado, motivo_cancelacion, origen, pedido_web_id, notas)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (numero, fecha, pago, subtotal, descuento, total, promocion, articulos,
+              estado, motivo_cancelacion, origen, pedido_web_id, notas)).lastrowid
+        conn.executemany('''
+            INSERT INTO venta_lineas (venta_id, producto, cantidad, precio, precio_lista, importe)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(venta_id, *fila) for fila in filas])
+
+    return {'id': venta_id, 'numero': numero, 'total': total}
+
+def cancel_sale_line(linea_id, motivo, estado='Cancelado', db=None):
+    """
+    Cancelar una línea (ticket) de una venta y recalcular los totales de la venta en la misma
+    transacción. Si era su última línea activa, la venta completa queda cancelada
+
+    Args:
+        linea_id: ID de la línea (el id de la vista `tickets`)
+        motivo: Motivo de la cancelación
+        db: SQLiteDatabase de ventas (por defecto get_sales_database())
+
+    Returns:
+        True si se canceló; False si la línea no existe o ya estaba cancelada
+    """
+    db = db or get_sales_database()
+    with db.transaction() as conn:
+        if conn.execute(QUERIES['cancelar_linea'], (estado, motivo, linea_id)).rowcount == 0:
+            return False
+        conn.execute(QUERIES['recalcular_totales_venta'], (estado, motivo, linea_id))
+    return True
@@ -1498,6 +1498,42 @@ function mostrarCheckoutModal() {
     };
 }
 
+// Clave de idempotencia del intento de compra actual: se reutiliza en reintentos y doble clic,
+// así el backend devuelve el mismo pedido en vez de crear uno duplicado
+let claveIdempotenciaPedido = null;
+
+function obtenerClaveIdempotencia() {
+    if (!claveIdempotenciaPedido) {
+        claveIdempotenciaPedido = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+    return claveIdempotenciaPedido;
+}
+
+function reiniciarClaveIdempotencia() {
+    claveIdempotenciaPedido = null;
+}
+
+// 4xx que pueden salir bien repitiendo el mismo pedido; los demás (400, 422...) son definitivos
+const ESTADOS_REINTENTABLES = [408, 409, 425, 429];
+
+// POST con Idempotency-Key: si el mismo pedido aún se está procesando (409), esperar y reintentar
+async function fetchIdempotente(url, opciones, intentos = 5) {
+    for (let intento = 1; ; intento++) {
+        const response = await fetch(url, opciones);
+        if (response.status >= 400 && response.status < 500 && !ESTADOS_REINTENTABLES.includes(response.status)) {
+            // El backend guarda la respuesta con la clave: al corregir los datos se envía como pedido nuevo
+            reiniciarClaveIdempotencia();
+        }
+        if (response.status !== 409 || intento >= intentos) {
+            return response;
+        }
+        const espera = parseInt(response.headers.get('Retry-After') || '1', 10) * 1000;
+        await new Promise(resolve => setTimeout(resolve, espera));
+    }
+}
+
 // Crear preferencia de pago - NUEVA VERSIÓN CON BACKEND
 async function crearPreferenciaPago() {
     try {
@@ -1553,10 +1589,11 @@ async function crearPreferenciaPago() {
         console.log('📦 Datos del pedido:', orderData);
         
         // Enviar al backend para crear la preferencia de Mercado Pago
-        const response = await fetch(`${MERCADO_PAGO_CONFIG.backendUrl}/create_preference`, {
+        const response = await fetchIdempotente(`${MERCADO_PAGO_CONFIG.backendUrl}/create_preference`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': obtenerClaveIdempotencia()
             },
             body: JSON.stringify(orderData)
         });
@@ -1566,6 +1603,7 @@ async function crearPreferenciaPago() {
         }
         
         const preference = await response.json();
+        reiniciarClaveIdempotencia();
         console.log('✅ Preferencia creada:', preference);
         
         // Sincronizar con POS después de crear la preferencia exitosamente
@@ -1783,10 +1821,11 @@ async function procesarPedidoSistema(metodoPago) {
         showLoadingMessage('Procesando pedido...');
         
         // Enviar al backend - endpoint específico para pedidos del sistema
-        const response = await fetch(`${MERCADO_PAGO_CONFIG.backendUrl}/pos/orders`, {
+        const response = await fetchIdempotente(`${MERCADO_PAGO_CONFIG.backendUrl}/pos/orders`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': obtenerClaveIdempotencia()
             },
             body: JSON.stringify(orderData)
         });
@@ -1800,6 +1839,7 @@ async function procesarPedidoSistema(metodoPago) {
         }
         
         const result = await response.json();
+        reiniciarClaveIdempotencia();
         console.log('✅ Pedido procesado:', result);
         
         // Ocultar loading
@@ -7,21 +7,16 @@ Se ejecuta continuamente en segundo plano
 """
 import time
 import requests
-import sqlite3
 import json
 from datetime import datetime
 import threading
 import logging
+from cliente_eventos_pos import SuscriptorEventosPOS
+from logging_setup import configure_logging
+from order_schema import get_orders_database, normalize_timestamp, now_timestamp, QUERIES
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('sync_automatico.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configurar logging (cola no bloqueante y rotación por tamaño)
+configure_logging(log_file='sync_automatico.log')
 logger = logging.getLogger(__name__)
 
 class SincronizadorAutomatico:
@@ -31,6 +26,9 @@ class SincronizadorAutomatico:
         self.ejecutando = False
         self.hilo = None
         self.pedidos_procesados = set()  # Para evitar duplicados
+        self.cursor_servidor = None  # Cursor del feed incremental de /pos/orders
+        self.suscriptor_eventos = None
+        self._despertar = threading.Event()  # Se activa al llegar un evento de /pos/events
         
     def iniciar(self):
         """Iniciar sincronización automática continua"""
@@ -42,6 +40,12 @@ class SincronizadorAutomatico:
         self.hilo = threading.Thread(target=self._bucle_sincronizacion, daemon=True)
         self.hilo.start()
         
+        # Sincronizar en cuanto el servidor avise de un pedido nuevo o cambio de estado
+        self.suscriptor_eventos = SuscriptorEventosPOS(
+            self.servidor_url, lambda tipo, datos: self._despertar.set()
+        )
+        self.suscriptor_eventos.iniciar()
+        
         logger.info("🚀 SINCRONIZACIÓN AUTOMÁTICA INICIADA")
         logger.info(f"⏱️ Revisando cada {self.intervalo_segundos} segundos")
         logger.info(f"📡 Servidor: {self.servidor_url}")
@@ -50,6 +54,9 @@ class SincronizadorAutomatico:
     def detener(self):
         """Detener sincronización automática"""
         self.ejecutando = False
+        self._despertar.set()
+        if self.suscriptor_eventos:
+            self.suscriptor_eventos.detener()
         if self.hilo:
             self.hilo.join()
         logger.info("⏹️ Sincronización automática detenida")
@@ -59,7 +66,9 @@ class SincronizadorAutomatico:
         while self.ejecutando:
             try:
                 self._sincronizar_pedidos()
-                time.sleep(self.intervalo_segundos)
+                # Esperar el intervalo o despertar antes si llega un evento
+                self._despertar.wait(self.intervalo_segundos)
+                self._despertar.clear()
             except Exception as e:
                 logger.error(f"❌ Error en bucle de sincronización: {e}")
                 time.sleep(60)  # Esperar más tiempo si hay error
@@ -115,12 +124,18 @@ class SincronizadorAutomatico:
             response = requests.get(
                 f"{self.servidor_url}/pos/orders", 
                 timeout=15,
-                headers={'Accept': 'application/json'}
+                headers={'Accept': 'application/json'},
+                params={'since': self.cursor_servidor} if self.cursor_servidor else {}
             )
             
+            if response.status_code == 304:
+                logger.debug("📭 Servidor: Sin cambios desde el último cursor")
+                return True
+            
             if response.status_code == 200:
                 data = response.json()
                 orders = data.get('orders', [])
+                self.cursor_servidor = data.get('cursor') or self.cursor_servidor
                 
                 if orders:
                     nuevos = self._procesar_pedidos(orders, "Servidor")
@@ -169,106 +184,17 @@ class SincronizadorAutomatico:
         nuevos_pedidos = 0
         
         try:
-            conn = sqlite3.connect('pos_pedidos.db')
-            cursor = conn.cursor()
-            
-            for order in orders:
-                try:
-                    order_id = order.get('id', order.get('preference_id', f"auto_{int(datetime.now().timestamp())}"))
-                    
-                    # Evitar duplicados
-                    if order_id in self.pedidos_procesados:
-                        continue
-                    
-                    # Verificar si ya existe en la BD
-                    cursor.execute("SELECT id FROM pedidos WHERE id = ?", (order_id,))
-                    if cursor.fetchone():
-                        self.pedidos_procesados.add(order_id)
-                        continue
-                    
-                    # Extraer información del pedido
-                    cliente_info = order.get('customer', order.get('payer', {}))
-                    items_raw = order.get('items', order.get('productos', []))
-                    metadata = order.get('metadata', {})
-                    
-                    # Extraer datos del cliente de manera más robusta
-                    cliente_nombre = cliente_info.get('name', '')
-                    cliente_telefono = cliente_info.get('phone', '')
-                    metodo_pago = cliente_info.get('payment_method', 'No especificado')
-                    
-                    # Si el teléfono viene como objeto (estructura antigua)
-                    if isinstance(cliente_telefono, dict):
-                        cliente_telefono = cliente_telefono.get('number', '')
-                    
-                    # Si no hay datos, intentar de la estructura alternativa
-                    if not cliente_nombre and 'payer' in order:
-                        payer = order['payer']
-                        cliente_nombre = payer.get('name', '')
-                        if isinstance(payer.get('phone'), dict):
-                            cliente_telefono = payer.get('phone', {}).get('number', '')
-                        else:
-                            cliente_telefono = payer.get('phone', '')
-                    
-                    print(f"🔍 DEBUG EXTRACCIÓN DATOS:")
-                    print(f"   👤 Nombre extraído: '{cliente_nombre}'")
-                    print(f"   📱 Teléfono extraído: '{cliente_telefono}'")
-                    print(f"   💳 Método pago: '{metodo_pago}'")
-                    print(f"   📊 Estructura customer: {cliente_info}")
-                    print(f"   📊 Estructura payer: {order.get('payer', 'No existe')}")
-                    
-                    # Formatear items con información clara y legible
-                    items = []
-                    for item in items_raw:
-                        # Obtener nombre base del producto
-                        nombre_producto = item.get('title', item.get('nombre', 'Producto'))
-                        
-                        # Mejorar formato del nombre para mejor legibilidad en POS
-                        nombre_formateado = self._formatear_nombre_producto(nombre_producto)
-                        
-                        items.append({
-                            "name": nombre_formateado,
-                            "price": item.get('unit_price', item.get('precio', 0)),
-                            "quantity": item.get('quantity', item.get('cantidad', 1)),
-                            "description": item.get('description', '')
-                        })
-                    
-                    # Calcular total si no está disponible
-                    total = order.get('total', sum(item['price'] * item['quantity'] for item in items))
-                    
-                    # Insertar pedido
-                    cursor.execute('''
-                        INSERT INTO pedidos (id, cliente_nombre, cliente_telefono, hora_recogida, 
-                                           items, total, estado, metodo_pago, fecha_creacion, fecha_actualizacion)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        order_id,
-                        cliente_nombre,
-                        cliente_telefono,
-                        metadata.get('pickup_time', ''),
-                        json.dumps(items, ensure_ascii=False),
-                        total,
-                        'pendiente',
-                        metodo_pago,
-                        order.get('timestamp', datetime.now().isoformat()),
-                        datetime.now().isoformat()
-                    ))
-                    
-                    self.pedidos_procesados.add(order_id)
-                    nuevos_pedidos += 1
-                    
-                    logger.info(f"✅ NUEVO PEDIDO AUTOMÁTICO:")
-                    logger.info(f"   👤 Cliente: {cliente_nombre or 'Sin nombre'}")
-                    logger.info(f"   📱 Teléfono: {cliente_telefono or 'Sin teléfono'}")
-                    logger.info(f"   💳 Pago: {metodo_pago}")
-                    logger.info(f"   💰 Total: ${total}")
-                    logger.info(f"   🆔 ID: {order_id}")
-                    logger.info(f"   📡 Fuente: {fuente}")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error procesando pedido individual: {e}")
-            
-            conn.commit()
-            conn.close()
+            # Almacén canónico (order_schema.py): el mismo que leen el POS, la cocina y las ventas
+            db = get_orders_database()
+            with db.transaction():
+                for order in orders:
+                    try:
+                        # Cada pedido en su propio SAVEPOINT: si falla, solo se deshacen sus filas
+                        with db.transaction() as conn:
+                            if self._guardar_pedido(conn, order, fuente):
+                                nuevos_pedidos += 1
+                    except Exception as e:
+                        logger.error(f"❌ Error procesando pedido individual: {e}")
             
             return nuevos_pedidos
             
@@ -276,6 +202,94 @@ class SincronizadorAutomatico:
             logger.error(f"❌ Error en base de datos: {e}")
             return 0
     
+    def _guardar_pedido(self, conn, order, fuente):
+        """Guardar un pedido del servidor en el almacén. Devuelve True si es nuevo"""
+        order_id = order.get('id', order.get('preference_id', f"auto_{int(datetime.now().timestamp())}"))
+        
+        # Evitar duplicados
+        if order_id in self.pedidos_procesados:
+            return False
+        
+        # Verificar si ya existe en la BD (con el id del servidor como id local o como firebase_id)
+        if (conn.execute(QUERIES['estado_pedido'], (order_id,)).fetchone()
+                or conn.execute(QUERIES['pedido_por_firebase_id'], (order_id,)).fetchone()):
+            self.pedidos_procesados.add(order_id)
+            return False
+        
+        # Extraer información del pedido
+        cliente_info = order.get('customer', order.get('payer', {}))
+        items_raw = order.get('items', order.get('productos', []))
+        metadata = order.get('metadata', {})
+        
+        # Extraer datos del cliente de manera más robusta
+        cliente_nombre = cliente_info.get('name', '')
+        cliente_telefono = cliente_info.get('phone', '')
+        metodo_pago = cliente_info.get('payment_method', 'No especificado')
+        
+        # Si el teléfono viene como objeto (estructura antigua)
+        if isinstance(cliente_telefono, dict):
+            cliente_telefono = cliente_telefono.get('number', '')
+        
+        # Si no hay datos, intentar de la estructura alternativa
+        if not cliente_nombre and 'payer' in order:
+            payer = order['payer']
+            cliente_nombre = payer.get('name', '')
+            if isinstance(payer.get('phone'), dict):
+                cliente_telefono = payer.get('phone', {}).get('number', '')
+            else:
+                cliente_telefono = payer.get('phone', '')
+        
+        logger.debug("🔍 Datos extraídos del pedido", extra={
+            'order_id': order_id, 'cliente_nombre': cliente_nombre,
+            'cliente_telefono': cliente_telefono, 'metodo_pago': metodo_pago
+        })
+        
+        # Formatear items con información clara y legible
+        items = []
+        for item in items_raw:
+            # Obtener nombre base del producto
+            nombre_producto = item.get('title', item.get('nombre', 'Producto'))
+            
+            # Mejorar formato del nombre para mejor legibilidad en POS
+            nombre_formateado = self._formatear_nombre_producto(nombre_producto)
+            
+            items.append({
+                "name": nombre_formateado,
+                "price": item.get('unit_price', item.get('precio', 0)),
+                "quantity": item.get('quantity', item.get('cantidad', 1)),
+                "description": item.get('description', '')
+            })
+        
+        # Calcular total si no está disponible
+        total = order.get('total', sum(item['price'] * item['quantity'] for item in items))
+        
+        # Insertar pedido (el trigger del almacén normaliza los items en pedido_items)
+        conn.execute('''
+            INSERT INTO pedidos (id, firebase_id, cliente_nombre, cliente_telefono, hora_recogida, 
+                               items, total, estado, metodo_pago, fecha_creacion, fecha_actualizacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            order_id,
+            order_id,
+            cliente_nombre,
+            cliente_telefono,
+            metadata.get('pickup_time', ''),
+            json.dumps(items, ensure_ascii=False),
+            total,
+            'pendiente',
+            metodo_pago,
+            normalize_timestamp(order.get('timestamp')),
+            now_timestamp()
+        ))
+        
+        self.pedidos_procesados.add(order_id)
+        
+        logger.info(f"✅ NUEVO PEDIDO AUTOMÁTICO: {cliente_nombre or 'Sin nombre'} - ${total}", extra={
+            'order_id': order_id, 'cliente_telefono': cliente_telefono or 'Sin teléfono',
+            'metodo_pago': metodo_pago, 'fuente': fuente
+        })
+        return True
+    
     def _formatear_nombre_producto(self, nombre_producto):
         """Formatear nombre de producto para mejor legibilidad en POS"""
         try:
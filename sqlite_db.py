@@ -0,0 +1,202 @@
+# Acceso compartido a SQLite para Caffe & Miga
+# Una conexión por hilo y por archivo, reutilizada entre llamadas (así se aprovecha la caché
+# de sentencias preparadas de sqlite3), siempre en modo WAL con synchronous=NORMAL y
+# busy_timeout: el daemon de sincronización, el POS Tk y el backend pueden escribir a la vez
+# sin "database is locked". Las escrituras van dentro de transaction()
+#
+# Uso:
+#     db = get_database('pos_pedidos.db')
+#     with db.transaction() as conn:
+#         conn.execute('INSERT ...', (...))
+#     filas = db.query('SELECT ... WHERE id = ?', (pedido_id,))
+#
+# El esquema de cada archivo se versiona con migrate(): la tabla schema_version guarda las
+# migraciones aplicadas (ver order_schema.py y sales_schema.py). Los filtros por día usan
+# day_range(): un rango sobre la columna puede usar índices, date(columna) = ... no
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+from datetime import date, timedelta
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 10000))
+CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))
+
+class SQLiteDatabase:
+    def __init__(self, path, busy_timeout_ms=BUSY_TIMEOUT_MS, cached_statements=CACHED_STATEMENTS):
+        """
+        Args:
+            path: Ruta del archivo SQLite
+            busy_timeout_ms: Espera máxima ante un bloqueo de otro proceso o hilo
+            cached_statements: Sentencias preparadas que guarda cada conexión
+        """
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def _open(self):
+        # isolation_level=None: sin transacciones implícitas, cada una la abre transaction()
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                               cached_statements=self.cached_statements, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        return conn
+
+    def connection(self):
+        """Conexión de este hilo (se abre en el primer uso y de nuevo tras un fork)"""
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            local.conn = self._open()
+            local.pid = os.getpid()
+            local.depth = 0
+        return local.conn
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """
+        Transacción en la conexión de este hilo: commit al salir, rollback si hay excepción.
+        Anidada, usa un SAVEPOINT: si falla solo se deshace su parte
+
+        Args:
+            immediate: Tomar el bloqueo de escritura al empezar (BEGIN IMMEDIATE), así dos
+                escritores no chocan a mitad de transacción; False para BEGIN DEFERRED
+        """
+        conn = self.connection()
+        local = self._local
+        if local.depth:
+            savepoint = f'sp_{local.depth}'
+            conn.execute(f'SAVEPOINT {savepoint}')
+            local.depth += 1
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+                raise
+            else:
+                conn.execute(f'RELEASE {savepoint}')
+            finally:
+                local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            local.depth = 0
+
+    def execute(self, sql, params=()):
+        """Ejecutar una sola sentencia de escritura en su propia transacción (devuelve el cursor)"""
+        with self.transaction() as conn:
+            return conn.execute(sql, params)
+
+    def query(self, sql, params=(), as_dict=False):
+        """Todas las filas de una consulta (tuplas, o sqlite3.Row con as_dict=True)"""
+        cursor = self.connection().cursor()
+        if as_dict:
+            cursor.row_factory = sqlite3.Row
+        return cursor.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=(), as_dict=False):
+        """Primera fila de una consulta (o None)"""
+        cursor = self.connection().cursor()
+        if as_dict:
+            cursor.row_factory = sqlite3.Row
+        return cursor.execute(sql, params).fetchone()
+
+    def close(self):
+        """Cerrar la conexión de este hilo (se vuelve a abrir sola en el próximo uso)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+def get_database(path):
+    """SQLiteDatabase compartida para un archivo (la ruta relativa se resuelve contra el directorio actual)"""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = SQLiteDatabase(key)
+        return db
+
+def schema_version(db):
+    """Última migración aplicada al archivo (0 si es nuevo)"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    return db.query_one('SELECT COALESCE(MAX(version), 0) FROM schema_version')[0]
+
+def migrate(db, migrations):
+    """
+    Aplicar las migraciones pendientes, cada una en su transacción. Devuelve las versiones aplicadas
+
+    Args:
+        db: SQLiteDatabase a migrar
+        migrations: Lista en orden de (versión, descripción, pasos); cada paso es una sentencia SQL
+            o una función paso(conn) para lo que SQL solo no puede expresar (p. ej. columnas opcionales)
+    """
+    applied = []
+    current = schema_version(db)
+    for version, descripcion, steps in migrations:
+        if version <= current:
+            continue
+        with db.transaction() as conn:
+            # Otro proceso pudo aplicarla mientras esperábamos el bloqueo de escritura
+            if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, descripcion, applied_at) VALUES (?, ?, ?)',
+                         (version, descripcion, time.strftime('%Y-%m-%d %H:%M:%S')))
+        applied.append(version)
+        logger.info(f"🗄️ {os.path.basename(db.path)}: migración {version} aplicada ({descripcion})")
+    return applied
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+def get_migrated_database(path, migrations):
+    """get_database() con las migraciones aplicadas (una sola vez por proceso y archivo)"""
+    db = get_database(path)
+    if db.path not in _migrated:
+        with _migrated_lock:
+            if db.path not in _migrated:
+                migrate(db, migrations)
+                _migrated.add(db.path)
+    return db
+
+def day_range(start=None, end=None):
+    """
+    Límites [desde, hasta) para filtrar una columna de fecha por días
+
+    Args:
+        start: Primer día (date; por defecto hoy)
+        end: Último día incluido (por defecto el mismo `start`)
+    """
+    start = start or date.today()
+    end = end or start
+    return start.isoformat(), (end + timedelta(days=1)).isoformat()
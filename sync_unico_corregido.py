@@ -2,120 +2,64 @@
 # -*- coding: utf-8 -*-
 """
 SISTEMA ÚNICO DE SINCRONIZACIÓN CORREGIDO
-- Elimina duplicados automáticamente
+- No duplica: guarda en el almacén canónico de pedidos (order_schema.py) por id
 - Captura datos del cliente correctamente
 - UN SOLO sistema de sincronización
 """
 
 import requests
-import sqlite3
 import json
 import time
 import logging
 from datetime import datetime
 import os
+from order_ids import new_order_id
+from logging_setup import configure_logging
+from order_schema import get_orders_database, normalize_timestamp, now_timestamp, QUERIES
 
 class SyncUnicoCorregido:
     def __init__(self):
         self.servidor_url = "https://caffeymiga-1.onrender.com"
         self.intervalo = 30
         self.pedidos_procesados = set()
+        self.cursor_pedidos = None  # Cursor del feed incremental de /pos/orders
         
         # Configurar logging sin emojis
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('sync_unico.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        configure_logging(log_file='sync_unico.log')
         self.logger = logging.getLogger(__name__)
 
-    def inicializar_db(self):
-        """Inicializar base de datos con estructura correcta"""
-        conn = sqlite3.connect('caffeymiga_pedidos.db')  # NUEVO NOMBRE ÚNICO
-        cursor = conn.cursor()
-        
-        # Crear tabla si no existe (SIN cliente_email por ahora)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pedidos (
-                id TEXT PRIMARY KEY,
-                cliente_nombre TEXT,
-                cliente_telefono TEXT,
-                hora_recogida TEXT,
-                metodo_pago TEXT,
-                items TEXT,
-                total REAL,
-                estado TEXT DEFAULT 'pendiente',
-                fecha_creacion TEXT,
-                fecha_actualizacion TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Base de datos inicializada")
-
-    def limpiar_duplicados(self):
-        """Eliminar pedidos duplicados manteniendo el más reciente"""
-        conn = sqlite3.connect('caffeymiga_pedidos.db')  # NUEVO NOMBRE ÚNICO
-        cursor = conn.cursor()
-        
-        # Encontrar duplicados por cliente y total
-        cursor.execute('''
-            DELETE FROM pedidos 
-            WHERE rowid NOT IN (
-                SELECT MIN(rowid) 
-                FROM pedidos 
-                GROUP BY cliente_nombre, cliente_telefono, total, DATE(fecha_creacion)
-            )
-            AND cliente_nombre != ''
-        ''')
-        
-        duplicados_eliminados = cursor.rowcount
-        
-        # También eliminar pedidos sin datos de cliente muy antiguos
-        cursor.execute('''
-            DELETE FROM pedidos 
-            WHERE (cliente_nombre = '' OR cliente_nombre IS NULL)
-            AND fecha_creacion < datetime('now', '-1 hour')
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        if duplicados_eliminados > 0:
-            print(f"🧹 Eliminados {duplicados_eliminados} duplicados")
-        
-        return duplicados_eliminados
-
     def obtener_pedidos_servidor(self):
         """Obtener pedidos del servidor"""
         try:
             response = requests.get(
                 f"{self.servidor_url}/pos/orders",
                 timeout=15,
-                headers={'Accept': 'application/json'}
+                headers={'Accept': 'application/json'},
+                params={'since': self.cursor_pedidos} if self.cursor_pedidos else {}
             )
             
+            if response.status_code == 304:
+                # Sin cambios desde el último cursor
+                return []
+            
             if response.status_code == 200:
                 data = response.json()
                 orders = data.get('orders', [])
+                self.cursor_pedidos = data.get('cursor') or self.cursor_pedidos
                 return orders
             else:
-                print(f"⚠️ Servidor respondió: {response.status_code}")
+                self.logger.warning(f"⚠️ Servidor respondió: {response.status_code}")
                 return []
                 
         except Exception as e:
-            print(f"❌ Error conectando al servidor: {e}")
+            self.logger.error(f"❌ Error conectando al servidor: {e}")
             return []
 
     def procesar_pedido(self, order):
         """Procesar un pedido individual con extracción mejorada de datos"""
         try:
             # ID del pedido
-            order_id = order.get('id', order.get('preference_id', f"auto_{int(time.time())}"))
+            order_id = order.get('id', order.get('preference_id', new_order_id('auto')))
             
             # EXTRACCIÓN MEJORADA DE DATOS DEL CLIENTE
             cliente_nombre = ""
@@ -178,14 +122,11 @@ class SyncUnicoCorregido:
             # Total
             total = order.get('total', sum(item['price'] * item['quantity'] for item in items))
             
-            # DEBUG de extracción
-            print(f"\n🔍 PROCESANDO PEDIDO {order_id}")
-            print(f"   Nombre: '{cliente_nombre}'")
-            print(f"   Teléfono: '{cliente_telefono}'")
-            print(f"   Email: '{cliente_email}'")
-            print(f"   Pago: '{metodo_pago}'")
-            print(f"   Recogida: '{hora_recogida}'")
-            print(f"   Total: ${total}")
+            self.logger.debug("🔍 Datos extraídos del pedido", extra={
+                'order_id': order_id, 'cliente_nombre': cliente_nombre, 'cliente_telefono': cliente_telefono,
+                'cliente_email': cliente_email, 'metodo_pago': metodo_pago, 'hora_recogida': hora_recogida,
+                'total': total
+            })
             
             return {
                 'id': order_id,
@@ -194,96 +135,91 @@ class SyncUnicoCorregido:
                 'hora_recogida': hora_recogida,
                 'metodo_pago': metodo_pago,
                 'items': json.dumps(items, ensure_ascii=False),
+                'cliente_email': cliente_email,
                 'total': total,
                 'timestamp': order.get('timestamp', datetime.now().isoformat())
             }
             
         except Exception as e:
-            print(f"❌ Error procesando pedido: {e}")
+            self.logger.error(f"❌ Error procesando pedido: {e}")
             return None
 
     def guardar_pedido(self, pedido_data):
-        """Guardar pedido en base de datos evitando duplicados"""
-        conn = sqlite3.connect('caffeymiga_pedidos.db')  # NUEVO NOMBRE ÚNICO
-        cursor = conn.cursor()
-        
+        """Guardar pedido en el almacén canónico (order_schema.py) evitando duplicados"""
         try:
-            # Verificar si ya existe
-            cursor.execute("SELECT id FROM pedidos WHERE id = ?", (pedido_data['id'],))
-            if cursor.fetchone():
-                print(f"⚠️ Pedido {pedido_data['id']} ya existe, actualizando...")
-                
-                # Actualizar
-                cursor.execute('''
-                    UPDATE pedidos SET
-                        cliente_nombre = ?, cliente_telefono = ?,
-                        hora_recogida = ?, metodo_pago = ?, items = ?, total = ?,
-                        fecha_actualizacion = ?
-                    WHERE id = ?
-                ''', (
-                    pedido_data['cliente_nombre'],
-                    pedido_data['cliente_telefono'], 
-                    pedido_data['hora_recogida'],
-                    pedido_data['metodo_pago'],
-                    pedido_data['items'],
-                    pedido_data['total'],
-                    datetime.now().isoformat(),
-                    pedido_data['id']
-                ))
-                
-                print(f"✅ Pedido {pedido_data['id']} actualizado")
-            else:
-                # Insertar nuevo
-                cursor.execute('''
-                    INSERT INTO pedidos 
-                    (id, cliente_nombre, cliente_telefono,
-                     hora_recogida, metodo_pago, items, total, estado,
-                     fecha_creacion, fecha_actualizacion)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    pedido_data['id'],
-                    pedido_data['cliente_nombre'],
-                    pedido_data['cliente_telefono'],
-                    pedido_data['hora_recogida'],
-                    pedido_data['metodo_pago'],
-                    pedido_data['items'],
-                    pedido_data['total'],
-                    'pendiente',
-                    pedido_data['timestamp'],
-                    datetime.now().isoformat()
-                ))
-                
-                print(f"➕ Nuevo pedido {pedido_data['id']} guardado")
-                print(f"   Cliente: {pedido_data['cliente_nombre']}")
-                print(f"   Teléfono: {pedido_data['cliente_telefono']}")
-                print(f"   Total: ${pedido_data['total']}")
+            with get_orders_database().transaction() as conn:
+                # Verificar si ya existe (con el id del servidor como id local o como firebase_id)
+                existente = (conn.execute(QUERIES['estado_pedido'], (pedido_data['id'],)).fetchone()
+                             or conn.execute(QUERIES['pedido_por_firebase_id'], (pedido_data['id'],)).fetchone())
+                if existente:
+                    # Actualizar (si cambian los items, el trigger del almacén rehace pedido_items)
+                    conn.execute('''
+                        UPDATE pedidos SET
+                            cliente_nombre = ?, cliente_email = ?, cliente_telefono = ?,
+                            hora_recogida = ?, metodo_pago = ?, items = ?, total = ?,
+                            fecha_actualizacion = ?
+                        WHERE id = ? OR firebase_id = ?
+                    ''', (
+                        pedido_data['cliente_nombre'],
+                        pedido_data['cliente_email'],
+                        pedido_data['cliente_telefono'], 
+                        pedido_data['hora_recogida'],
+                        pedido_data['metodo_pago'],
+                        pedido_data['items'],
+                        pedido_data['total'],
+                        now_timestamp(),
+                        pedido_data['id'],
+                        pedido_data['id']
+                    ))
+                    
+                    self.logger.debug(f"✅ Pedido {pedido_data['id']} ya existía, actualizado")
+                else:
+                    # Insertar nuevo
+                    conn.execute('''
+                        INSERT INTO pedidos 
+                        (id, firebase_id, cliente_nombre, cliente_email, cliente_telefono,
+                         hora_recogida, metodo_pago, items, total, estado,
+                         fecha_creacion, fecha_actualizacion)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        pedido_data['id'],
+                        pedido_data['id'],
+                        pedido_data['cliente_nombre'],
+                        pedido_data['cliente_email'],
+                        pedido_data['cliente_telefono'],
+                        pedido_data['hora_recogida'],
+                        pedido_data['metodo_pago'],
+                        pedido_data['items'],
+                        pedido_data['total'],
+                        'pendiente',
+                        normalize_timestamp(pedido_data['timestamp']),
+                        now_timestamp()
+                    ))
+                    
+                    self.logger.info(f"➕ Nuevo pedido: {pedido_data['cliente_nombre']} - ${pedido_data['total']}", extra={
+                        'order_id': pedido_data['id'], 'cliente_telefono': pedido_data['cliente_telefono']
+                    })
             
-            conn.commit()
             return True
             
         except Exception as e:
-            print(f"❌ Error guardando pedido: {e}")
+            self.logger.error(f"❌ Error guardando pedido: {e}")
             return False
-        finally:
-            conn.close()
 
     def ejecutar_ciclo(self):
         """Ejecutar un ciclo de sincronización"""
-        print(f"\n🔄 Ciclo sincronización - {datetime.now().strftime('%H:%M:%S')}")
+        self.logger.debug("🔄 Ciclo de sincronización")
         
-        # 1. Limpiar duplicados
-        self.limpiar_duplicados()
-        
-        # 2. Obtener pedidos del servidor
+        # 1. Obtener pedidos del servidor (el almacén no duplica: mismo id o firebase_id se actualiza)
         orders = self.obtener_pedidos_servidor()
         
         if not orders:
-            print("📭 No hay pedidos nuevos")
+            self.logger.debug("📭 No hay pedidos nuevos")
             return
         
-        print(f"📥 Encontrados {len(orders)} pedidos en servidor")
+        self.logger.debug(f"📥 Encontrados {len(orders)} pedidos en servidor")
         
-        # 3. Procesar cada pedido
+        # 2. Procesar cada pedido
         nuevos = 0
         for order in orders:
             pedido_data = self.procesar_pedido(order)
@@ -291,31 +227,22 @@ class SyncUnicoCorregido:
                 nuevos += 1
         
         if nuevos > 0:
-            print(f"✅ {nuevos} pedidos procesados correctamente")
+            self.logger.info(f"✅ {nuevos} pedidos procesados correctamente")
 
     def iniciar(self):
         """Iniciar sincronización continua"""
-        print("=" * 60)
-        print("🚀 SISTEMA ÚNICO DE SINCRONIZACIÓN INICIADO")
-        print(f"⏱️ Revisando cada {self.intervalo} segundos")
-        print(f"📡 Servidor: {self.servidor_url}")
-        print("🔄 Los pedidos llegarán automáticamente...")
-        print("⏹️ Presiona Ctrl+C para detener")
-        print("=" * 60)
-        
-        # Inicializar DB
-        self.inicializar_db()
+        self.logger.info(f"🚀 Sistema único de sincronización iniciado (cada {self.intervalo}s, "
+                         f"servidor {self.servidor_url}). Ctrl+C para detener")
         
         try:
             while True:
                 self.ejecutar_ciclo()
-                print(f"💤 Esperando {self.intervalo} segundos...")
                 time.sleep(self.intervalo)
                 
         except KeyboardInterrupt:
-            print("\n⏹️ Sincronización detenida por usuario")
+            self.logger.info("⏹️ Sincronización detenida por usuario")
         except Exception as e:
-            print(f"\n❌ Error crítico: {e}")
+            self.logger.critical(f"❌ Error crítico: {e}")
 
 if __name__ == "__main__":
     sync = SyncUnicoCorregido()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Guardia de rendimiento del backend con benchmark_backend.py
+# Corre una carga corta contra los falsos (Firestore en memoria y Mercado Pago local) en un
+# proceso nuevo y falla si hay errores o el throughput/p95 se salen de los límites
+
+import os
+import sys
+import json
+import subprocess
+
+# Límites holgados para cualquier máquina; ajustar por variable de entorno para la de producción
+MIN_THROUGHPUT_RPS = float(os.getenv('BENCHMARK_MIN_RPS', 10))
+MAX_P95_MS = float(os.getenv('BENCHMARK_MAX_P95_MS', 2000))
+DURACION = os.getenv('BENCHMARK_DURATION', '3')
+
+def ejecutar_benchmark():
+    """Ejecutar benchmark_backend.py en un proceso limpio y devolver (código de salida, reporte)"""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=directorio)
+    resultado = subprocess.run(
+        [sys.executable, os.path.join(directorio, 'benchmark_backend.py'),
+         '--duration', DURACION, '--concurrency', '4', '--seed', '7',
+         '--firestore-latency', '0.01', '--mp-latency', '0.02',
+         '--min-throughput', str(MIN_THROUGHPUT_RPS), '--max-p95-ms', str(MAX_P95_MS),
+         '--max-error-rate', '0'],
+        cwd=directorio, env=env, capture_output=True, text=True, timeout=120
+    )
+    return resultado.returncode, json.loads(resultado.stdout)
+
+def test_benchmark_backend():
+    print("🏋️ TEST DE RENDIMIENTO DEL BACKEND (sin conexión)")
+    print("=" * 60)
+
+    codigo, reporte = ejecutar_benchmark()
+    total = reporte['overall']
+
+    print(f"   Requests: {total['requests']} en {reporte['elapsed_s']}s ({total['throughput_rps']} rps)")
+    print(f"   Latencia: p50 {total['latency_ms']['p50']}ms, p95 {total['latency_ms']['p95']}ms, "
+          f"p99 {total['latency_ms']['p99']}ms")
+    for nombre, endpoint in reporte['endpoints'].items():
+        print(f"   - {nombre}: {endpoint['requests']} requests, p95 {endpoint['latency_ms']['p95']}ms, "
+              f"códigos {endpoint['status_codes']}")
+
+    assert set(reporte['endpoints']) == {'pos_orders_post', 'pos_orders_get', 'create_preference',
+                                         'webhook', 'pos_stats'}, "No se ejecutaron todos los escenarios"
+    assert codigo == 0, f"Límites incumplidos: {reporte['failures']}"
+
+    print("✅ Rendimiento dentro de los límites")
+
+if __name__ == '__main__':
+    test_benchmark_backend()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Test de items normalizados del almacén de pedidos
+# Los items se expanden a pedido_items al guardar el pedido (cualquiera sea el escritor y los
+# nombres de campo que use), un archivo en v2 se completa al migrar y las lecturas no decodifican JSON
+
+import os
+import sys
+import json
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sqlite_db import get_database, migrate
+from order_schema import get_orders_database, items_by_order, MIGRATIONS, QUERIES
+
+def guardar_pedido(db, pedido_id, items, sql='INSERT INTO pedidos'):
+    db.execute(f"{sql} (id, items, fecha_creacion) VALUES (?, ?, '2025-07-04 10:00:00')",
+               (pedido_id, items if isinstance(items, str) else json.dumps(items)))
+
+def test_items_normalizados_al_guardar():
+    print("🛍️ TEST DE ITEMS NORMALIZADOS AL GUARDAR")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = get_orders_database(os.path.join(tmp, 'caffeymiga.db'))
+
+        # Backend (name/price), Firebase (title/unit_price) y scripts (nombre/precio como texto)
+        guardar_pedido(db, 'web-1', [{'name': 'Latte', 'price': 45, 'quantity': 2, 'description': 'Deslactosada'}])
+        guardar_pedido(db, 'POS-1', [{'id': 'frappe', 'title': 'Frappe', 'unit_price': 55, 'quantity': 1,
+                                      'category_id': 'bebidas'}])
+        guardar_pedido(db, 'manual-1', [{'nombre': 'Pan', 'precio': '10', 'cantidad': '3'}, 'texto'])
+        guardar_pedido(db, 'roto-1', 'no es JSON')
+
+        items = items_by_order(db.query(QUERIES['items_pedidos_pendientes']))
+        print(f"   {items}")
+        assert items['web-1'] == [{'nombre': 'Latte', 'cantidad': 2, 'precio': 45, 'descripcion': 'Deslactosada'}]
+        assert items['POS-1'] == [{'nombre': 'Frappe', 'cantidad': 1, 'precio': 55, 'descripcion': ''}]
+        assert items['manual-1'] == [{'nombre': 'Pan', 'cantidad': 3, 'precio': 10, 'descripcion': ''}]
+        assert 'roto-1' not in items
+        assert db.query_one("SELECT categoria FROM pedido_items WHERE pedido_id = 'POS-1'")[0] == 'bebidas'
+
+        # INSERT OR REPLACE y UPDATE de items reemplazan las filas, no las duplican
+        guardar_pedido(db, 'web-1', [{'name': 'Té', 'price': 30}], sql='INSERT OR REPLACE INTO pedidos')
+        db.execute("UPDATE pedidos SET items = ? WHERE id = 'POS-1'", (json.dumps([{'name': 'Moka', 'price': 60}]),))
+        assert db.query(QUERIES['items_de_pedido'], ('web-1',)) == [('web-1', 'Té', 1, 30, None)]
+        assert db.query(QUERIES['items_de_pedido'], ('POS-1',)) == [('POS-1', 'Moka', 1, 60, None)]
+
+        productos = db.query(QUERIES['productos_en_rango'], ('2025-07-04', '2025-07-05'))
+        assert productos == [('Moka', 1, 60), ('Pan', 3, 30), ('Té', 1, 30)], productos
+        db.close()
+
+    print("✅ Items normalizados una sola vez, sin importar el origen")
+
+def test_migracion_de_pedidos_existentes():
+    print("🗄️ TEST DE MIGRACIÓN DE ITEMS EXISTENTES")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'caffeymiga.db')
+        # Almacén en v2: items solo en JSON, salvo un pedido viejo con filas y sin JSON
+        db = get_database(ruta)
+        migrate(db, MIGRATIONS[:2])
+        guardar_pedido(db, 'A', [{'title': 'Latte', 'unit_price': 45, 'quantity': 2}, {'name': 'Pan', 'price': 10}])
+        guardar_pedido(db, 'B', [])
+        db.execute('''
+            INSERT INTO pedido_items (pedido_id, nombre, cantidad, precio_unitario, precio_total)
+            VALUES ('B', 'Café', 1, 30, 30)
+        ''')
+        db.close()
+
+        db = get_orders_database(ruta)
+        filas = db.query('SELECT pedido_id, posicion, nombre, cantidad, precio_total FROM pedido_items ORDER BY pedido_id, posicion')
+        print(f"   {filas}")
+        assert filas == [('A', 0, 'Latte', 2, 90), ('A', 1, 'Pan', 1, 10), ('B', 0, 'Café', 1, 30)]
+        db.close()
+
+    print("✅ Pedidos existentes con items normalizados")
+
+if __name__ == '__main__':
+    test_items_normalizados_al_guardar()
+    print()
+    test_migracion_de_pedidos_existentes()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Test de planes de consulta del almacén de pedidos y de ventas
+# Siembra un año de datos sintéticos y corre EXPLAIN QUERY PLAN sobre cada consulta registrada en
+# order_schema.QUERIES y sales_schema.QUERIES. Falla si alguna recorre la tabla completa u ordena en
+# un B-tree temporal en vez de leer en el orden del índice. Solo se acepta un SCAN sobre un índice
+# parcial (lee únicamente sus filas) o sobre un índice cubriente en consultas sin WHERE (conteos)
+
+import os
+import sys
+import random
+import tempfile
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sqlite_db import day_range
+import order_schema
+import sales_schema
+
+DIAS = 365
+PEDIDOS_POR_DIA = 30
+VENTAS_POR_DIA = 60
+
+HOY = date.today()
+
+# Parámetros de ejemplo por consulta: una consulta nueva sin ejemplo hace fallar el test
+PARAMETROS_PEDIDOS = {
+    'pedidos_pendientes': (),
+    'items_pedidos_pendientes': (),
+    'pedidos_pendientes_recientes': (50,),
+    'pedidos_activos': (),
+    'items_pedidos_activos': (),
+    'items_de_pedido': ('POS-100',),
+    'contar_por_estado': ('pendiente',),
+    'contar_pedidos': (),
+    'pedido_por_firebase_id': ('fb-100',),
+    'estado_pedido': ('POS-100',),
+    'pedidos_por_estado_pos_en_rango': day_range(HOY),
+    'totales_en_rango': day_range(HOY - timedelta(days=HOY.weekday()), HOY),
+    'productos_en_rango': day_range(HOY - timedelta(days=HOY.weekday()), HOY),
+    'actualizar_estado': ('procesado', '2025-01-01 00:00:00', 'POS-100'),
+    'actualizar_estado_pos': ('listo', '2025-01-01 00:00:00', 'POS-100'),
+}
+
+PARAMETROS_VENTAS = {
+    'lineas_recientes': (50,),
+    'totales': (),
+    'totales_periodo': day_range(HOY.replace(day=1), HOY),
+    'productos': (),
+    'productos_periodo': day_range(HOY - timedelta(days=HOY.weekday()), HOY),
+    'ultimo_numero_del_dia': ('V-20250101-', 'V-20250101.'),
+    'contar_ventas_origen': ('WEB',),
+    'contar_ventas': (),
+    'cancelar_linea': ('Cancelado', 'Eliminado manualmente', 100),
+    'recalcular_totales_venta': ('Cancelado', 'Eliminado manualmente', 100),
+}
+
+def sembrar_pedidos(db):
+    """Un año de pedidos: casi todos cerrados, unos pocos pendientes y activos en los últimos días"""
+    filas = []
+    for dia in range(DIAS):
+        fecha = HOY - timedelta(days=dia)
+        for n in range(PEDIDOS_POR_DIA):
+            i = len(filas)
+            reciente = dia < 2
+            estado = random.choice(['pendiente', 'procesado']) if reciente else 'procesado'
+            estado_pos = random.choice(['nuevo', 'preparando', 'listo', 'entregado']) if reciente else 'entregado'
+            creado = datetime.combine(fecha, datetime.min.time()) + timedelta(minutes=8 * 60 + n * 20)
+            filas.append((
+                f"POS-{i}", f"fb-{i}", 'web', f"Cliente {i}", '5512345678', '10:30', 'mercadopago',
+                '[{"name": "Frappe", "quantity": 1, "price": 55}]', 55.0 + (i % 7),
+                estado, estado_pos, creado.strftime(order_schema.TIMESTAMP_FORMAT)
+            ))
+
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO pedidos (id, firebase_id, origen, cliente_nombre, cliente_telefono, hora_recogida,
+                                 metodo_pago, items, total, estado, estado_pos, fecha_creacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', filas)
+    return len(filas)
+
+def sembrar_ventas(db):
+    """Un año de ventas del mostrador y de la web (1 a 3 líneas cada una), con algunas cancelaciones"""
+    with db.transaction() as conn:
+        for dia in range(DIAS):
+            fecha = HOY - timedelta(days=dia)
+            for n in range(VENTAS_POR_DIA):
+                creado = datetime.combine(fecha, datetime.min.time()) + timedelta(minutes=7 * 60 + n * 10)
+                lineas = [('Frappe' if (n + k) % 2 else 'Latte', 1 + k, 50.0) for k in range(1 + n % 3)]
+                web = n % 5 == 0
+                venta_id = conn.execute('''
+                    INSERT INTO ventas (numero, fecha, pago, subtotal, total, articulos, estado, origen, pedido_web_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    f"V-{fecha.strftime('%Y%m%d')}-{n + 1:04d}", creado.strftime('%Y-%m-%d %H:%M:%S'), 'Efectivo',
+                    sum(c * p for _, c, p in lineas), sum(c * p for _, c, p in lineas), sum(c for _, c, _ in lineas),
+                    'Cancelado' if n % 40 == 0 else 'Activo', 'WEB' if web else 'LOCAL', f"POS-{n}" if web else None
+                )).lastrowid
+                conn.executemany('''
+                    INSERT INTO venta_lineas (venta_id, producto, cantidad, precio, precio_lista, importe)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(venta_id, producto, cantidad, precio, precio, cantidad * precio)
+                      for producto, cantidad, precio in lineas])
+    return DIAS * VENTAS_POR_DIA
+
+def indices_parciales(db):
+    """Nombres de los índices con WHERE: recorrerlos solo lee las filas que cumplen la condición"""
+    parciales = set()
+    for (tabla,) in db.query("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        for fila in db.query(f"PRAGMA index_list('{tabla}')"):
+            if fila[4]:
+                parciales.add(fila[1])
+    return parciales
+
+def problemas_del_plan(db, sql, params):
+    """Líneas del plan que indican un recorrido completo o un ordenamiento aparte"""
+    parciales = indices_parciales(db)
+    # Un filtro que no puede usar índices (p. ej. date(columna) = ?) también aparece como SCAN
+    # de un índice cubriente: con WHERE eso sigue siendo leer todo
+    sin_where = 'WHERE' not in sql.upper()
+    problemas = []
+    for fila in db.query('EXPLAIN QUERY PLAN ' + sql, params):
+        detalle = fila[3]
+        if detalle.startswith('SCAN') and detalle != 'SCAN CONSTANT ROW':
+            indice = detalle.split(' INDEX ')[-1] if ' INDEX ' in detalle else None
+            if indice in parciales or ('COVERING INDEX' in detalle and sin_where):
+                continue
+            problemas.append(detalle)
+        elif 'TEMP B-TREE FOR ORDER BY' in detalle:
+            problemas.append(detalle)
+    return problemas
+
+def revisar_consultas(nombre_db, db, queries, parametros):
+    """Revisar el plan de cada consulta registrada. Devuelve la lista de fallas"""
+    fallas = []
+    for nombre, sql in queries.items():
+        if nombre not in parametros:
+            fallas.append(f"{nombre_db}.{nombre}: sin parámetros de ejemplo en test_query_plans.py")
+            continue
+        problemas = problemas_del_plan(db, sql, parametros[nombre])
+        estado = "❌" if problemas else "✅"
+        print(f"   {estado} {nombre}")
+        for problema in problemas:
+            print(f"      {problema}")
+            fallas.append(f"{nombre_db}.{nombre}: {problema}")
+    return fallas
+
+def test_planes_sin_recorridos_completos():
+    print("🔍 TEST DE PLANES DE CONSULTA")
+    print("=" * 60)
+
+    random.seed(2025)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pedidos = order_schema.get_orders_database(os.path.join(tmp, 'caffeymiga.db'))
+        db_ventas = sales_schema.get_sales_database(os.path.join(tmp, 'ventas.db'))
+        print(f"🌱 {sembrar_pedidos(db_pedidos)} pedidos y {sembrar_ventas(db_ventas)} ventas sembradas")
+
+        fallas = []
+        # Sin estadísticas (archivo recién migrado) y con ANALYZE (archivo con historia)
+        for etapa in ('sin ANALYZE', 'con ANALYZE'):
+            if etapa == 'con ANALYZE':
+                db_pedidos.execute('ANALYZE')
+                db_ventas.execute('ANALYZE')
+            print(f"\n📦 Pedidos ({etapa})")
+            fallas += revisar_consultas('order_schema', db_pedidos, order_schema.QUERIES, PARAMETROS_PEDIDOS)
+            print(f"\n🎫 Ventas ({etapa})")
+            fallas += revisar_consultas('sales_schema', db_ventas, sales_schema.QUERIES, PARAMETROS_VENTAS)
+
+        for db in (db_pedidos, db_ventas):
+            db.close()
+
+    print()
+    assert not fallas, "Consultas con recorrido completo:\n" + "\n".join(fallas)
+    print("✅ Ninguna consulta recorre la tabla completa")
+
+def test_rango_de_dia_equivale_a_date():
+    print("📅 TEST DE RANGO DE FECHAS")
+    print("=" * 60)
+
+    random.seed(2025)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = order_schema.get_orders_database(os.path.join(tmp, 'caffeymiga.db'))
+        sembrar_pedidos(db)
+
+        # El rango [día, día siguiente) debe contar lo mismo que date(fecha_creacion) = día
+        for dia in (HOY, HOY - timedelta(days=1), HOY - timedelta(days=200)):
+            con_rango = db.query_one(order_schema.QUERIES['totales_en_rango'], day_range(dia))
+            con_date = db.query_one('''
+                SELECT COUNT(*), COALESCE(SUM(total), 0) FROM pedidos WHERE date(fecha_creacion) = ?
+            ''', (dia.isoformat(),))
+            print(f"   {dia}: {con_rango[0]} pedidos")
+            assert tuple(con_rango) == tuple(con_date), f"{dia}: {con_rango} != {con_date}"
+            assert con_rango[0] == PEDIDOS_POR_DIA
+
+        db.close()
+
+    print("✅ day_range() filtra igual que date()")
+
+if __name__ == '__main__':
+    test_planes_sin_recorridos_completos()
+    print()
+    test_rango_de_dia_equivale_a_date()
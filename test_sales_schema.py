@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Test del modelo de ventas (encabezado + líneas) de ventas.db
+# Una venta se guarda completa o no se guarda, los números son correlativos por día, los totales
+# quedan en el encabezado y los tickets de un archivo viejo se agrupan en ventas al migrar
+
+import os
+import sys
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sales_schema import get_sales_database, record_sale, cancel_sale_line, QUERIES
+
+def test_venta_en_una_transaccion():
+    print("🎫 TEST DE VENTA CON ENCABEZADO Y LÍNEAS")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = get_sales_database(os.path.join(tmp, 'ventas.db'))
+
+        venta = record_sale([
+            {'producto': 'Frappe Moka', 'cantidad': 2, 'precio': 50, 'precio_lista': 65},
+            {'producto': 'Latte', 'cantidad': 1, 'precio': 45},
+        ], 'Efectivo', promocion='2x$100 Frappes', fecha='2025-07-04 10:15:00', db=db)
+        print(f"   {venta['numero']}: ${venta['total']:.2f}")
+        assert venta['numero'] == 'V-20250704-0001'
+        assert venta['total'] == 145
+
+        encabezado = db.query_one('''
+            SELECT subtotal, descuento, total, promocion, articulos FROM ventas WHERE id = ?
+        ''', (venta['id'],))
+        assert tuple(encabezado) == (175, 30, 145, '2x$100 Frappes', 3), encabezado
+
+        # Una línea que la base rechaza (producto NULL) después de escribir el encabezado:
+        # no queda nada guardado
+        try:
+            record_sale([{'producto': 'Latte', 'cantidad': 1, 'precio': 45}, {'producto': None}],
+                        'Efectivo', fecha='2025-07-04 11:00:00', db=db)
+            raise AssertionError("La venta incompleta no falló")
+        except sqlite3.IntegrityError:
+            pass
+        assert db.query_one(QUERIES['contar_ventas'])[0] == 1
+        assert db.query_one('SELECT COUNT(*) FROM venta_lineas')[0] == 2
+
+        siguiente = record_sale([{'producto': 'Té', 'cantidad': 1, 'precio': 30}], 'Tarjeta',
+                                fecha='2025-07-04 12:00:00', db=db)
+        otro_dia = record_sale([{'producto': 'Té', 'cantidad': 1, 'precio': 30}], 'Tarjeta',
+                               fecha='2025-07-05 08:00:00', db=db)
+        assert siguiente['numero'] == 'V-20250704-0002'
+        assert otro_dia['numero'] == 'V-20250705-0001'
+
+        ventas, total = db.query_one(QUERIES['totales_periodo'], ('2025-07-04', '2025-07-05'))
+        assert (ventas, total) == (2, 175), (ventas, total)
+        db.close()
+
+    print("✅ Venta guardada completa, numerada y con totales en el encabezado")
+
+def test_migracion_de_tickets():
+    print("🗄️ TEST DE MIGRACIÓN DE TICKETS")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'ventas.db')
+        conn = sqlite3.connect(ruta)
+        conn.execute('''
+            CREATE TABLE tickets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, fecha TEXT, producto TEXT, cantidad INTEGER,
+                precio REAL, pago TEXT, estado TEXT, motivo_cancelacion TEXT
+            )
+        ''')
+        conn.executemany('''
+            INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            ('2025-07-01 10:00:00', 'Latte', 2, 45, 'Efectivo', 'Activo', ''),
+            ('2025-07-01 10:00:00', 'Frappe', 1, 60, 'Efectivo', 'Activo', ''),
+            ('2025-07-01 11:30:00', 'Té', 1, 30, 'Tarjeta', 'Activo', ''),
+        ])
+        conn.commit()
+        conn.close()
+
+        db = get_sales_database(ruta)
+        ventas = db.query('SELECT numero, total, articulos FROM ventas ORDER BY id')
+        print(f"   {len(ventas)} ventas: {ventas}")
+        assert ventas == [('T-1', 150, 3), ('T-3', 30, 1)]
+
+        # `tickets` sigue existiendo como vista y acepta los INSERT de los scripts viejos
+        db.execute('''
+            INSERT INTO tickets (fecha, producto, cantidad, precio, pago, estado, motivo_cancelacion)
+            VALUES ('2025-07-02 09:00:00', 'Pan', 3, 10, 'Efectivo', 'Activo', '')
+        ''')
+        fila = db.query_one("SELECT producto, cantidad, precio, venta FROM tickets WHERE producto = 'Pan'")
+        assert tuple(fila) == ('Pan', 3, 10, 'L-3'), fila
+        assert db.query_one('SELECT COUNT(*) FROM tickets')[0] == 4
+
+        # Cancelar una línea recalcula su venta; cancelar la última línea cancela la venta
+        assert cancel_sale_line(2, 'Eliminado manualmente', db=db)
+        assert not cancel_sale_line(2, 'Eliminado manualmente', db=db)
+        venta = db.query_one("SELECT total, articulos, estado FROM ventas WHERE numero = 'T-1'")
+        assert tuple(venta) == (90, 2, 'Activo'), venta
+        assert db.query_one('SELECT estado FROM tickets WHERE id = 2')[0] == 'Cancelado'
+        assert db.query_one(QUERIES['totales']) == (3, 150)
+
+        assert cancel_sale_line(3, 'Eliminado manualmente', db=db)
+        venta = db.query_one("SELECT total, estado, motivo_cancelacion FROM ventas WHERE numero = 'T-3'")
+        assert tuple(venta) == (0, 'Cancelado', 'Eliminado manualmente'), venta
+        assert db.query_one(QUERIES['totales']) == (2, 120)
+        assert db.query(QUERIES['productos']) == [('Latte', 2), ('Pan', 3)]
+        db.close()
+
+    print("✅ Tickets agrupados en ventas y vista compatible")
+
+if __name__ == '__main__':
+    test_venta_en_una_transaccion()
+    print()
+    test_migracion_de_tickets()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Test de presupuesto de arranque del servidor
+# Mide en un proceso nuevo cuánto tarda importar main.py y responder /health/live.
+# Firebase y Mercado Pago se inicializan en segundo plano y no deben contar en este tiempo
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+
+# Segundos máximos permitidos (se pueden ajustar por variable de entorno en máquinas lentas)
+PRESUPUESTO_IMPORT_MAIN = float(os.getenv('STARTUP_BUDGET_SECONDS', 2.0))
+PRESUPUESTO_IMPORT_FIREBASE = float(os.getenv('FIREBASE_IMPORT_BUDGET_SECONDS', 0.5))
+
+SCRIPT_MEDICION = '''
+import json, time
+inicio = time.perf_counter()
+import firebase_config
+fin_firebase = time.perf_counter()
+import main
+fin_main = time.perf_counter()
+respuesta = main.app.test_client().get('/health/live')
+fin_live = time.perf_counter()
+print(json.dumps({
+    "import_firebase_config": fin_firebase - inicio,
+    "import_main": fin_main - inicio,
+    "primera_respuesta": fin_live - inicio,
+    "status_live": respuesta.status_code
+}))
+'''
+
+def medir_arranque():
+    """Ejecutar la medición en un proceso limpio, con bases SQLite temporales y sin red"""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'ORDER_JOURNAL_PATH': os.path.join(tmp, 'order_journal.db'),
+            'ORDER_OUTBOX_PATH': os.path.join(tmp, 'order_outbox.db'),
+            'WEBHOOK_QUEUE_PATH': os.path.join(tmp, 'webhook_queue.db'),
+            'ORDER_STATS_PATH': os.path.join(tmp, 'order_stats.db'),
+            'IDEMPOTENCY_STORE_PATH': os.path.join(tmp, 'idempotency.db'),
+            'LOCAL_ORDER_STORE_PATH': os.path.join(tmp, 'local_orders.db'),
+            'ORDERS_DB_PATH': os.path.join(tmp, 'caffeymiga.db'),
+            'SALES_DB_PATH': os.path.join(tmp, 'ventas.db'),
+            # Las sondas y el warm-up no deben llegar a Mercado Pago real durante el test
+            'MERCADO_PAGO_API_URL': 'http://127.0.0.1:9',
+            'HEALTH_PROBE_INTERVAL': '3600'
+        })
+        resultado = subprocess.run(
+            [sys.executable, '-c', SCRIPT_MEDICION],
+            cwd=directorio, env=env, capture_output=True, text=True, timeout=60
+        )
+
+    ultima_linea = resultado.stdout.strip().splitlines()[-1]
+    return json.loads(ultima_linea)
+
+def test_presupuesto_arranque():
+    print("⏱️ TEST DE TIEMPO DE ARRANQUE")
+    print("=" * 60)
+
+    tiempos = medir_arranque()
+
+    print(f"   import firebase_config: {tiempos['import_firebase_config']:.3f}s (máx {PRESUPUESTO_IMPORT_FIREBASE}s)")
+    print(f"   import main:            {tiempos['import_main']:.3f}s (máx {PRESUPUESTO_IMPORT_MAIN}s)")
+    print(f"   primera respuesta:      {tiempos['primera_respuesta']:.3f}s")
+
+    assert tiempos['status_live'] == 200, "/health/live no respondió 200"
+    assert tiempos['import_firebase_config'] <= PRESUPUESTO_IMPORT_FIREBASE, \
+        "Importar firebase_config excede el presupuesto: ¿se volvió a inicializar Firebase al importar?"
+    assert tiempos['primera_respuesta'] <= PRESUPUESTO_IMPORT_MAIN, \
+        "El servidor tarda demasiado en poder responder: revisar inicializaciones al importar main.py"
+
+    print("✅ Arranque dentro del presupuesto")
+
+if __name__ == '__main__':
+    test_presupuesto_arranque()
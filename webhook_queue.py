@@ -0,0 +1,204 @@
+# Cola de notificaciones de Mercado Pago para Caffe & Miga
+# /webhook solo registra el payment_id y responde 200; un pool de workers consulta el pago
+# en segundo plano. Las notificaciones repetidas del mismo pago se fusionan en una sola fila
+
+import os
+import time
+import threading
+import logging
+from sqlite_db import get_database
+
+logger = logging.getLogger(__name__)
+
+class WebhookQueue:
+    def __init__(self, db_path=None, debounce_seconds=2, base_delay=5, max_delay=600,
+                 max_attempts=10, lease_seconds=120):
+        """
+        Cola persistente de pagos por procesar, con clave única payment_id
+
+        Args:
+            db_path: Ruta del archivo SQLite (por defecto WEBHOOK_QUEUE_PATH o webhook_queue.db)
+            debounce_seconds: Espera antes de procesar, para fusionar ráfagas del mismo pago
+            base_delay: Segundos de espera tras el primer fallo (se duplica en cada intento)
+            max_delay: Espera máxima entre reintentos
+            max_attempts: Intentos antes de marcar el pago como 'failed'
+            lease_seconds: Tiempo que un worker reserva un pago mientras lo procesa
+        """
+        self.db_path = db_path or os.getenv('WEBHOOK_QUEUE_PATH', 'webhook_queue.db')
+        self.debounce_seconds = debounce_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.processor = None
+        self.ejecutando = False
+        self.hilos = []
+        self._despertar = threading.Event()
+        self.db = get_database(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Crear la tabla de la cola si no existe"""
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_queue (
+                    payment_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    notifications INTEGER NOT NULL DEFAULT 1,
+                    requeue INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    payment_status TEXT,
+                    last_error TEXT,
+                    received_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_status_next ON webhook_queue (status, next_attempt_at)')
+
+    def enqueue(self, payment_id):
+        """Registrar una notificación. Si el pago ya está en cola, solo se cuenta (coalescing)"""
+        now = time.time()
+        self.db.execute('''
+            INSERT INTO webhook_queue (payment_id, next_attempt_at, received_at, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(payment_id) DO UPDATE SET
+                notifications = notifications + 1,
+                updated_at = excluded.updated_at,
+                -- En proceso: se vuelve a consultar al terminar, por si el estado cambió
+                requeue = CASE WHEN status = 'processing' THEN 1 ELSE requeue END,
+                -- Ya procesado: nueva notificación = posible cambio de estado del pago
+                attempts = CASE WHEN status IN ('done', 'failed') THEN 0 ELSE attempts END,
+                next_attempt_at = CASE WHEN status IN ('done', 'failed')
+                                       THEN excluded.next_attempt_at ELSE next_attempt_at END,
+                status = CASE WHEN status = 'processing' THEN status ELSE 'pending' END
+        ''', (str(payment_id), now + self.debounce_seconds, now, now))
+
+        self._despertar.set()
+
+    def start(self, processor, workers=2, poll_interval=1.0):
+        """
+        Iniciar el pool de workers
+
+        Args:
+            processor: Función processor(payment_id) que devuelve el estado del pago; lanza excepción si falla
+            workers: Cantidad de hilos procesando en paralelo
+            poll_interval: Segundos entre revisiones cuando la cola está vacía
+        """
+        self.processor = processor
+        if self.ejecutando:
+            return
+
+        self.ejecutando = True
+        self.poll_interval = poll_interval
+        for i in range(workers):
+            hilo = threading.Thread(target=self._bucle, name=f"webhook-worker-{i + 1}", daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+        logger.info(f"🔔 Cola de webhooks iniciada con {workers} workers")
+
+    def stop(self):
+        """Detener los workers"""
+        self.ejecutando = False
+        self._despertar.set()
+        for hilo in self.hilos:
+            hilo.join(timeout=5)
+        self.hilos = []
+
+    def _bucle(self):
+        """Procesar pagos mientras haya; dormir cuando no"""
+        ultima_purga = 0
+        while self.ejecutando:
+            try:
+                if self.process_once():
+                    continue
+                # Con la cola al día, limpiar cada hora los pagos ya resueltos
+                if time.time() - ultima_purga > 3600:
+                    self.purge()
+                    ultima_purga = time.time()
+            except Exception as e:
+                logger.error(f"❌ Error en worker de webhooks: {e}")
+            self._despertar.wait(self.poll_interval)
+            self._despertar.clear()
+
+    def _claim(self):
+        """Reservar el pago pendiente más antiguo que ya esté listo"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute('''
+                SELECT payment_id, attempts FROM webhook_queue
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'processing' AND leased_until < ?)
+                ORDER BY received_at ASC LIMIT 1
+            ''', (now, now)).fetchone()
+
+            if row:
+                conn.execute('''
+                    UPDATE webhook_queue SET status = 'processing', requeue = 0, leased_until = ?
+                    WHERE payment_id = ?
+                ''', (now + self.lease_seconds, row[0]))
+            return row
+
+    def process_once(self):
+        """Procesar un pago de la cola. Devuelve True si había uno listo"""
+        row = self._claim()
+        if not row:
+            return False
+
+        payment_id, attempts = row
+        now = time.time()
+        try:
+            payment_status = self.processor(payment_id)
+
+            self.db.execute('''
+                UPDATE webhook_queue SET
+                    status = CASE WHEN requeue = 1 THEN 'pending' ELSE 'done' END,
+                    requeue = 0, attempts = 0, leased_until = 0, next_attempt_at = ?,
+                    payment_status = ?, last_error = NULL, updated_at = ?
+                WHERE payment_id = ?
+            ''', (now + self.debounce_seconds, payment_status, now, payment_id))
+
+        except Exception as e:
+            attempts += 1
+            delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+            status = 'failed' if attempts >= self.max_attempts else 'pending'
+
+            self.db.execute('''
+                UPDATE webhook_queue SET
+                    status = ?, attempts = ?, leased_until = 0, next_attempt_at = ?,
+                    last_error = ?, updated_at = ?
+                WHERE payment_id = ?
+            ''', (status, attempts, now + delay, str(e), now, payment_id))
+            logger.warning(f"⚠️ Pago {payment_id} falló (intento {attempts}), reintento en {delay}s: {e}")
+
+        return True
+
+    def purge(self, older_than_seconds=7 * 86400):
+        """Borrar pagos 'done' o 'failed' sin actividad hace más de `older_than_seconds`"""
+        return self.db.execute('''
+            DELETE FROM webhook_queue WHERE status IN ('done', 'failed') AND updated_at < ?
+        ''', (time.time() - older_than_seconds,)).rowcount
+
+    def stats(self):
+        """Resumen de la cola por estado y notificaciones fusionadas"""
+        by_status = dict(self.db.query('SELECT status, COUNT(*) FROM webhook_queue GROUP BY status'))
+        notifications, payments = self.db.query_one(
+            'SELECT COALESCE(SUM(notifications), 0), COUNT(*) FROM webhook_queue'
+        )
+        oldest = self.db.query_one(
+            "SELECT MIN(received_at) FROM webhook_queue WHERE status IN ('pending', 'processing')"
+        )[0]
+
+        return {
+            'pending': by_status.get('pending', 0),
+            'processing': by_status.get('processing', 0),
+            'done': by_status.get('done', 0),
+            'failed': by_status.get('failed', 0),
+            'coalesced_notifications': notifications - payments,
+            'lag_seconds': round(time.time() - oldest, 3) if oldest else 0,
+            'workers': len(self.hilos)
+        }
+
+# Instancia global
+webhook_queue = WebhookQueue()